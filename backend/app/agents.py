@@ -1,8 +1,12 @@
 import json
-from typing import Dict, Any
+import logging
+from typing import AsyncIterator, Dict, Any, List
 
-from openai import OpenAI
 from app.config import settings
+from app.context import build_context, count_tokens
+from app.llm import chat_completion, stream_chat_completion
+
+logger = logging.getLogger(__name__)
 
 # ---------- Router prompt ----------
 ROUTER_SYSTEM = """You are a router agent for an investment research assistant.
@@ -19,60 +23,146 @@ Format:
 {"route":"...","reason":"short explanation"}
 """
 
-# ---------- Groq client factory ----------
-def _groq_client() -> OpenAI:
-    return OpenAI(
-        api_key=settings.GROQ_API_KEY,
-        base_url="https://api.groq.com/openai/v1",
-    )
-
 # ---------- Router agent ----------
-def router_decide(user_message: str) -> Dict[str, Any]:
-    if not settings.GROQ_API_KEY:
+def _parse_route(text: str) -> Dict[str, Any]:
+    try:
+        start = text.find("{")
+        end = text.rfind("}")
+        return json.loads(text[start:end + 1])
+    except Exception:
         return {
             "route": "retrieve_summarize",
-            "reason": "GROQ_API_KEY missing in backend/.env",
+            "reason": f"Could not parse JSON: {text[:120]}",
         }
 
-    client = _groq_client()
-    resp = client.chat.completions.create(
-        model=settings.GROQ_MODEL,
-        messages=[
+
+async def router_decide(user_message: str) -> Dict[str, Any]:
+    resp = await chat_completion(
+        "router",
+        [
             {"role": "system", "content": ROUTER_SYSTEM},
             {"role": "user", "content": user_message},
         ],
+        deadline_s=settings.LLM_ROUTER_DEADLINE_S,
+        temperature=0.0,
+    )
+
+    return _parse_route(resp.text)
+
+# ---------- Conversation summarizer ----------
+SUMMARY_SYSTEM = """You maintain the running summary of a conversation between a user and
+an investment research assistant.
+
+Update the existing summary with the new messages. Keep the facts, figures,
+reports and entities discussed, and any open questions. Drop small talk.
+Write plain prose, at most {max_tokens} tokens. Return only the summary.
+"""
+
+
+async def summarize_conversation(summary: str, turns: List[Dict[str, Any]]) -> str:
+    transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+    resp = await chat_completion(
+        "summary",
+        [
+            {"role": "system", "content": SUMMARY_SYSTEM.format(max_tokens=settings.MEMORY_SUMMARY_TOKENS)},
+            {"role": "user", "content": f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"},
+        ],
+        temperature=0.0,
+        max_tokens=settings.MEMORY_SUMMARY_TOKENS,
+    )
+    return resp.text
+
+# ---------- Report summarizer (ingestion) ----------
+SECTION_SUMMARY_SYSTEM = """You summarize one section of an investment research report.
+
+Keep every forecast, target, rating and key figure with its unit and horizon.
+Write plain prose, at most {max_tokens} tokens. Return only the summary.
+"""
+
+REPORT_SUMMARY_SYSTEM = """You write the executive summary of an investment research report
+from the summaries of its sections.
+
+Cover the main views, forecasts, recommendations and risks, with their figures.
+Write plain prose, at most {max_tokens} tokens. Return only the summary.
+"""
+
+KEY_FIGURES_SYSTEM = """You extract the key figures (forecasts, targets, levels, ratings)
+from the section summaries of an investment research report.
+
+Return STRICT JSON ONLY, at most 20 items:
+[{"label":"...","value":"...","section":1}]
+"""
+
+
+def _sections_text(sections: List[Dict[str, Any]]) -> str:
+    return "\n\n".join(
+        f"[{n}] {s['title'] or 'Untitled section'}\n{s['summary']}" for n, s in enumerate(sections, 1)
+    )
+
+
+async def summarize_section(report_title: str, section_title: str, text: str) -> str:
+    resp = await chat_completion(
+        "report_summary",
+        [
+            {"role": "system", "content": SECTION_SUMMARY_SYSTEM.format(max_tokens=settings.SUMMARY_SECTION_TOKENS)},
+            {"role": "user", "content": f"Report: {report_title}\nSection: {section_title or '(untitled)'}\n\n{text}"},
+        ],
         temperature=0.0,
+        max_tokens=settings.SUMMARY_SECTION_TOKENS,
     )
+    return resp.text
 
-    text = (resp.choices[0].message.content or "").strip()
 
+async def summarize_report(report_title: str, sections: List[Dict[str, Any]]) -> str:
+    resp = await chat_completion(
+        "report_summary",
+        [
+            {"role": "system", "content": REPORT_SUMMARY_SYSTEM.format(max_tokens=settings.SUMMARY_REPORT_TOKENS)},
+            {"role": "user", "content": f"Report: {report_title}\n\n{_sections_text(sections)}"},
+        ],
+        temperature=0.0,
+        max_tokens=settings.SUMMARY_REPORT_TOKENS,
+    )
+    return resp.text
+
+
+async def extract_key_figures(report_title: str, sections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    resp = await chat_completion(
+        "report_summary",
+        [
+            {"role": "system", "content": KEY_FIGURES_SYSTEM},
+            {"role": "user", "content": f"Report: {report_title}\n\n{_sections_text(sections)}"},
+        ],
+        temperature=0.0,
+    )
     try:
-        start = text.find("{")
-        end = text.rfind("}")
-        return json.loads(text[start:end + 1])
-    except Exception:
-        return {
-            "route": "retrieve_summarize",
-            "reason": f"Could not parse JSON: {text[:120]}",
-        }
+        text = resp.text
+        figures = json.loads(text[text.find("["):text.rfind("]") + 1])
+    except ValueError:
+        logger.info("Key figures not parseable: %s", resp.text[:120])
+        return []
+    return [
+        {"label": str(f["label"]), "value": str(f["value"]), "section": f.get("section")}
+        for f in figures if isinstance(f, dict) and f.get("label") and f.get("value")
+    ][:20]
 
 # ---------- Final responder ----------
-def respond_with_context(
+def _responder_messages(
     user_message: str,
     route: str,
     tool_output: dict,
-) -> str:
-    if not settings.GROQ_API_KEY:
-        return "GROQ_API_KEY missing in backend/.env"
-
+    memory=None,
+) -> List[Dict[str, str]]:
     system = """You are an investment research assistant.
 Use the tool output to answer the user.
 Be concise and structured.
+Retrieved passages are numbered [1], [2], ...; cite them by number.
 
-If tool_output.meta.source == "stub", mention it's demo data.
-If tool_output.meta.source == "chroma", do NOT call it demo.
+If the tool output source is "stub", mention it's demo data.
+If the tool output source is "chroma", do NOT call it demo.
 """
 
+    context, stats = build_context(tool_output)
 
     user = f"""
 User question:
@@ -81,20 +171,60 @@ User question:
 Route chosen:
 {route}
 
-Tool output (JSON):
-{json.dumps(tool_output, indent=2)}
+Tool output:
+{context}
 
 Produce the final answer.
 """
 
-    client = _groq_client()
-    resp = client.chat.completions.create(
-        model=settings.GROQ_MODEL,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
+    # Earlier turns (see app.memory): a rolling summary plus the last few verbatim
+    history: List[Dict[str, str]] = []
+    if memory is not None and memory.summary:
+        history.append({"role": "system", "content": f"Summary of the earlier conversation:\n{memory.summary}"})
+    if memory is not None:
+        history += [{"role": t["role"], "content": t["content"]} for t in memory.turns]
+
+    logger.info(
+        "responder prompt: route=%s prompt_tokens~%d memory_tokens~%d %s",
+        route,
+        count_tokens(system) + count_tokens(user) + (memory.tokens() if memory is not None else 0),
+        memory.tokens() if memory is not None else 0,
+        stats,
+    )
+    return [
+        {"role": "system", "content": system},
+        *history,
+        {"role": "user", "content": user},
+    ]
+
+
+async def respond_with_context(
+    user_message: str,
+    route: str,
+    tool_output: dict,
+    memory=None,
+) -> str:
+    resp = await chat_completion(
+        route,
+        _responder_messages(user_message, route, tool_output, memory),
         temperature=0.2,
     )
+    if resp.prompt_tokens is not None:
+        logger.info("responder usage: provider=%s model=%s prompt_tokens=%d completion_tokens=%d",
+                    resp.provider, resp.model, resp.prompt_tokens, resp.completion_tokens or 0)
+
+    return resp.text
+
 
-    return (resp.choices[0].message.content or "").strip()
+async def stream_respond_with_context(
+    user_message: str,
+    route: str,
+    tool_output: dict,
+    memory=None,
+) -> AsyncIterator[str]:
+    async for delta in stream_chat_completion(
+        route,
+        _responder_messages(user_message, route, tool_output, memory),
+        temperature=0.2,
+    ):
+        yield delta
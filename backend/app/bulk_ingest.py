@@ -0,0 +1,386 @@
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from app import lexical, queries
+from app.config import settings
+from app.db import database, init_db
+from app.embeddings import embed_texts
+from app.executor import run_blocking
+from app.ingest import chunk_record, chunk_min_tokens, iter_chunks, read_pdf_pages, report_id_for
+from app.partitions import partition_name
+from app.vectorstore import store
+
+# ---------- Offline bulk loading ----------
+# Backfills an archive of PDFs without going through /upload and the job
+# queue: files are hashed and extracted in a process pool, chunks from many
+# files are embedded together in large batches, and report rows are written
+# many per transaction. Run it with the app stopped (Chroma's local store is
+# single-process):
+#
+#     python -m app.bulk_ingest /data/archive --user u1 --bank "Some Bank"
+#     python -m app.bulk_ingest --manifest reports.csv
+#
+# A checkpoint file records every finished file (only once its chunks and
+# report row are committed), so re-running the same command after a crash
+# picks up where it stopped. Report ids are content-addressed like uploads,
+# so files already in `reports` (uploaded, or a duplicate in the archive)
+# are skipped too, and a file cut off mid-way is simply upserted again.
+# Report summaries aren't built here; summary questions on these reports
+# are answered by retrieval until the report is re-ingested.
+FIELDS = ("title", "bank", "asset_class", "date")
+
+
+@dataclass
+class Source:
+    path: str
+    user_id: str
+    fields: Dict[str, str] = field(default_factory=dict)
+
+
+def _stat(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def iter_directory(root: str, user_id: str, defaults: Dict[str, str]) -> Iterator[Source]:
+    """Every *.pdf under `root`, in a stable order."""
+    for directory, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                yield Source(os.path.join(directory, name), user_id, dict(defaults))
+
+
+def iter_manifest(path: str, user_id: Optional[str], defaults: Dict[str, str]) -> Iterator[Source]:
+    """Rows of a CSV (with a header) or JSONL manifest: `path` plus optional
+    user_id, title, bank, asset_class and date. Relative paths are resolved
+    against the manifest's directory; blank fields take the defaults."""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows: Iterator[Dict[str, Any]] = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for n, row in enumerate(rows, 1):
+            if not row.get("path"):
+                raise ValueError(f"{path}: row {n} has no path")
+            owner = row.get("user_id") or user_id
+            if not owner:
+                raise ValueError(f"{path}: row {n} has no user_id and no --user was given")
+            fields = {k: str(row[k]) for k in FIELDS if row.get(k)}
+            yield Source(os.path.join(base, row["path"]), owner, {**defaults, **fields})
+
+
+class Checkpoint:
+    """Append-only JSONL of finished files, keyed by path and checked against
+    size and mtime, so a changed file is loaded again."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._done: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # last line cut off by a crash
+                    self._done[record["path"]] = record
+        self._file = open(path, "a", encoding="utf-8")
+
+    def done(self, source: Source, retry_failed: bool = False) -> bool:
+        record = self._done.get(source.path)
+        if record is None or (retry_failed and record["status"] == "failed"):
+            return False
+        try:
+            return [record["size"], record["mtime_ns"]] == list(_stat(source.path))
+        except OSError:
+            return False
+
+    def record(self, source: Source, status: str, **extra: Any) -> None:
+        try:
+            size, mtime_ns = _stat(source.path)
+        except OSError:
+            size, mtime_ns = None, None
+        record = {"path": source.path, "size": size, "mtime_ns": mtime_ns, "status": status, **extra}
+        self._done[source.path] = record
+        self._file.write(json.dumps(record) + "\n")
+
+    def sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self.sync()
+        self._file.close()
+
+
+# ---------- Worker processes ----------
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while piece := f.read(1024 * 1024):
+            digest.update(piece)
+    return digest.hexdigest()
+
+
+def extract_file(path: str) -> Tuple[List[str], float]:
+    """Page texts and the seconds spent extracting them."""
+    t0 = time.perf_counter()
+    return read_pdf_pages(path), time.perf_counter() - t0
+
+
+# ---------- Batched writes ----------
+@dataclass
+class Prepared:
+    source: Source
+    report_id: str
+    file_sha256: str
+    pages: List[str]
+
+
+class BulkWriter:
+    """Buffers chunks across files and writes them `batch_size` at a time:
+    one embedding call, one upsert per partition, one lexical transaction.
+    Runs in a worker thread; `flush` returns the reports it completed."""
+
+    def __init__(self, batch_size: int, stats: Dict[str, Any]):
+        self.batch_size = batch_size
+        self.stats = stats
+        self.max_tokens = store.chunk_tokens()
+        self.min_tokens = chunk_min_tokens(self.max_tokens)
+        self._ids: List[str] = []
+        self._docs: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._reports: List[Prepared] = []
+
+    def add(self, report: Prepared) -> List[Prepared]:
+        t0 = time.perf_counter()
+        metadata = {
+            "user_id": report.source.user_id,
+            "bank": report.source.fields["bank"],
+            "asset_class": report.source.fields["asset_class"],
+            "title": report.source.fields["title"],
+            "date": report.source.fields["date"],
+            "filename": os.path.basename(report.source.path),
+        }
+        chunks = iter_chunks(report.pages, self.max_tokens, self.min_tokens, store.token_len)
+        for idx, chunk in enumerate(chunks):
+            md, chunk_id = chunk_record(
+                metadata, report.report_id, idx, chunk["text"], (chunk["page_start"], chunk["page_end"]), chunk["section"]
+            )
+            self._ids.append(chunk_id)
+            self._docs.append(chunk["text"])
+            self._metadatas.append(md)
+        report.pages = []  # the chunks hold the text now
+        self._reports.append(report)
+        self.stats["chunk_seconds"] += time.perf_counter() - t0
+        return self.flush() if len(self._ids) >= self.batch_size else []
+
+    def flush(self) -> List[Prepared]:
+        t0 = time.perf_counter()
+        embeddings = embed_texts(self._docs) if self._docs else []
+        t1 = time.perf_counter()
+        groups: Dict[str, List[int]] = {}
+        for n, md in enumerate(self._metadatas):
+            groups.setdefault(partition_name(md["user_id"], md["asset_class"]), []).append(n)
+        for name, rows in groups.items():
+            store.collection(name).upsert(
+                ids=[self._ids[n] for n in rows],
+                documents=[self._docs[n] for n in rows],
+                metadatas=[self._metadatas[n] for n in rows],
+                embeddings=[embeddings[n] for n in rows],
+            )
+        t2 = time.perf_counter()
+        if self._ids:
+            lexical.index_chunks(self._ids, self._docs, self._metadatas)
+        self.stats["embed_seconds"] += t1 - t0
+        self.stats["upsert_seconds"] += t2 - t1
+        self.stats["lexical_seconds"] += time.perf_counter() - t2
+        self.stats["chunks"] += len(self._ids)
+        done, self._reports = self._reports, []
+        self._ids, self._docs, self._metadatas = [], [], []
+        return done
+
+
+# ---------- Loader ----------
+async def bulk_ingest(
+    sources: Iterator[Source],
+    checkpoint: Checkpoint,
+    processes: int,
+    batch_size: int,
+    retry_failed: bool = False,
+) -> Dict[str, Any]:
+    """Load `sources` into Chroma, the BM25 index and `reports`; returns
+    counts and timings for the summary."""
+    t0 = time.perf_counter()
+    stats: Dict[str, Any] = {
+        "indexed": 0, "duplicates": 0, "failed": 0, "skipped": 0, "empty": 0,
+        "pages": 0, "chunks": 0, "bytes": 0,
+        "extract_seconds": 0.0, "chunk_seconds": 0.0, "embed_seconds": 0.0,
+        "upsert_seconds": 0.0, "lexical_seconds": 0.0, "db_seconds": 0.0,
+    }
+    known: Set[str] = {r["report_id"] for r in await database.fetchall("SELECT report_id FROM reports")}
+    await run_blocking(store.warm_up)
+    writer = BulkWriter(batch_size, stats)
+
+    loop = asyncio.get_running_loop()
+    pool = ProcessPoolExecutor(max_workers=processes)
+    # Files being extracted or waiting for the writer, which bounds memory:
+    # a slot is only given back once the writer has chunked the file
+    slots = asyncio.Semaphore(processes * 2)
+    ready: "asyncio.Queue[Optional[Prepared]]" = asyncio.Queue()
+    # Report ids being extracted -> whether that file reached the writer, so
+    # an identical file waits for the outcome instead of guessing
+    claims: Dict[str, "asyncio.Future[bool]"] = {}
+
+    async def claim(report_id: str) -> bool:
+        while report_id not in known:
+            pending = claims.get(report_id)
+            if pending is None:
+                claims[report_id] = loop.create_future()
+                return True
+            await pending
+        return False
+
+    async def prepare(source: Source) -> None:
+        handed_off = False
+        report_id = None
+        try:
+            sha = await loop.run_in_executor(pool, hash_file, source.path)
+            report_id = report_id_for(source.user_id, sha)
+            if not await claim(report_id):
+                checkpoint.record(source, "duplicate", report_id=report_id)
+                stats["duplicates"] += 1
+                report_id = None  # not ours to settle
+                return
+            pages, seconds = await loop.run_in_executor(pool, extract_file, source.path)
+            stats["extract_seconds"] += seconds
+            known.add(report_id)
+            await ready.put(Prepared(source, report_id, sha, pages))
+            handed_off = True
+        except Exception as exc:
+            checkpoint.record(source, "failed", error=f"{type(exc).__name__}: {exc}")
+            stats["failed"] += 1
+        finally:
+            if report_id is not None:
+                claims.pop(report_id).set_result(handed_off)
+            if not handed_off:
+                slots.release()
+
+    async def produce() -> None:
+        tasks = []
+        for source in sources:
+            if checkpoint.done(source, retry_failed):
+                stats["skipped"] += 1
+                continue
+            await slots.acquire()
+            tasks.append(asyncio.create_task(prepare(source)))
+        await asyncio.gather(*tasks)
+        await ready.put(None)
+
+    async def commit(reports: List[Prepared]) -> None:
+        # Chunks are in; the report rows and then the checkpoint make it final
+        if not reports:
+            return
+        t = time.perf_counter()
+        await queries.upsert_reports([
+            (r.report_id, r.source.user_id, os.path.basename(r.source.path), r.source.fields["title"],
+             r.source.fields["bank"], r.source.fields["asset_class"], r.source.fields["date"], r.file_sha256)
+            for r in reports
+        ])
+        stats["db_seconds"] += time.perf_counter() - t
+        for r in reports:
+            checkpoint.record(r.source, "indexed", report_id=r.report_id)
+        checkpoint.sync()
+        stats["indexed"] += len(reports)
+        elapsed = time.perf_counter() - t0
+        print(f"  {stats['indexed']} files, {stats['pages']} pages, {stats['chunks']} chunks"
+              f" ({stats['pages'] / elapsed:.1f} pages/s)", flush=True)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (report := await ready.get()) is not None:
+            stats["pages"] += len(report.pages)
+            stats["bytes"] += os.path.getsize(report.source.path)
+            stats["empty"] += not any(p.strip() for p in report.pages)
+            done = await run_blocking(writer.add, report)
+            slots.release()
+            await commit(done)
+        await commit(await run_blocking(writer.flush))
+        await producer
+    finally:
+        producer.cancel()
+        pool.shutdown(cancel_futures=True)
+        checkpoint.sync()
+    stats["seconds"] = time.perf_counter() - t0
+    return stats
+
+
+def _print_summary(stats: Dict[str, Any], processes: int) -> None:
+    elapsed = stats["seconds"]
+    print(f"files: {stats['indexed']} indexed ({stats['empty']} without text), {stats['duplicates']} duplicates,"
+          f" {stats['failed']} failed, {stats['skipped']} skipped (checkpoint)")
+    print(f"loaded {stats['pages']} pages, {stats['chunks']} chunks, {stats['bytes'] / 1e6:.1f} MB in {elapsed:.1f}s")
+    if elapsed:
+        print(f"throughput: {stats['indexed'] / elapsed:.2f} files/s, {stats['pages'] / elapsed:.1f} pages/s,"
+              f" {stats['chunks'] / elapsed:.1f} chunks/s, {stats['bytes'] / 1e6 / elapsed:.2f} MB/s")
+    print(f"time: extract {stats['extract_seconds']:.1f}s over {processes} processes, chunk {stats['chunk_seconds']:.1f}s,"
+          f" embed {stats['embed_seconds']:.1f}s, chroma {stats['upsert_seconds']:.1f}s,"
+          f" bm25 {stats['lexical_seconds']:.1f}s, reports {stats['db_seconds']:.1f}s")
+
+
+async def _run(args: argparse.Namespace) -> None:
+    defaults = {"bank": args.bank, "asset_class": args.asset_class, "date": args.date}
+    if args.manifest:
+        sources = iter_manifest(args.manifest, args.user, defaults)
+    else:
+        sources = iter_directory(os.path.abspath(args.directory), args.user, defaults)
+    # Title defaults to the file name rather than /upload's "Untitled"
+    titled = (
+        Source(s.path, s.user_id, {"title": os.path.splitext(os.path.basename(s.path))[0], **s.fields})
+        for s in sources
+    )
+
+    await init_db()
+    await database.start()
+    checkpoint = Checkpoint(args.checkpoint)
+    try:
+        stats = await bulk_ingest(titled, checkpoint, args.processes, args.batch_size, args.retry_failed)
+    finally:
+        checkpoint.close()
+        await database.close()
+    _print_summary(stats, args.processes)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk-load a PDF archive (run with the app stopped)")
+    parser.add_argument("directory", nargs="?", help="walked recursively for *.pdf")
+    parser.add_argument("--manifest", default=None, help="CSV or JSONL: path[, user_id, title, bank, asset_class, date]")
+    parser.add_argument("--user", default=None, help="owner of every file (default for manifest rows)")
+    parser.add_argument("--bank", default="Unknown")
+    parser.add_argument("--asset-class", default="multi-asset")
+    parser.add_argument("--date", default="unknown")
+    parser.add_argument("--processes", type=int, default=settings.INGEST_PROCESSES, help="extraction processes")
+    parser.add_argument("--batch-size", type=int, default=1024, help="chunks per embedding call and upsert")
+    parser.add_argument("--checkpoint", default="bulk_ingest.checkpoint.jsonl")
+    parser.add_argument("--retry-failed", action="store_true", help="try files that failed last time again")
+    args = parser.parse_args()
+
+    if bool(args.directory) == bool(args.manifest):
+        parser.error("give a directory or --manifest")
+    if args.directory and not args.user:
+        parser.error("a directory needs --user")
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+
+# (user_id, report_id, bank, asset_class): everything that changes what
+# retrieval can see for a question.
+Scope = Tuple[str, Optional[str], Optional[str], Optional[str]]
+
+
+@dataclass
+class CachedAnswer:
+    scope: Scope
+    vector: np.ndarray
+    question: str
+    answer: str
+    decision: Dict[str, Any]
+    tool_output_meta: Dict[str, Any]
+    cost_ms: float
+    created_at: float = field(default_factory=time.monotonic)
+
+
+# ---------- Semantic answer cache ----------
+class SemanticCache:
+    """Answers keyed by query embedding, matched by cosine similarity.
+
+    Per worker process, LRU-bounded and TTL-expired. Lookups only compare
+    against entries in the same scope.
+    """
+
+    def __init__(self, threshold: float, ttl_s: float, max_entries: int):
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._by_scope: Dict[Scope, List[int]] = {}
+        self._next_id = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+            "saved_ms": 0.0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def lookup(self, scope: Scope, vector: List[float]) -> Optional[CachedAnswer]:
+        if not self.enabled:
+            return None
+        q = _unit(vector)
+        with self._lock:
+            ids = self._by_scope.get(scope, [])
+            now = time.monotonic()
+            for entry_id in [i for i in ids if now - self._entries[i].created_at > self.ttl_s]:
+                self._drop(entry_id)
+                self.stats["expirations"] += 1
+
+            ids = self._by_scope.get(scope, [])
+            if ids:
+                sims = np.stack([self._entries[i].vector for i in ids]) @ q
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    entry_id = ids[best]
+                    self._entries.move_to_end(entry_id)
+                    entry = self._entries[entry_id]
+                    self.stats["hits"] += 1
+                    self.stats["saved_ms"] += entry.cost_ms
+                    return entry
+
+            self.stats["misses"] += 1
+            return None
+
+    def store(
+        self,
+        scope: Scope,
+        vector: List[float],
+        question: str,
+        answer: str,
+        decision: Dict[str, Any],
+        tool_output_meta: Dict[str, Any],
+        cost_ms: float,
+    ) -> None:
+        if not self.enabled:
+            return
+        entry = CachedAnswer(scope, _unit(vector), question, answer, decision, tool_output_meta, cost_ms)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._by_scope.setdefault(scope, []).append(entry_id)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def invalidate_report(self, user_id: str, report_id: str) -> int:
+        """Drop answers that could have been built from this report's chunks:
+        chats scoped to the report, and the user's unscoped chats."""
+        with self._lock:
+            stale = [
+                entry_id
+                for scope, ids in self._by_scope.items()
+                if scope[0] == user_id and scope[1] in (report_id, None)
+                for entry_id in ids
+            ]
+            for entry_id in stale:
+                self._drop(entry_id)
+            self.stats["invalidations"] += len(stale)
+            return len(stale)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+                "threshold": self.threshold,
+                "ttl_s": self.ttl_s,
+                "max_entries": self.max_entries,
+            }
+
+    def _drop(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        ids = self._by_scope[entry.scope]
+        ids.remove(entry_id)
+        if not ids:
+            del self._by_scope[entry.scope]
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+answer_cache = SemanticCache(
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+    ttl_s=settings.ANSWER_CACHE_TTL_S,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+)
@@ -12,10 +12,114 @@ class Settings:
     # LLM keys
     GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
     GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+    GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+    # Provider: groq, openai (any OpenAI-compatible URL) or local (offline stand-in).
+    # LLM_ROUTES picks provider/model per purpose, e.g. "router=groq:llama-3.1-8b-instant"
+    LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq")
+    LLM_ROUTES = os.getenv("LLM_ROUTES", "")
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+    OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    LOCAL_LLM_LATENCY_S = float(os.getenv("LOCAL_LLM_LATENCY_S", "0.05"))
+    LOCAL_LLM_TOKEN_RATE = float(os.getenv("LOCAL_LLM_TOKEN_RATE", "0"))
+    LOCAL_LLM_ROUTE = os.getenv("LOCAL_LLM_ROUTE", "retrieve_summarize")
+    LOCAL_LLM_ANSWER = os.getenv("LOCAL_LLM_ANSWER", "Local stand-in answer.")
+    LOCAL_LLM_ANSWER_TOKENS = int(os.getenv("LOCAL_LLM_ANSWER_TOKENS", "100"))
+    # Resilience (app/llm.py): in-flight cap, timeouts, retries, circuit breaker
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))
+    LLM_CONNECT_TIMEOUT_S = float(os.getenv("LLM_CONNECT_TIMEOUT_S", "5"))
+    LLM_DEADLINE_S = float(os.getenv("LLM_DEADLINE_S", "60"))
+    LLM_ROUTER_DEADLINE_S = float(os.getenv("LLM_ROUTER_DEADLINE_S", "8"))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    LLM_BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "0.5"))
+    LLM_BACKOFF_MAX_S = float(os.getenv("LLM_BACKOFF_MAX_S", "8"))
+    LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+    LLM_BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
     
     # RAG
     CHROMA_DIR = os.getenv("CHROMA_DIR", "./chroma_db")
     COLLECTION_NAME = os.getenv("COLLECTION_NAME", "research_reports")
+    # Where chunks live: "shared" (one collection, filtered by user_id), "user"
+    # (a collection per user) or "user_asset_class" (per user and asset class).
+    # Switching an existing deployment: run `python -m app.partitions migrate` first
+    PARTITION_STRATEGY = os.getenv("PARTITION_STRATEGY", "shared")
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    # On-disk embedding cache shared by ingestion and queries; empty disables it
+    EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache")
+    EMBEDDING_CACHE_DTYPE = os.getenv("EMBEDDING_CACHE_DTYPE", "float16")
+
+    # Retrieval: BM25 + vector fused with reciprocal rank fusion
+    HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+    RRF_K = int(os.getenv("RRF_K", "60"))
+
+    # Cross-encoder reranking (empty RERANK_ROUTES disables it). Listed routes
+    # over-fetch RERANK_CANDIDATES chunks per report and keep the best
+    # RERANK_TOP_K, or a per-route k: "retrieve_summarize,compare=8"
+    RERANK_ROUTES = os.getenv("RERANK_ROUTES", "")
+    RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "24"))
+    RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "6"))
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    # Past this budget the rest of the batches are skipped and vector order is kept
+    RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "250"))
+    RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "50000"))
+
+    # Responder prompt: retrieved passages are packed into this many tokens
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+
+    # Conversation memory: last N messages verbatim + a rolling summary of the
+    # rest, summarized only once history exceeds the token budget
+    MEMORY_RECENT_MESSAGES = int(os.getenv("MEMORY_RECENT_MESSAGES", "6"))
+    MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1500"))
+    MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "300"))
+    MEMORY_MAX_MESSAGES = int(os.getenv("MEMORY_MAX_MESSAGES", "200"))
+
+    # Report summaries built at ingestion: one LLM call per section plus two per
+    # report. Summary questions in a report's chat are answered from them.
+    REPORT_SUMMARIES = os.getenv("REPORT_SUMMARIES", "0") == "1"
+    SUMMARY_MAX_SECTIONS = int(os.getenv("SUMMARY_MAX_SECTIONS", "16"))
+    SUMMARY_SECTION_INPUT_TOKENS = int(os.getenv("SUMMARY_SECTION_INPUT_TOKENS", "2000"))
+    SUMMARY_SECTION_TOKENS = int(os.getenv("SUMMARY_SECTION_TOKENS", "150"))
+    SUMMARY_REPORT_TOKENS = int(os.getenv("SUMMARY_REPORT_TOKENS", "400"))
+    SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+    # Summaries as responder context: report summary, key figures and the
+    # sections closest to the question, within this many tokens
+    SUMMARY_CONTEXT_TOKENS = int(os.getenv("SUMMARY_CONTEXT_TOKENS", "1000"))
+
+    # Local routing tier: below this confidence the LLM router is consulted
+    ROUTER_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.75"))
+    LOCAL_ROUTER_TEMPERATURE = float(os.getenv("LOCAL_ROUTER_TEMPERATURE", "0.05"))
+
+    # Semantic answer cache (per worker); ANSWER_CACHE_MAX_ENTRIES=0 disables it
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+    ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "3600"))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2048"))
+
+    # Thread pool for blocking work (Chroma queries, embedding, PDF parsing)
+    BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "8"))
+
+    # Ingestion: worker processes for PDF text extraction, chunks per Chroma add
+    INGEST_PROCESSES = int(os.getenv("INGEST_PROCESSES", str(os.cpu_count() or 2)))
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+    # Chunk size in embedding-model tokens (0 = the model's input window, the
+    # most it embeds), and how full a chunk gets before a heading may end it
+    CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "0"))
+    CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", "192"))
+
+    # Ingestion job queue: concurrent jobs per worker, pending jobs allowed
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+    INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "100"))
+    INGEST_MAX_PENDING_PER_USER = int(os.getenv("INGEST_MAX_PENDING_PER_USER", "10"))
+    UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+
+    # SQLite: pooled read connections, statement groups committed per write batch
+    DB_READERS = int(os.getenv("DB_READERS", "4"))
+    DB_WRITE_BATCH = int(os.getenv("DB_WRITE_BATCH", "256"))
+
+    # Metrics: add a Server-Timing header with per-stage durations to responses
+    TIMING_HEADER = os.getenv("TIMING_HEADER", "0") == "1"
 
     # API Auth
     APP_API_KEY = os.getenv("APP_API_KEY", "")
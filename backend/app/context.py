@@ -0,0 +1,154 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+# ---------- Token counting ----------
+# Heuristic close to BPE tokenizers on English prose: one token per word or
+# punctuation mark, plus one per extra ~6 characters in long words/numbers.
+_PIECE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    return sum(1 + (len(p) - 1) // 6 for p in _PIECE.findall(text))
+
+
+# ---------- Chunk overlap ----------
+def overlap_length(left: str, right: str, min_len: int = 20, max_len: int = 600) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    for n in range(min(len(left), len(right), max_len), min_len - 1, -1):
+        if left.endswith(right[:n]):
+            return n
+    return 0
+
+
+# ---------- Context packing ----------
+def _source_label(md: Dict[str, Any]) -> str:
+    # Only the fields that help the model cite; ids/hashes are dropped
+    parts = [md.get("title") or md.get("filename") or "Untitled report"]
+    parts += [md[k] for k in ("bank", "asset_class", "date") if md.get(k) and md[k] != "unknown"]
+    return " | ".join(parts)
+
+
+def _page_range(start: Optional[int], end: Optional[int]) -> str:
+    if start is None:
+        return ""
+    return f" | p. {start}" if end in (None, start) else f" | pp. {start}-{end}"
+
+
+def _chunk_index(chunk_id: str) -> Optional[int]:
+    try:
+        return int(chunk_id.rsplit(":", 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def pack_retrieval(tool_output: Dict[str, Any], budget: int) -> Tuple[str, Dict[str, Any]]:
+    """Render retrieved chunks as numbered passages within `budget` tokens.
+
+    Chunks are taken in relevance order (the order retrieval returns them)
+    until the budget is spent. Chunks that are neighbours in the same report
+    are merged into one passage with the shared overlap removed.
+    """
+    chunks = tool_output.get("chunks") or []
+    metadatas = tool_output.get("metadatas") or [{}] * len(chunks)
+    ids = tool_output.get("ids") or [""] * len(chunks)
+
+    selected: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    used = 0
+    dropped = 0
+    for rank, (text, md, chunk_id) in enumerate(zip(chunks, metadatas, ids)):
+        idx = _chunk_index(chunk_id)
+        key = (md.get("report_id", ""), idx if idx is not None else -rank - 1)
+        if key in selected:
+            continue
+        cost = text
+        prev = selected.get((key[0], key[1] - 1))
+        if prev is not None and idx is not None:
+            cost = text[overlap_length(prev["text"], text):]
+        nxt = selected.get((key[0], key[1] + 1))
+        if nxt is not None and idx is not None:
+            cost = cost[: len(cost) - overlap_length(cost, nxt["text"])]
+        tokens = count_tokens(cost)
+        if prev is None and nxt is None:
+            tokens += count_tokens(_source_label(md)) + 4  # "[n] label" header of a new passage
+        if used + tokens > budget:
+            dropped += 1
+            continue
+        used += tokens
+        selected[key] = {"text": text, "md": md, "rank": rank}
+
+    # Merge runs of consecutive chunks per report into passages
+    passages: List[Dict[str, Any]] = []
+    for key in sorted(selected):
+        chunk = selected[key]
+        last = passages[-1] if passages else None
+        if last and last["report_id"] == key[0] and last["end"] == key[1] - 1 and key[1] >= 0:
+            last["text"] += chunk["text"][overlap_length(last["text"], chunk["text"]):]
+            last["end"] = key[1]
+            last["rank"] = min(last["rank"], chunk["rank"])
+            last["page_end"] = chunk["md"].get("page_end", last["page_end"])
+        else:
+            passages.append({
+                "report_id": key[0], "end": key[1], "rank": chunk["rank"],
+                "text": chunk["text"], "label": _source_label(chunk["md"]),
+                "page_start": chunk["md"].get("page_start"), "page_end": chunk["md"].get("page_end"),
+            })
+    passages.sort(key=lambda p: p["rank"])
+
+    body = "\n\n".join(
+        f"[{n}] {p['label']}{_page_range(p['page_start'], p['page_end'])}\n{p['text'].strip()}"
+        for n, p in enumerate(passages, 1)
+    )
+    stats = {
+        "chunks_in": len(chunks),
+        "chunks_used": len(selected),
+        "chunks_dropped": dropped,
+        "passages": len(passages),
+        "context_tokens": count_tokens(body),
+    }
+    return body, stats
+
+
+def pack_summaries(tool_output: Dict[str, Any], budget: int) -> Tuple[str, Dict[str, Any]]:
+    """Render precomputed report summaries (app.summaries) within `budget` tokens.
+
+    The report summary and key figures come first; section summaries follow
+    in report order until the budget is spent.
+    """
+    parts = [f"Report summary: {tool_output.get('title') or 'Untitled report'}\n{tool_output.get('summary', '')}"]
+    figures = tool_output.get("figures") or []
+    if figures:
+        parts.append("Key figures:\n" + "\n".join(f"- {f['label']}: {f['value']}" for f in figures))
+    used = sum(count_tokens(p) for p in parts)
+    sections = tool_output.get("sections") or []
+    kept = 0
+    for n, section in enumerate(sections, 1):
+        text = (
+            f"[{n}] {section.get('title') or 'Section'}"
+            f"{_page_range(section.get('page_start'), section.get('page_end'))}\n{section['summary']}"
+        )
+        tokens = count_tokens(text)
+        if used + tokens > budget:
+            break
+        parts.append(text)
+        used += tokens
+        kept += 1
+    body = "\n\n".join(parts)
+    return body, {"sections_in": len(sections), "sections_used": kept, "context_tokens": count_tokens(body)}
+
+
+def build_context(tool_output: Any, budget: Optional[int] = None) -> Tuple[str, Dict[str, Any]]:
+    """Prompt text for a tool output, plus packing stats."""
+    budget = settings.CONTEXT_TOKEN_BUDGET if budget is None else budget
+    if isinstance(tool_output, dict) and tool_output.get("type") == "retrieval":
+        source = tool_output.get("meta", {}).get("source", "unknown")
+        body, stats = pack_retrieval(tool_output, budget)
+        return f"Source: {source}\n\n{body or '(no matching passages)'}", stats
+    if isinstance(tool_output, dict) and tool_output.get("type") == "report_summary":
+        body, stats = pack_summaries(tool_output, budget)
+        return f"Source: report_summaries\n\n{body}", stats
+    # Small structured outputs (e.g. internal_kb): compact JSON, no indentation
+    text = json.dumps(tool_output, separators=(",", ":"), ensure_ascii=False)
+    return text, {"context_tokens": count_tokens(text)}
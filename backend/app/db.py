@@ -1,8 +1,42 @@
+import asyncio
+import logging
 import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
 import aiosqlite
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
 DB_PATH = os.getenv("SQLITE_PATH", "./app.db")
+# The BM25 index has a file of its own (default: lexical.db next to the app
+# database). Ingestion writes it in bulk from worker threads, which would
+# otherwise contend with the single writer below for the app database.
+LEXICAL_DB_PATH = os.getenv("LEXICAL_DB_PATH", "")
+
+
+def lexical_db_path() -> str:
+    return LEXICAL_DB_PATH or os.path.join(os.path.dirname(DB_PATH) or ".", "lexical.db")
+
+
+# BM25 index over chunk text (see app.lexical). lexical_chunks holds the
+# Chroma chunk id and filter fields; chunks_fts shares its rowid.
+CHUNKS_FTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lexical_chunks (
+    rowid INTEGER PRIMARY KEY,
+    chunk_key TEXT NOT NULL UNIQUE,
+    user_id TEXT NOT NULL,
+    report_id TEXT NOT NULL,
+    bank TEXT,
+    asset_class TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_lexical_chunks_report ON lexical_chunks(report_id);
+CREATE INDEX IF NOT EXISTS idx_lexical_chunks_user ON lexical_chunks(user_id, asset_class);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(text);
+"""
 
 
 async def init_db() -> None:
@@ -20,6 +54,7 @@ async def init_db() -> None:
             bank TEXT,
             asset_class TEXT,
             date TEXT,
+            file_sha256 TEXT,
             created_at TEXT DEFAULT (datetime('now'))
         );
         """)
@@ -48,14 +83,328 @@ async def init_db() -> None:
         );
         """)
 
+        # Routing decisions: which tier routed each message, for threshold tuning
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS routing_decisions (
+            decision_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id TEXT,
+            route TEXT NOT NULL,
+            tier TEXT NOT NULL,         -- "local" or "llm"
+            local_route TEXT,
+            local_confidence REAL,
+            router_ms REAL,
+            created_at TEXT DEFAULT (datetime('now'))
+        );
+        """)
+
+        # Ingestion jobs: /upload enqueues, app.jobs workers process
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS ingestion_jobs (
+            job_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            report_id TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            file_sha256 TEXT,
+            filename TEXT,
+            title TEXT,
+            bank TEXT,
+            asset_class TEXT,
+            date TEXT,
+            status TEXT NOT NULL,       -- queued | running | done | failed
+            stage TEXT NOT NULL,        -- queued | indexing | finalizing | summarizing | done | failed
+            percent REAL DEFAULT 0,
+            stats TEXT,                 -- JSON throughput stats
+            error TEXT,
+            created_at TEXT DEFAULT (datetime('now')),
+            updated_at TEXT DEFAULT (datetime('now'))
+        );
+        """)
+
+        # Columns added after the first release
+        await _add_column_if_missing(db, "reports", "file_sha256", "TEXT")
+        await _add_column_if_missing(db, "ingestion_jobs", "file_sha256", "TEXT")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_reports_file_sha256 ON reports(file_sha256);")
+
         await db.commit()
+        await _migrate(db)
+    await asyncio.get_running_loop().run_in_executor(None, _move_lexical_index)
 
 
-async def get_db():
-    db = await aiosqlite.connect(DB_PATH)
-    await db.execute("PRAGMA foreign_keys=ON;")
-    db.row_factory = aiosqlite.Row
+def _move_lexical_index() -> None:
+    # The BM25 index used to live in the app database: copy it over once,
+    # then drop it there
+    conn = sqlite3.connect(lexical_db_path(), timeout=30)
     try:
-        yield db
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.executescript(CHUNKS_FTS_SCHEMA)
+        conn.execute("ATTACH DATABASE ? AS app", (DB_PATH,))
+        if conn.execute("SELECT 1 FROM app.sqlite_master WHERE name = 'lexical_chunks'").fetchone():
+            with conn:
+                if conn.execute("SELECT 1 FROM lexical_chunks LIMIT 1").fetchone() is None:
+                    conn.execute("INSERT INTO lexical_chunks SELECT * FROM app.lexical_chunks")
+                    conn.execute("INSERT INTO chunks_fts(rowid, text) SELECT rowid, text FROM app.chunks_fts")
+                conn.execute("DROP TABLE IF EXISTS app.chunks_fts")
+                conn.execute("DROP TABLE app.lexical_chunks")
+            logger.info("Moved the BM25 index to %s", lexical_db_path())
     finally:
-        await db.close()
+        conn.close()
+
+
+# ---------- Migrations ----------
+# Applied in order at startup; PRAGMA user_version holds how many have run.
+# Append new entries, never edit or reorder old ones.
+MIGRATIONS: List[str] = [
+    # 1: composite indexes behind keyset pagination and per-user job counts
+    """
+    CREATE INDEX IF NOT EXISTS idx_chats_user_created ON chats(user_id, created_at, chat_id);
+    CREATE INDEX IF NOT EXISTS idx_messages_chat ON messages(chat_id, message_id);
+    CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_user_status ON ingestion_jobs(user_id, status);
+    CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_report_status ON ingestion_jobs(report_id, status);
+    """,
+    # 2: rolling conversation summary per chat (app.memory)
+    """
+    CREATE TABLE IF NOT EXISTS chat_memory (
+        chat_id TEXT PRIMARY KEY,
+        summary TEXT NOT NULL,
+        summarized_upto INTEGER NOT NULL,   -- last message_id folded into summary
+        updated_at TEXT DEFAULT (datetime('now')),
+        FOREIGN KEY(chat_id) REFERENCES chats(chat_id)
+    );
+    """,
+    # 3: summaries and key figures precomputed at ingestion (app.summaries)
+    """
+    CREATE TABLE IF NOT EXISTS report_summaries (
+        report_id TEXT NOT NULL,
+        kind TEXT NOT NULL,                 -- "report", "section" or "figures"
+        position INTEGER NOT NULL,          -- section order; 0 for report/figures
+        title TEXT,
+        page_start INTEGER,
+        page_end INTEGER,
+        content TEXT NOT NULL,              -- summary text; JSON list for figures
+        file_sha256 TEXT,                   -- file the summary was built from
+        created_at TEXT DEFAULT (datetime('now')),
+        PRIMARY KEY(report_id, kind, position),
+        FOREIGN KEY(report_id) REFERENCES reports(report_id)
+    );
+    """,
+    # 4: lookups behind report deletion and purges (app.maintenance)
+    """
+    CREATE INDEX IF NOT EXISTS idx_chats_report ON chats(report_id);
+    CREATE INDEX IF NOT EXISTS idx_routing_decisions_chat ON routing_decisions(chat_id);
+    CREATE INDEX IF NOT EXISTS idx_reports_user_created ON reports(user_id, created_at);
+    """,
+]
+
+
+async def _migrate(db) -> None:
+    cur = await db.execute("PRAGMA user_version")
+    (version,) = await cur.fetchone()
+    await cur.close()
+    for number, script in enumerate(MIGRATIONS[version:], version + 1):
+        # executescript runs outside any open transaction, so wrap it ourselves
+        await db.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {number};\nCOMMIT;")
+        logger.info("Applied database migration %d", number)
+
+
+async def _add_column_if_missing(db, table: str, column: str, decl: str) -> None:
+    cur = await db.execute(f"PRAGMA table_info({table})")
+    columns = {row[1] for row in await cur.fetchall()}
+    await cur.close()
+    if column not in columns:
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+# ---------- Pooled access ----------
+PRAGMAS = (
+    "PRAGMA foreign_keys=ON;",
+    "PRAGMA synchronous=NORMAL;",   # durable enough with WAL, far fewer fsyncs
+    "PRAGMA busy_timeout=5000;",
+)
+# Prepared statements are cached per connection, so long-lived connections
+# reuse them across requests
+CACHED_STATEMENTS = 256
+
+
+class WriteResult(NamedTuple):
+    lastrowid: Optional[int]
+    rowcount: int
+
+
+# (sql, params, executemany?)
+Statement = Tuple[str, Union[Sequence[Any], Iterable[Sequence[Any]]], bool]
+
+
+def _connect_writer(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        path, check_same_thread=False, isolation_level=None, cached_statements=CACHED_STATEMENTS
+    )
+    conn.execute("PRAGMA journal_mode=WAL;")
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _run_batch(conn: sqlite3.Connection, batch: List[List[Statement]]) -> List[Any]:
+    # One transaction per batch; each caller's statements sit in a savepoint
+    # so a failing write is rolled back alone.
+    results: List[Any] = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for statements in batch:
+            conn.execute("SAVEPOINT write_op")
+            try:
+                out = []
+                for sql, params, many in statements:
+                    cur = conn.executemany(sql, params) if many else conn.execute(sql, params)
+                    out.append(WriteResult(cur.lastrowid, cur.rowcount))
+                conn.execute("RELEASE write_op")
+                results.append(out)
+            except sqlite3.Error as exc:
+                conn.execute("ROLLBACK TO write_op")
+                conn.execute("RELEASE write_op")
+                results.append(exc)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return results
+
+
+class Database:
+    """Long-lived SQLite connections shared by the whole worker.
+
+    Reads borrow one of DB_READERS query-only aiosqlite connections. All
+    writes go through a queue to a single writer connection on its own
+    thread. Whatever queued up while the previous batch ran is committed
+    together (up to DB_WRITE_BATCH statements groups per commit), so
+    concurrent requests share fsyncs instead of contending for the lock.
+    """
+
+    def __init__(self):
+        self._readers: Optional[asyncio.Queue] = None
+        self._reader_conns: List[aiosqlite.Connection] = []
+        self._writes: Optional[asyncio.Queue] = None
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_thread: Optional[ThreadPoolExecutor] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._start_lock = asyncio.Lock()
+        self.stats = {"writes": 0, "commits": 0}
+
+    @property
+    def started(self) -> bool:
+        return self._writer_task is not None
+
+    async def start(self) -> None:
+        async with self._start_lock:
+            if self._writer_task is not None:
+                return
+            self._writer_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+            loop = asyncio.get_running_loop()
+            self._writer = await loop.run_in_executor(self._writer_thread, _connect_writer, DB_PATH)
+
+            self._readers = asyncio.Queue()
+            for _ in range(settings.DB_READERS):
+                conn = await aiosqlite.connect(DB_PATH, cached_statements=CACHED_STATEMENTS)
+                conn.row_factory = aiosqlite.Row
+                for pragma in PRAGMAS:
+                    await conn.execute(pragma)
+                await conn.execute("PRAGMA query_only=ON;")
+                self._reader_conns.append(conn)
+                self._readers.put_nowait(conn)
+
+            self._writes = asyncio.Queue()
+            self._writer_task = asyncio.create_task(self._write_loop(), name="sqlite-writer")
+
+    async def close(self) -> None:
+        if self._writer_task is None:
+            return
+        self._writes.put_nowait(None)  # flush what's queued, then stop
+        await self._writer_task
+        self._writer_task = None
+        for conn in self._reader_conns:
+            await conn.close()
+        self._reader_conns = []
+        await asyncio.get_running_loop().run_in_executor(self._writer_thread, self._writer.close)
+        self._writer_thread.shutdown()
+        self._writer = None
+
+    # ----- reads -----
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        await self.start()
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    async def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[aiosqlite.Row]:
+        async with self.reader() as conn:
+            async with conn.execute(sql, params) as cur:
+                return await cur.fetchone()
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[aiosqlite.Row]:
+        async with self.reader() as conn:
+            async with conn.execute(sql, params) as cur:
+                return list(await cur.fetchall())
+
+    # ----- writes -----
+    async def submit(self, statements: List[Statement]) -> "asyncio.Future[List[WriteResult]]":
+        """Queue statements to run atomically; returns a future for their results.
+
+        Await the future to know the write is committed. Writes are applied
+        in submission order.
+        """
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._writes.put_nowait((statements, future))
+        return future
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> WriteResult:
+        return (await (await self.submit([(sql, params, False)])))[0]
+
+    async def executemany(self, sql: str, seq: Iterable[Sequence[Any]]) -> WriteResult:
+        return (await (await self.submit([(sql, list(seq), True)])))[0]
+
+    async def transaction(self, statements: List[Tuple[str, Sequence[Any]]]) -> List[WriteResult]:
+        return await (await self.submit([(sql, params, False) for sql, params in statements]))
+
+    async def _write_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch = [await self._writes.get()]
+            while len(batch) < settings.DB_WRITE_BATCH and not self._writes.empty():
+                batch.append(self._writes.get_nowait())
+            if None in batch:
+                stopping = True
+                batch = [item for item in batch if item is not None]
+            if not batch:
+                continue
+
+            try:
+                results = await loop.run_in_executor(
+                    self._writer_thread, _run_batch, self._writer, [statements for statements, _ in batch]
+                )
+                self.stats["commits"] += 1
+            except Exception as exc:
+                logger.exception("SQLite write batch of %d failed", len(batch))
+                results = [exc] * len(batch)
+
+            self.stats["writes"] += len(batch)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+database = Database()
+
+
+async def get_db():
+    # Request-scoped read connection from the pool; write with database.execute
+    async with database.reader() as db:
+        yield db
@@ -0,0 +1,147 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.vectorstore import store
+
+
+# ---------- On-disk embedding cache ----------
+class EmbeddingCache:
+    """Embeddings keyed by (model name, text hash), stored on disk.
+
+    Vectors live in one fixed-width binary file per model (float16 by
+    default) that is read through a memory map. A small SQLite index maps
+    each key to its row. Rows are allocated inside a SQLite write
+    transaction, so several worker processes can share one cache directory.
+    """
+
+    def __init__(self, directory: str, model_name: str, dtype: str = "float16"):
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        self._vectors_path = os.path.join(directory, f"{slug}.{self.dtype.name}")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(directory, f"{slug}.idx.sqlite"),
+            check_same_thread=False,
+            isolation_level=None,
+            timeout=30,
+        )
+        self._db.execute("PRAGMA journal_mode=WAL;")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_vectors_row ON vectors(row)")
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        self.dim: Optional[int] = int(row[0]) if row else None
+        self._fd = os.open(self._vectors_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._mm: Optional[np.memmap] = None
+        self.stats = {"hits": 0, "misses": 0}
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        if self.dim is None or not texts:
+            return [None] * len(texts)
+        keys = [self.key(t) for t in texts]
+        rows: Dict[str, int] = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                rows.update(self._db.execute(
+                    f"SELECT key, row FROM vectors WHERE key IN ({marks})", batch
+                ).fetchall())
+            mm = self._mapped(max(rows.values()) + 1) if rows else None
+            out = [np.array(mm[rows[k]], dtype=np.float32) if k in rows else None for k in keys]
+        return out
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]) -> None:
+        if not texts:
+            return
+        arr = np.asarray(vectors, dtype=self.dtype)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(arr.shape[1])
+                self._db.execute("INSERT OR IGNORE INTO meta(key, value) VALUES('dim', ?)", (str(self.dim),))
+            row_bytes = self.dim * self.dtype.itemsize
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                (next_row,) = self._db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM vectors").fetchone()
+                for text, vec in zip(texts, arr):
+                    cur = self._db.execute(
+                        "INSERT OR IGNORE INTO vectors(key, row) VALUES(?, ?)", (self.key(text), next_row)
+                    )
+                    if cur.rowcount:
+                        os.pwrite(self._fd, vec.tobytes(), next_row * row_bytes)
+                        next_row += 1
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def embed(self, texts: List[str], embed_fn: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Cached vectors for `texts`; misses are embedded in one batch and stored."""
+        cached = self.get_many(texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+        self.stats["hits"] += len(texts) - sum(v is None for v in cached)
+        self.stats["misses"] += len(missing)
+        if missing:
+            fresh = dict(zip(missing, embed_fn(missing)))
+            self.put_many(missing, list(fresh.values()))
+            cached = [v if v is not None else fresh[t] for t, v in zip(texts, cached)]
+        return [list(map(float, v)) for v in cached]
+
+    def _mapped(self, rows_needed: int) -> np.memmap:
+        # Remap when another thread/process has grown the file past our view
+        if self._mm is None or self._mm.shape[0] < rows_needed:
+            rows = os.fstat(self._fd).st_size // (self.dim * self.dtype.itemsize)
+            self._mm = np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+        return self._mm
+
+    def close(self) -> None:
+        with self._lock:
+            self._mm = None
+            self._db.close()
+            os.close(self._fd)
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    global _cache
+    if not settings.EMBEDDING_CACHE_DIR:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(
+                settings.EMBEDDING_CACHE_DIR,
+                settings.EMBEDDING_MODEL,
+                settings.EMBEDDING_CACHE_DTYPE,
+            )
+        return _cache
+
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embed with the worker's model, going through the on-disk cache if enabled."""
+    cache = get_embedding_cache()
+    if cache is None:
+        return store.embed(texts)
+    return cache.embed(texts, store.embed)
+
+
+def close_embedding_cache() -> None:
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+            _cache = None
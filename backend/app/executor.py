@@ -0,0 +1,53 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from app.config import settings
+
+T = TypeVar("T")
+
+# ---------- Bounded executor for blocking work ----------
+# Chroma queries, embedding and PDF parsing are synchronous; they run here so
+# the event loop keeps serving other chats. The pool size caps how much of
+# that work runs at once per worker.
+_executor: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BLOCKING_WORKERS,
+            thread_name_prefix="blocking",
+        )
+    return _executor
+
+
+async def run_blocking(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    # Carry context vars (e.g. per-request stage timings) into the thread
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(ctx.run, fn, *args, **kwargs)
+    )
+
+
+# ---------- Process pool for CPU-bound PDF extraction ----------
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=settings.INGEST_PROCESSES)
+    return _process_pool
+
+
+def shutdown_executor() -> None:
+    global _executor, _process_pool
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
@@ -1,26 +1,26 @@
+import hashlib
+import os
 import re
+import time
 import uuid
-from typing import Dict, List, Tuple
+from collections import deque
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from pypdf import PdfReader
 
-def read_pdf_text(path: str) -> str:
+from app import lexical
+from app.config import settings
+from app.context import count_tokens
+
+def read_pdf_pages(path: str) -> List[str]:
     reader = PdfReader(path)
-    parts = []
-    for page in reader.pages:
-        parts.append(page.extract_text() or "")
-    return "\n".join(parts)
-
-def chunk_text(text: str, chunk_size: int = 1200, overlap: int = 200) -> List[str]:
-    text = re.sub(r"\s+", " ", text).strip()
-    chunks = []
-    i = 0
-    while i < len(text):
-        end = min(len(text), i + chunk_size)
-        chunks.append(text[i:end])
-        if end == len(text):
-            break
-        i = max(0, end - overlap)
-    return chunks
+    return [page.extract_text() or "" for page in reader.pages]
+
+def read_pdf_text(path: str) -> str:
+    return "\n".join(read_pdf_pages(path))
+
+def chunk_text(text: str, max_tokens: int = 240) -> List[str]:
+    return [chunk["text"] for chunk in iter_chunks([text], max_tokens)]
 
 def build_records(text: str, metadata: Dict[str, str]) -> Tuple[str, List[str], List[Dict[str, str]], List[str]]:
     report_id = str(uuid.uuid4())
@@ -29,9 +29,476 @@ def build_records(text: str, metadata: Dict[str, str]) -> Tuple[str, List[str],
     metadatas = []
     ids = []
     for idx in range(len(chunks)):
-        md = dict(metadata)
-        md.update({"report_id": report_id, "chunk_id": str(idx)})
+        md, chunk_id = chunk_record(metadata, report_id, idx, chunks[idx])
         metadatas.append(md)
-        ids.append(f"{report_id}:{idx}")
+        ids.append(chunk_id)
 
     return report_id, chunks, metadatas, ids
+
+
+def chunk_record(
+    metadata: Dict[str, str],
+    report_id: str,
+    idx: int,
+    chunk: str,
+    pages: Optional[Tuple[int, int]] = None,
+    section: str = "",
+) -> Tuple[Dict[str, Any], str]:
+    """Chroma metadata and id for chunk `idx` of a report."""
+    md: Dict[str, Any] = dict(metadata)
+    md.update({"report_id": report_id, "chunk_id": str(idx), "chunk_sha": chunk_hash(chunk)})
+    if pages is not None:
+        md["page_start"], md["page_end"] = pages
+    if section:
+        md["section"] = section  # heading the chunk sits under (app.summaries groups by it)
+    return md, f"{report_id}:{idx}"
+
+
+# ---------- Content addressing ----------
+REPORT_NAMESPACE = uuid.UUID("6f1c2a4e-3d7b-4f0a-9c55-2b8e1d0f7a31")
+
+
+def report_id_for(user_id: str, file_sha256: str) -> str:
+    # Same file uploaded by the same user -> same report_id
+    return str(uuid.uuid5(REPORT_NAMESPACE, f"{user_id}:{file_sha256}"))
+
+
+def chunk_hash(chunk: str) -> str:
+    return hashlib.sha256(re.sub(r"\s+", " ", chunk).strip().encode("utf-8")).hexdigest()
+
+
+def existing_embeddings(collection, hashes: List[str]) -> Dict[str, List[float]]:
+    """Embeddings already stored in Chroma for these chunk hashes."""
+    if not hashes:
+        return {}
+    res = collection.get(
+        where={"chunk_sha": {"$in": sorted(set(hashes))}},
+        include=["embeddings", "metadatas"],
+    )
+    found: Dict[str, List[float]] = {}
+    for md, emb in zip(res.get("metadatas") or [], res.get("embeddings") or []):
+        found.setdefault(md["chunk_sha"], list(emb))
+    return found
+
+
+# ---------- Streaming pipeline ----------
+def pdf_page_count(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+
+def extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    # Runs in a worker process: each one opens its own reader.
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def iter_pdf_pages(
+    path: str,
+    pool: Executor,
+    pages_per_task: int = 8,
+    max_in_flight: int = 8,
+    n_pages: Optional[int] = None,
+) -> Iterator[str]:
+    """Yield page texts in order while later page ranges extract in `pool`.
+
+    At most `max_in_flight` ranges are outstanding, so memory stays bounded
+    no matter how many pages the PDF has.
+    """
+    if n_pages is None:
+        n_pages = pdf_page_count(path)
+    ranges = iter(range(0, n_pages, pages_per_task))
+    pending: deque = deque()
+
+    def submit_next() -> None:
+        start = next(ranges, None)
+        if start is not None:
+            pending.append(pool.submit(extract_page_range, path, start, min(start + pages_per_task, n_pages)))
+
+    for _ in range(max_in_flight):
+        submit_next()
+    while pending:
+        pages = pending.popleft().result()
+        submit_next()
+        yield from pages
+
+
+# ---------- Structure-aware chunking ----------
+_NUMBERED_HEADING = re.compile(r"^\d+(?:\.\d+)*\.?\s+[A-Z]")
+_NUMERIC_CELL = re.compile(r"(?<!\S)[-+(]?\d[\d.,%)]*(?!\S)")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\"])")
+
+
+def _is_table_row(line: str) -> bool:
+    return line.count(" | ") >= 1 or len(_NUMERIC_CELL.findall(line)) >= 3
+
+
+def _is_short_label(line: str) -> bool:
+    return len(line.split()) <= 6 and line[-1] not in ".,;:" and line[:1].isupper()
+
+
+def _is_heading(line: str, alone: bool) -> bool:
+    if len(line) > 80 or line[-1] in ".,;:":
+        return False
+    if _NUMBERED_HEADING.match(line) or (line.isupper() and len(line) > 3):
+        return True
+    # Short stand-alone line between blank lines ("Executive summary")
+    return alone and _is_short_label(line)
+
+
+def iter_blocks(pages: Iterable[str]) -> Iterator[Tuple[str, str, int]]:
+    """Split page texts into (kind, text, page_no) blocks, one page at a time.
+
+    kind is "heading", "table" or "text". Table blocks keep one row per line
+    (with a short caption line in front, if any); text blocks are paragraphs
+    with wrapped lines re-joined. Page numbers start at 1.
+    """
+    for page_no, page in enumerate(pages, 1):
+        for para in re.split(r"\n\s*\n", page):
+            lines = [" ".join(line.split()) for line in para.split("\n")]
+            lines = [line for line in lines if line]
+            kind, run = "", []  # current run of same-kind lines
+
+            def emit():
+                if not run:
+                    return None
+                if kind == "table":
+                    return ("table", "\n".join(run), page_no)
+                text = run[0]
+                for line in run[1:]:
+                    # Re-join words hyphenated across a line break
+                    text = text[:-1] + line if text.endswith("-") and line[:1].islower() else f"{text} {line}"
+                return ("text", text, page_no)
+
+            for line in lines:
+                if _is_heading(line, alone=len(lines) == 1) and not _is_table_row(line):
+                    block = emit()
+                    if block:
+                        yield block
+                    kind, run = "", []
+                    yield ("heading", line, page_no)
+                    continue
+                line_kind = "table" if _is_table_row(line) else "text"
+                if line_kind != kind:
+                    caption = None
+                    if line_kind == "table" and kind == "text" and _is_short_label(run[-1]):
+                        caption = run.pop()
+                    block = emit()
+                    if block:
+                        yield block
+                    kind, run = line_kind, [caption] if caption else []
+                run.append(line)
+            block = emit()
+            if block:
+                yield block
+
+
+def _block_units(kind: str, text: str, max_tokens: int, token_len: Callable[[str], int]) -> Tuple[str, List[str]]:
+    """(prefix, units) for a block too big for one chunk.
+
+    Tables split into rows, with the caption/header rows returned as a prefix
+    to repeat in every chunk; text splits into sentences. Anything still over
+    `max_tokens` is cut into word runs.
+    """
+    prefix = ""
+    if kind == "table":
+        rows = text.split("\n")
+        n_head = next((i + 1 for i, row in enumerate(rows) if _is_table_row(row)), 0)
+        # A header row has labels where the rows below have numbers
+        is_header = 0 < n_head < len(rows) and (
+            len(_NUMERIC_CELL.findall(rows[n_head - 1])) < len(_NUMERIC_CELL.findall(rows[n_head]))
+        )
+        if is_header and token_len("\n".join(rows[:n_head])) <= max_tokens // 4:
+            prefix, rows = "\n".join(rows[:n_head]), rows[n_head:]
+        units = rows
+    else:
+        units = _SENTENCE_END.split(text)
+
+    room = max_tokens - (token_len(prefix) if prefix else 0)
+    out: List[str] = []
+    for unit in units:
+        if token_len(unit) <= room:
+            out.append(unit)
+            continue
+        words: List[str] = []
+        for word in unit.split():
+            if words and token_len(" ".join(words + [word])) > room:
+                out.append(" ".join(words))
+                words = []
+            words.append(word)
+        if words:
+            out.append(" ".join(words))
+    return prefix, out
+
+
+def chunk_min_tokens(max_tokens: int) -> int:
+    """CHUNK_MIN_TOKENS, capped so short sections still get chunks of their own."""
+    return min(settings.CHUNK_MIN_TOKENS, max_tokens * 3 // 4)
+
+
+def iter_chunks(
+    pages: Iterable[str],
+    max_tokens: int = 240,
+    min_tokens: int = 64,
+    token_len: Optional[Callable[[str], int]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Pack page blocks into chunks of at most `max_tokens` tokens.
+
+    Headings start a new chunk (unless the current one is still under
+    `min_tokens`) and are repeated at the top of each chunk in their
+    section. Tables and paragraphs are kept whole when they fit, otherwise
+    cut at row or sentence boundaries. `token_len` should count
+    embedding-model tokens so the model never truncates a chunk. Yields
+    {"text", "page_start", "page_end", "section"}; only the chunk being
+    built and the current page are held in memory.
+    """
+    token_len = token_len or count_tokens
+    heading, heading_tokens = "", 0
+    parts: List[str] = []
+    tokens = 0
+    page_start = page_end = 0
+    chunk_heading = ""
+
+    def flush() -> Optional[Dict[str, Any]]:
+        nonlocal parts, tokens
+        if not parts:
+            return None
+        body = "\n".join(parts)
+        text = f"{chunk_heading}\n{body}" if chunk_heading and parts[0] != chunk_heading else body
+        parts, tokens = [], 0
+        return {"text": text, "page_start": page_start, "page_end": page_end, "section": chunk_heading}
+
+    def add(text: str, n: int, page_no: int) -> None:
+        nonlocal tokens, page_start, page_end, chunk_heading
+        if not parts:
+            page_start, chunk_heading = page_no, heading
+        parts.append(text)
+        tokens += n
+        page_end = page_no
+
+    def cap() -> int:
+        # Room left for body text once the section heading is prepended
+        return max_tokens - (token_len(chunk_heading) if parts and chunk_heading else heading_tokens)
+
+    for kind, text, page_no in iter_blocks(pages):
+        if kind == "heading":
+            heading_n = token_len(text)
+            if tokens >= min_tokens or tokens + heading_n > cap():
+                yield flush()
+            heading, heading_tokens = text, heading_n
+            if parts:
+                add(text, heading_tokens, page_no)  # short section: keep going, heading inline
+            continue
+
+        n = token_len(text)
+        if tokens + n <= cap():
+            add(text, n, page_no)
+            continue
+        # A table that fits in a chunk of its own moves to a fresh chunk once
+        # this one is `min_tokens` full; otherwise tables (row by row, header
+        # repeated) and paragraphs (sentence by sentence) fill the current
+        # chunk and spill over into the next
+        if tokens >= min_tokens and kind == "table" and n <= max_tokens - heading_tokens:
+            yield flush()
+            add(text, n, page_no)
+            continue
+
+        # Too big for one chunk: spill it over as many chunks as needed
+        prefix, units = _block_units(kind, text, max_tokens - heading_tokens, token_len)
+        prefix_tokens = token_len(prefix) if prefix else 0
+        if parts and units and tokens + prefix_tokens + token_len(units[0]) > cap():
+            yield flush()  # not even the header and a first row fit here
+        if prefix:
+            add(prefix, prefix_tokens, page_no)
+        for unit in units:
+            m = token_len(unit)
+            if tokens + m > cap() and tokens > prefix_tokens:
+                yield flush()
+                if prefix:
+                    add(prefix, prefix_tokens, page_no)
+            add(unit, m, page_no)
+
+    chunk = flush()
+    if chunk:
+        yield chunk
+
+
+def _timed_chunks(chunks: Iterator[Dict[str, Any]], stats: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    # Chunking time = time spent producing chunks minus time waiting for pages
+    while True:
+        t0 = time.perf_counter()
+        extract_before = stats.get("extract_seconds", 0.0)
+        chunk = next(chunks, None)
+        stats["chunk_seconds"] += time.perf_counter() - t0 - (stats.get("extract_seconds", 0.0) - extract_before)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def index_pages(
+    pages: Iterable[str],
+    metadata: Dict[str, str],
+    report_id: str,
+    collection,
+    embed,
+    batch_size: int = 64,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    max_tokens: int = 240,
+    token_len: Optional[Callable[[str], int]] = None,
+) -> Dict[str, Any]:
+    """Chunk, embed and upsert a stream of page texts in bounded batches.
+
+    `embed` maps a list of texts to a list of vectors; `progress` is called
+    with a stats snapshot after every batch. `max_tokens`/`token_len` size
+    the chunks (see iter_chunks). Chunk ids are deterministic and written
+    with upsert, so re-running a job is safe.
+    """
+    stats = stats if stats is not None else {}
+    stats.update({
+        "chunks": 0, "chunks_reused": 0,
+        "chunk_seconds": 0.0, "embed_seconds": 0.0, "upsert_seconds": 0.0, "lexical_seconds": 0.0,
+    })
+
+    docs: List[str] = []
+    metadatas: List[Dict[str, str]] = []
+    ids: List[str] = []
+
+    def flush() -> None:
+        # Only embed chunk texts the store (or this batch) hasn't seen before
+        t0 = time.perf_counter()
+        hashes = [md["chunk_sha"] for md in metadatas]
+        known = existing_embeddings(collection, hashes)
+        missing = {h: doc for h, doc in zip(hashes, docs) if h not in known}
+        t1 = time.perf_counter()
+        if missing:
+            known.update(zip(missing, embed(list(missing.values()))))
+        t2 = time.perf_counter()
+        stats["chunks_reused"] += len(hashes) - len(missing)
+
+        collection.upsert(ids=ids, documents=docs, metadatas=metadatas, embeddings=[known[h] for h in hashes])
+        t3 = time.perf_counter()
+        lexical.index_chunks(ids, docs, metadatas)
+        stats["embed_seconds"] += t2 - t1
+        stats["upsert_seconds"] += (t1 - t0) + (t3 - t2)  # Chroma lookup + write
+        stats["lexical_seconds"] += time.perf_counter() - t3
+        docs.clear()
+        metadatas.clear()
+        ids.clear()
+        if progress is not None:
+            progress(dict(stats))
+
+    chunks = iter_chunks(pages, max_tokens, chunk_min_tokens(max_tokens), token_len)
+    for idx, chunk in enumerate(_timed_chunks(chunks, stats)):
+        md, chunk_id = chunk_record(
+            metadata, report_id, idx, chunk["text"], (chunk["page_start"], chunk["page_end"]), chunk["section"]
+        )
+        docs.append(chunk["text"])
+        metadatas.append(md)
+        ids.append(chunk_id)
+        stats["chunks"] += 1
+        if len(docs) >= batch_size:
+            flush()
+    if docs:
+        flush()
+
+    embedded = stats["chunks"] - stats["chunks_reused"]
+    for key in ("chunk_seconds", "upsert_seconds", "lexical_seconds"):
+        stats[key] = round(stats[key], 3)
+    stats["dedup_ratio"] = round(stats["chunks_reused"] / stats["chunks"], 3) if stats["chunks"] else 0.0
+    # Estimated from this job's own per-chunk embedding time
+    stats["embed_seconds_saved"] = round(
+        stats["chunks_reused"] * stats["embed_seconds"] / embedded, 3
+    ) if embedded else None
+    stats["embed_seconds"] = round(stats["embed_seconds"], 3)
+    return stats
+
+
+def index_pdf(
+    path: str,
+    metadata: Dict[str, str],
+    report_id: str,
+    collection,
+    embed,
+    pool: Executor,
+    batch_size: int = 64,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    max_tokens: int = 240,
+    token_len: Optional[Callable[[str], int]] = None,
+) -> Dict[str, Any]:
+    """Extract pages in `pool` and index them with index_pages.
+
+    Returns throughput stats for the job.
+    """
+    t0 = time.perf_counter()
+    n_pages = pdf_page_count(path)
+    stats = {"pages": 0, "pages_total": n_pages, "bytes": os.path.getsize(path), "extract_seconds": 0.0}
+
+    def counted_pages() -> Iterator[str]:
+        pages = iter_pdf_pages(path, pool, n_pages=n_pages)
+        while True:
+            # Time blocked on the extraction pool (extraction itself overlaps indexing)
+            t0 = time.perf_counter()
+            page = next(pages, None)
+            stats["extract_seconds"] += time.perf_counter() - t0
+            if page is None:
+                return
+            stats["pages"] += 1
+            yield page
+
+    index_pages(
+        counted_pages(), metadata, report_id, collection, embed, batch_size, progress, stats,
+        max_tokens=max_tokens, token_len=token_len,
+    )
+
+    elapsed = time.perf_counter() - t0
+    stats["seconds"] = round(elapsed, 3)
+    stats["extract_seconds"] = round(stats["extract_seconds"], 3)
+    stats["pages_per_s"] = round(stats["pages"] / elapsed, 2) if elapsed else None
+    stats["mb_per_s"] = round(stats["bytes"] / 1e6 / elapsed, 2) if elapsed else None
+    return stats
+
+
+def copy_report_vectors(
+    collection,
+    src_report_id: str,
+    report_id: str,
+    metadata: Dict[str, str],
+    batch_size: int = 256,
+    source_collection=None,
+) -> Dict[str, Any]:
+    """Link an already-indexed file to a new user/report without re-extracting
+    or re-embedding: copy its chunks and stored vectors under the new metadata.
+    `source_collection` is where the source report lives, if not `collection`."""
+    t0 = time.perf_counter()
+    source_collection = source_collection if source_collection is not None else collection
+    copied = 0
+    offset = 0
+    while True:
+        res = source_collection.get(
+            where={"report_id": src_report_id},
+            include=["documents", "metadatas", "embeddings"],
+            limit=batch_size,
+            offset=offset,
+        )
+        if not res["ids"]:
+            break
+        metadatas, ids = [], []
+        for src_md, doc in zip(res["metadatas"], res["documents"]):
+            pages = (src_md["page_start"], src_md["page_end"]) if "page_start" in src_md else None
+            md, chunk_id = chunk_record(
+                metadata, report_id, int(src_md["chunk_id"]), doc, pages, src_md.get("section", "")
+            )
+            metadatas.append(md)
+            ids.append(chunk_id)
+        collection.upsert(ids=ids, documents=res["documents"], metadatas=metadatas, embeddings=res["embeddings"])
+        lexical.index_chunks(ids, res["documents"], metadatas)
+        copied += len(ids)
+        offset += len(res["ids"])
+
+    return {
+        "chunks": copied,
+        "chunks_reused": copied,
+        "dedup_ratio": 1.0 if copied else 0.0,
+        "duplicate_of": src_report_id,
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
@@ -0,0 +1,312 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from typing import Any, Dict, List, Optional
+
+from app.cache import answer_cache
+from app.config import settings
+from app import lexical, queries
+from app.db import database
+from app.embeddings import embed_texts
+from app.executor import get_process_pool, run_blocking
+from app.ingest import copy_report_vectors, index_pdf, report_id_for
+from app.metrics import INGEST_CHUNKS, INGEST_PAGES, record_stage
+from app.partitions import write_collection
+from app.summaries import build_report_summaries, copy_report_summaries, invalidate_report_summaries
+from app.vectorstore import store
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+# ---------- Job rows ----------
+async def _update_job(job_id: str, **fields: Any) -> None:
+    cols = ", ".join(f"{k} = ?" for k in fields)
+    await database.execute(
+        f"UPDATE ingestion_jobs SET {cols}, updated_at = datetime('now') WHERE job_id = ?",
+        (*fields.values(), job_id),
+    )
+
+
+async def get_job(db, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    cur = await db.execute(
+        """
+        SELECT job_id, report_id, filename, status, stage, percent, stats, error, created_at, updated_at
+        FROM ingestion_jobs WHERE job_id = ? AND user_id = ?
+        """,
+        (job_id, user_id),
+    )
+    row = await cur.fetchone()
+    await cur.close()
+    if row is None:
+        return None
+    job = dict(row)
+    job["stats"] = json.loads(job["stats"]) if job["stats"] else None
+    return job
+
+
+# ---------- Worker pool ----------
+class JobQueue:
+    """Bounded in-process ingestion queue, with job state persisted in SQLite.
+
+    INGEST_WORKERS jobs run at once; INGEST_QUEUE_SIZE bounds the backlog and
+    INGEST_MAX_PENDING_PER_USER stops one user from filling it. Jobs that were
+    queued or running when the process stopped are picked up again on start.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=settings.INGEST_QUEUE_SIZE)
+        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+
+        unfinished = await database.fetchall(
+            "SELECT job_id, file_path FROM ingestion_jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+        )
+
+        for row in unfinished:
+            if not os.path.exists(row["file_path"]):
+                await _update_job(row["job_id"], status="failed", stage="failed", error="Upload file missing after restart")
+            elif self._queue.full():
+                await _update_job(row["job_id"], status="failed", stage="failed", error="Queue full after restart")
+            else:
+                await _update_job(row["job_id"], status="queued", stage="queued", percent=0)
+                self._queue.put_nowait(row["job_id"])
+        if unfinished:
+            logger.info("Resumed %d ingestion jobs", len(unfinished))
+
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"ingest-{i}")
+            for i in range(settings.INGEST_WORKERS)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def enqueue(
+        self,
+        user_id: str,
+        file_path: str,
+        file_sha256: str,
+        filename: str,
+        fields: Dict[str, str],
+    ) -> Dict[str, Any]:
+        report_id = report_id_for(user_id, file_sha256)
+
+        # Exact duplicate for this user: already indexed or already queued
+        indexed = await queries.get_report(report_id)
+        in_flight = await database.fetchone(
+            "SELECT job_id FROM ingestion_jobs WHERE report_id = ? AND status IN ('queued', 'running')",
+            (report_id,),
+        )
+        if indexed is not None or in_flight is not None:
+            _remove(file_path)
+            if in_flight is not None:
+                return {"job_id": in_flight["job_id"], "report_id": report_id, "status": "queued", "duplicate": True}
+            job_id = await self._insert_job(
+                user_id, report_id, "", file_sha256, filename, fields,
+                status="done", stats={"duplicate_of": report_id, "chunks": 0, "dedup_ratio": 1.0},
+            )
+            return {"job_id": job_id, "report_id": report_id, "status": "done", "duplicate": True}
+
+        if self._queue is None or self._queue.full():
+            raise QueueFull("Ingestion queue is full, retry later")
+
+        (pending,) = await database.fetchone(
+            "SELECT COUNT(*) FROM ingestion_jobs WHERE user_id = ? AND status IN ('queued', 'running')",
+            (user_id,),
+        )
+        if pending >= settings.INGEST_MAX_PENDING_PER_USER:
+            raise QueueFull(f"{pending} uploads already pending for this user")
+
+        job_id = await self._insert_job(user_id, report_id, file_path, file_sha256, filename, fields)
+        self._queue.put_nowait(job_id)
+        return {"job_id": job_id, "report_id": report_id, "status": "queued", "duplicate": False}
+
+    async def _insert_job(
+        self,
+        user_id: str,
+        report_id: str,
+        file_path: str,
+        file_sha256: str,
+        filename: str,
+        fields: Dict[str, str],
+        status: str = "queued",
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        job_id = str(uuid.uuid4())
+        await database.execute(
+            """
+            INSERT INTO ingestion_jobs(job_id, user_id, report_id, file_path, file_sha256, filename,
+                                       title, bank, asset_class, date, status, stage, percent, stats)
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                job_id, user_id, report_id, file_path, file_sha256, filename,
+                fields["title"], fields["bank"], fields["asset_class"], fields["date"],
+                status, status, 100 if status == "done" else 0,
+                json.dumps(stats) if stats is not None else None,
+            ),
+        )
+        return job_id
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.exception("Ingestion job %s failed", job_id)
+                await _update_job(job_id, status="failed", stage="failed", error=str(exc))
+                await self._discard(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _discard(self, job_id: str) -> None:
+        # Nothing retries a failed job: drop its upload, and any chunks it got
+        # indexed unless the report was already registered (they would show up
+        # in unscoped searches for a report that doesn't exist)
+        try:
+            job = await database.fetchone(
+                "SELECT user_id, report_id, asset_class, file_path FROM ingestion_jobs WHERE job_id = ?",
+                (job_id,),
+            )
+            if job is None:
+                return
+            _remove(job["file_path"])
+            if await queries.get_report(job["report_id"], job["user_id"]) is None:
+                await run_blocking(_delete_chunks, job["user_id"], job["asset_class"], job["report_id"])
+        except Exception:
+            logger.exception("Cleaning up failed ingestion job %s failed", job_id)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _run(self, job_id: str) -> None:
+        job = dict(await database.fetchone("SELECT * FROM ingestion_jobs WHERE job_id = ?", (job_id,)))
+
+        # Same file already indexed for another user -> reuse its vectors
+        source = await queries.find_report_by_file(job["file_sha256"], job["report_id"])
+
+        await _update_job(job_id, status="running", stage="indexing", percent=0)
+        # Re-ingesting: summaries of the previous run must not outlive its chunks
+        await invalidate_report_summaries(job["report_id"])
+
+        metadata = {
+            "user_id": job["user_id"],
+            "bank": job["bank"],
+            "asset_class": job["asset_class"],
+            "title": job["title"],
+            "date": job["date"],
+            "filename": job["filename"] or "",
+        }
+
+        loop = asyncio.get_running_loop()
+        updates = []
+
+        def progress(stats: Dict[str, Any]) -> None:
+            # Called from the indexing thread after every batch
+            percent = 100.0 * stats["pages"] / stats["pages_total"] if stats["pages_total"] else 0.0
+            updates.append(asyncio.run_coroutine_threadsafe(
+                _update_job(job_id, percent=round(min(percent, 99.0), 1)), loop
+            ))
+
+        col = await run_blocking(write_collection, job["user_id"], job["asset_class"])
+        if source is not None:
+            source_col = await run_blocking(write_collection, source["user_id"], source["asset_class"])
+            stats = await run_blocking(
+                copy_report_vectors, col, source["report_id"], job["report_id"], metadata,
+                source_collection=source_col,
+            )
+        else:
+            stats = await run_blocking(
+                index_pdf,
+                job["file_path"],
+                metadata,
+                job["report_id"],
+                col,
+                embed_texts,
+                get_process_pool(),
+                batch_size=settings.INGEST_BATCH_SIZE,
+                progress=progress,
+                max_tokens=store.chunk_tokens(),
+                token_len=store.token_len,
+            )
+
+        _record_ingest_metrics(stats, copied=source is not None)
+
+        # Let in-flight progress writes land before the final state
+        await asyncio.gather(*(asyncio.wrap_future(f) for f in updates), return_exceptions=True)
+        await _update_job(job_id, stage="finalizing")
+        await queries.upsert_report(
+            job["report_id"], job["user_id"], job["filename"], job["title"],
+            job["bank"], job["asset_class"], job["date"], job["file_sha256"],
+        )
+
+        # New chunks change what retrieval can return for this user
+        answer_cache.invalidate_report(job["user_id"], job["report_id"])
+
+        if settings.REPORT_SUMMARIES:
+            await _update_job(job_id, stage="summarizing", percent=99)
+            stats["summaries"] = await _summarize(job, source, col)
+
+        await _update_job(job_id, status="done", stage="done", percent=100, stats=json.dumps(stats))
+        logger.info("Indexed report %s: %s", job["report_id"], stats)
+
+        _remove(job["file_path"])
+
+
+async def _summarize(job: Dict[str, Any], source: Optional[Dict[str, Any]], col) -> Dict[str, Any]:
+    # Optional extra: a failure here leaves the report indexed, just unsummarized
+    try:
+        if source is not None:
+            copied = await copy_report_summaries(source["report_id"], job["report_id"], job["file_sha256"])
+            if copied:
+                return {"copied_from": source["report_id"], "rows": copied}
+        stats = await build_report_summaries(col, job["report_id"], job["title"], job["file_sha256"])
+    except Exception as exc:
+        logger.exception("Summarizing report %s failed", job["report_id"])
+        return {"error": str(exc)}
+    record_stage("summarize", stats.get("seconds", 0.0), pipeline="ingest")
+    return stats
+
+
+INGEST_STAGES = ("extract", "chunk", "embed", "upsert", "lexical")
+
+
+def _record_ingest_metrics(stats: Dict[str, Any], copied: bool) -> None:
+    if copied:
+        record_stage("copy_vectors", stats.get("seconds", 0.0), pipeline="ingest")
+    else:
+        for name in INGEST_STAGES:
+            record_stage(name, stats.get(f"{name}_seconds", 0.0), pipeline="ingest")
+        INGEST_PAGES.inc(stats.get("pages", 0))
+    INGEST_CHUNKS.inc(stats.get("chunks", 0))
+
+
+def _delete_chunks(user_id: str, asset_class: str, report_id: str) -> int:
+    write_collection(user_id, asset_class).delete(where={"report_id": report_id})
+    return lexical.delete_report(report_id)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+job_queue = JobQueue()
@@ -0,0 +1,145 @@
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app import db as app_db
+
+# ---------- BM25 index over chunks (SQLite FTS5) ----------
+# Lives in its own database file (db.lexical_db_path()), so its writes never
+# wait on the app database's writer. Rows mirror the Chroma chunk ids, and
+# the filter columns match the Chroma metadata, so lexical and vector search
+# see the same user_id/bank/asset_class/report_id scope. The tables are
+# created on first use.
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "do", "does", "for", "from", "how", "in",
+    "is", "it", "of", "on", "or", "that", "the", "their", "they", "this", "to", "was", "what",
+    "when", "which", "who", "why", "will", "with", "about", "report", "say", "says",
+}
+
+# Keeps "EUR/USD", "1.12" and "US0378331005" together as one term
+_TERM = re.compile(r"[A-Za-z0-9]+(?:[./][A-Za-z0-9]+)*")
+
+_local = threading.local()
+# Writers in this process take turns instead of spinning on the file lock
+_write_lock = threading.Lock()
+
+
+def _conn() -> sqlite3.Connection:
+    # One connection per thread; callers run in the blocking executor.
+    path = app_db.lexical_db_path()
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != path:
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.executescript(app_db.CHUNKS_FTS_SCHEMA)
+        _local.conn, _local.path = conn, path
+    return conn
+
+
+def index_chunks(ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+    """Add or replace chunks (same ids as Chroma)."""
+    conn = _conn()
+    with _write_lock, conn:
+        _delete_rowids(conn, [
+            r for (r,) in conn.execute(
+                f"SELECT rowid FROM lexical_chunks WHERE chunk_key IN ({','.join('?' * len(ids))})", ids
+            )
+        ])
+        for chunk_key, doc, md in zip(ids, documents, metadatas):
+            cur = conn.execute(
+                "INSERT INTO lexical_chunks(chunk_key, user_id, report_id, bank, asset_class) VALUES(?, ?, ?, ?, ?)",
+                (chunk_key, md.get("user_id"), md.get("report_id"), md.get("bank"), md.get("asset_class")),
+            )
+            conn.execute("INSERT INTO chunks_fts(rowid, text) VALUES(?, ?)", (cur.lastrowid, doc))
+
+
+def delete_report(report_id: str) -> int:
+    """Drop a report's chunks; returns how many there were."""
+    conn = _conn()
+    with _write_lock, conn:
+        rowids = [r for (r,) in conn.execute("SELECT rowid FROM lexical_chunks WHERE report_id = ?", (report_id,))]
+        _delete_rowids(conn, rowids)
+    return len(rowids)
+
+
+def report_ids() -> List[str]:
+    return [r for (r,) in _conn().execute("SELECT DISTINCT report_id FROM lexical_chunks")]
+
+
+def optimize() -> None:
+    """Merge the FTS index segments (worth it after large deletes)."""
+    conn = _conn()
+    with _write_lock, conn:
+        conn.execute("INSERT INTO chunks_fts(chunks_fts) VALUES('optimize')")
+
+
+def _delete_rowids(conn: sqlite3.Connection, rowids: List[int]) -> None:
+    conn.executemany("DELETE FROM chunks_fts WHERE rowid = ?", [(r,) for r in rowids])
+    conn.executemany("DELETE FROM lexical_chunks WHERE rowid = ?", [(r,) for r in rowids])
+
+
+def match_expression(query: str) -> Optional[str]:
+    # Each term becomes an FTS phrase, so "EUR/USD" must match "eur" "usd" adjacently
+    terms = [t for t in _TERM.findall(query) if t.lower() not in STOPWORDS]
+    if not terms:
+        return None
+    phrases = dict.fromkeys('"' + " ".join(re.split(r"[./]", t)) + '"' for t in terms)
+    return " OR ".join(phrases)
+
+
+def search(
+    query: str,
+    user_id: str,
+    bank: Optional[str] = None,
+    asset_class: Optional[str] = None,
+    report_ids: Optional[Sequence[str]] = None,
+    k: int = 6,
+) -> List[Tuple[str, float]]:
+    """Top-k (chunk_key, bm25) pairs, best first. bm25() is lower-is-better."""
+    expr = match_expression(query)
+    if expr is None:
+        return []
+
+    sql = """
+        SELECT c.chunk_key, bm25(chunks_fts) AS score
+        FROM chunks_fts JOIN lexical_chunks c ON c.rowid = chunks_fts.rowid
+        WHERE chunks_fts MATCH ? AND c.user_id = ?
+    """
+    params: List[Any] = [expr, user_id]
+    if bank:
+        sql += " AND c.bank = ?"
+        params.append(bank)
+    if asset_class:
+        sql += " AND c.asset_class = ?"
+        params.append(asset_class)
+    if report_ids:
+        sql += f" AND c.report_id IN ({','.join('?' * len(report_ids))})"
+        params.extend(report_ids)
+    sql += " ORDER BY score LIMIT ?"
+    params.append(k)
+
+    return _conn().execute(sql, params).fetchall()
+
+
+def asset_classes(user_id: str, report_ids: Optional[Sequence[str]] = None) -> List[str]:
+    """Asset classes the user has chunks under (within `report_ids`, if given)."""
+    conn = _conn()
+    if report_ids:
+        rows = conn.execute(
+            f"SELECT DISTINCT asset_class FROM lexical_chunks WHERE user_id = ?"
+            f" AND report_id IN ({','.join('?' * len(report_ids))})",
+            [user_id, *report_ids],
+        )
+        return sorted(a for (a,) in rows if a is not None)
+    # One index seek per distinct value, however many chunks the user has
+    found: List[str] = []
+    while True:
+        (value,) = conn.execute(
+            f"SELECT MIN(asset_class) FROM lexical_chunks WHERE user_id = ? AND asset_class {'>' if found else '>='} ?",
+            (user_id, found[-1] if found else ""),
+        ).fetchone()
+        if value is None:
+            return found
+        found.append(value)
@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from openai import APIConnectionError, APIStatusError
+
+from app.config import settings
+from app.context import count_tokens
+from app.metrics import LLM_CALLS, LLM_TOKENS
+from app.providers import Completion, Provider, ProviderNotConfigured, create_provider, resolve
+
+logger = logging.getLogger(__name__)
+
+# Call purposes with their own provider/model (see providers.resolve)
+PURPOSES = ("router", "summary", "report_summary", "retrieve_summarize", "retrieve_extract", "compare", "internal_kb")
+
+
+class LLMUnavailable(RuntimeError):
+    """The LLM could not answer in time: retries exhausted, deadline hit or breaker open."""
+
+
+# ---------- Circuit breaker ----------
+class CircuitBreaker:
+    """Fails fast once calls keep failing.
+
+    Opens when at least `threshold` of the last 2 * `threshold` calls failed
+    and they are at least half of them, so a few slow calls in a healthy
+    stream don't trip it. After `cooldown_s` one probe call is let through
+    (half-open); its outcome closes the breaker or restarts the cooldown.
+    """
+
+    def __init__(self, threshold: int, cooldown_s: float):
+        self.threshold = threshold
+        self.cooldown_s = cooldown_s
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._outcomes: "deque[bool]" = deque(maxlen=max(2 * threshold, 1))
+
+    @property
+    def failures(self) -> int:
+        return self._outcomes.count(False)
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self._probing or time.monotonic() - self.opened_at >= self.cooldown_s:
+            return "half_open"
+        return "open"
+
+    def check(self) -> bool:
+        """Raises while open; True when this call is the half-open probe."""
+        if self.threshold <= 0 or self.opened_at is None:
+            return False
+        if self._probing or time.monotonic() - self.opened_at < self.cooldown_s:
+            raise LLMUnavailable("LLM circuit breaker is open")
+        self._probing = True
+        return True
+
+    def release_probe(self) -> None:
+        # A probe that ended without a verdict (cancelled, rejected request,
+        # no free slot): stay half-open and let the next call probe
+        self._probing = False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            self._outcomes.clear()
+            logger.info("LLM circuit breaker closed")
+        self._outcomes.append(True)
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._outcomes.append(False)
+        self._probing = False
+        failures = self.failures
+        tripped = failures >= self.threshold and 2 * failures >= len(self._outcomes)
+        if self.threshold > 0 and (self.opened_at is not None or tripped):
+            if self.opened_at is None:
+                logger.warning("LLM circuit breaker opened: %d of the last %d calls failed",
+                               failures, len(self._outcomes))
+            self.opened_at = time.monotonic()
+
+
+stats: Dict[str, int] = {
+    "calls": 0,
+    "retries": 0,
+    "failures": 0,
+    "rejected": 0,
+    "in_flight": 0,
+}
+
+
+# ---------- Provider lanes ----------
+# One provider instance (one keep-alive pool), concurrency limiter and
+# circuit breaker per provider per worker, created on first use.
+class _Lane:
+    def __init__(self, provider: Provider):
+        self.provider = provider
+        self.slots = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        self.breaker = CircuitBreaker(settings.LLM_BREAKER_THRESHOLD, settings.LLM_BREAKER_COOLDOWN_S)
+
+
+_lanes: Dict[str, _Lane] = {}
+
+
+def _lane(name: str) -> _Lane:
+    lane = _lanes.get(name)
+    if lane is None:
+        try:
+            lane = _lanes[name] = _Lane(create_provider(name))
+        except ProviderNotConfigured as exc:
+            stats["rejected"] += 1
+            raise LLMUnavailable(str(exc)) from None
+    return lane
+
+
+async def close_llm_client() -> None:
+    lanes = list(_lanes.values())
+    _lanes.clear()
+    for lane in lanes:
+        await lane.provider.close()
+
+
+def llm_stats() -> Dict[str, Any]:
+    return {
+        **stats,
+        "max_concurrency": settings.LLM_MAX_CONCURRENCY,
+        "routes": {purpose: "%s:%s" % resolve(purpose) for purpose in PURPOSES},
+        "providers": {
+            name: {
+                "waiting": len(getattr(lane.slots, "_waiters", None) or ()),
+                "breaker": lane.breaker.state,
+                "recent_failures": lane.breaker.failures,
+            }
+            for name, lane in _lanes.items()
+        },
+    }
+
+
+# ---------- Retries ----------
+def _retryable(exc: BaseException) -> bool:
+    if isinstance(exc, APIStatusError):
+        return exc.status_code in (408, 429) or exc.status_code >= 500
+    return isinstance(exc, APIConnectionError)  # includes APITimeoutError
+
+
+def _backoff(attempt: int, exc: BaseException) -> float:
+    # Full jitter; a Retry-After from the server is a lower bound
+    delay = random.uniform(0, min(settings.LLM_BACKOFF_MAX_S, settings.LLM_BACKOFF_BASE_S * 2 ** attempt))
+    if isinstance(exc, APIStatusError):
+        try:
+            delay = max(delay, float(exc.response.headers.get("retry-after", 0)))
+        except ValueError:
+            pass
+    return min(delay, settings.LLM_BACKOFF_MAX_S)
+
+
+async def _call(purpose: str, deadline_s: Optional[float], stream: bool, messages, params) -> Tuple[Any, _Lane, bool]:
+    """Provider call under the limiter, retries and deadline.
+
+    For streams the concurrency slot stays taken on success and the caller
+    must release it (streams hold it until the last token). The caller also
+    records the stream's outcome with the breaker, and releases the probe
+    when the returned flag says the stream is the half-open probe.
+    """
+    provider_name, model = resolve(purpose)
+    lane = _lane(provider_name)
+    deadline_s = deadline_s or settings.LLM_DEADLINE_S
+    deadline = time.monotonic() + deadline_s
+    try:
+        probe = lane.breaker.check()
+    except LLMUnavailable:
+        stats["rejected"] += 1
+        raise
+    stats["calls"] += 1
+    keep_probe = False
+    try:
+        result = await _attempts(lane, provider_name, model, deadline, deadline_s, stream, messages, params)
+        keep_probe = probe and stream  # the stream's outcome is the probe's verdict
+        return result, lane, keep_probe
+    finally:
+        if probe and not keep_probe:
+            lane.breaker.release_probe()  # no-op once recorded as a success or failure
+
+
+async def _attempts(
+    lane: _Lane, provider_name: str, model: str, deadline: float, deadline_s: float, stream: bool, messages, params
+) -> Any:
+    attempt = 0
+    while True:
+        if attempt and lane.breaker.state == "open":
+            # Tripped by other calls while this one was backing off
+            stats["failures"] += 1
+            raise LLMUnavailable(f"LLM circuit breaker for '{provider_name}' is open")
+        try:
+            await asyncio.wait_for(lane.slots.acquire(), max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            stats["failures"] += 1
+            raise LLMUnavailable(f"no LLM slot free within {deadline_s:.0f}s") from None
+
+        stats["in_flight"] += 1
+        keep_slot = False
+        try:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                # Per-attempt timeout below the deadline, so a stalled attempt can be retried
+                timeout = min(settings.LLM_TIMEOUT_S, remaining)
+                method = lane.provider.open_stream if stream else lane.provider.complete
+                result = await asyncio.wait_for(method(model, messages, timeout, **params), remaining)
+                keep_slot = stream  # handed to the stream wrapper, which releases it
+            finally:
+                # Every other exit (errors, timeouts, cancellation) gives the slot back
+                if not keep_slot:
+                    stats["in_flight"] -= 1
+                    lane.slots.release()
+        except (Exception, asyncio.TimeoutError) as exc:
+            timed_out = isinstance(exc, asyncio.TimeoutError)
+            if not timed_out and not _retryable(exc):
+                raise
+            delay = 0.0 if timed_out else _backoff(attempt, exc)
+            if timed_out or attempt >= settings.LLM_MAX_RETRIES or time.monotonic() + delay >= deadline:
+                stats["failures"] += 1
+                lane.breaker.record_failure()
+                raise LLMUnavailable(
+                    "LLM deadline exceeded" if timed_out else f"LLM call failed after {attempt + 1} attempts: {exc}"
+                ) from exc
+            attempt += 1
+            stats["retries"] += 1
+            logger.info("LLM call to %s failed (%s), retry %d in %.2fs", provider_name, exc, attempt, delay)
+            await asyncio.sleep(delay)
+            continue
+
+        if not stream:
+            lane.breaker.record_success()  # a stream only succeeds once fully read
+        return result
+
+
+# ---------- Calls ----------
+async def _metered_call(
+    purpose: str, deadline_s: Optional[float], stream: bool, messages, params
+) -> Tuple[Any, _Lane, bool]:
+    try:
+        return await _call(purpose, deadline_s, stream, messages, params)
+    except Exception as exc:
+        outcome = "unavailable" if isinstance(exc, LLMUnavailable) else "error"
+        LLM_CALLS.inc(purpose=purpose, provider=resolve(purpose)[0], outcome=outcome)
+        raise
+
+
+def _count_usage(
+    purpose: str, provider: str, messages, prompt_tokens: Optional[int], completion_tokens: int, outcome: str = "ok"
+) -> None:
+    if prompt_tokens is None:
+        prompt_tokens = sum(count_tokens(m["content"]) for m in messages)
+    LLM_CALLS.inc(purpose=purpose, provider=provider, outcome=outcome)
+    LLM_TOKENS.inc(prompt_tokens, purpose=purpose, provider=provider, direction="prompt")
+    LLM_TOKENS.inc(completion_tokens, purpose=purpose, provider=provider, direction="completion")
+
+
+async def chat_completion(
+    purpose: str,
+    messages: List[Dict[str, str]],
+    deadline_s: Optional[float] = None,
+    **params: Any,
+) -> Completion:
+    """A completion from the model configured for `purpose`, with pooling,
+    concurrency limit, retries and a deadline."""
+    completion, _, _ = await _metered_call(purpose, deadline_s, False, messages, params)
+    _count_usage(
+        purpose, completion.provider, messages, completion.prompt_tokens,
+        completion.completion_tokens if completion.completion_tokens is not None else count_tokens(completion.text),
+    )
+    return completion
+
+
+async def stream_chat_completion(
+    purpose: str,
+    messages: List[Dict[str, str]],
+    deadline_s: Optional[float] = None,
+    **params: Any,
+) -> AsyncIterator[str]:
+    """Content deltas of a streamed completion.
+
+    Retries only cover opening the stream; once tokens flow a failure is
+    raised to the caller (a retry would repeat text already sent). The
+    breaker counts the call as a success only once the stream is fully read.
+    """
+    deltas, lane, probe = await _metered_call(purpose, deadline_s, True, messages, params)
+    completion_tokens = 0
+    outcome = "ok"
+    try:
+        async for delta in deltas:
+            completion_tokens += count_tokens(delta)
+            yield delta
+        lane.breaker.record_success()
+    except Exception:
+        outcome = "error"
+        stats["failures"] += 1
+        lane.breaker.record_failure()
+        raise
+    finally:
+        if probe:
+            lane.breaker.release_probe()  # abandoned by the caller: no verdict
+        stats["in_flight"] -= 1
+        lane.slots.release()
+        _count_usage(purpose, lane.provider.name, messages, None, completion_tokens, outcome)
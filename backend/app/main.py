@@ -1,37 +1,175 @@
+import asyncio
+import hashlib
+import json
+import logging
 import os
 import tempfile
+import time
 import uuid
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException
+from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
 from app.auth import get_user_id
-from app.db import init_db, get_db
-
-from app.agents import router_decide, respond_with_context
-from app.tools import tool_internal_kb, tool_search_reports
-from app.ingest import read_pdf_text, build_records
-from app.vectorstore import get_collection
+from app import queries
+from app.db import database, init_db, get_db
+
+from app.agents import respond_with_context, stream_respond_with_context
+from app.cache import answer_cache
+from app.embeddings import close_embedding_cache, embed_texts, get_embedding_cache
+from app.executor import run_blocking, shutdown_executor
+from app.routing import decide_route, discard, record_decision, routing_stats
+from app.rerank import rerank_retrieval, rerank_routes, reranker
+from app.tools import DEFAULT_K, expand_queries, tool_internal_kb, tool_search_reports_batch
+from app.config import settings
+from app.jobs import QueueFull, get_job, job_queue
+from app.llm import LLMUnavailable, close_llm_client, llm_stats
+from app import metrics, partitions
+from app.metrics import MetricsMiddleware, record_stage, stage, timed
+from app.maintenance import delete_reports, parse_day
+from app.memory import ConversationMemory, fit_memory, is_follow_up, load_memory
+from app.summaries import is_whole_report_summary, load_report_summary, relevant_sections, summary_tool_output
+from app.vectorstore import store
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+async def _warm_up_vectorstore() -> None:
+    try:
+        await run_blocking(store.warm_up)
+    except Exception:
+        # store.state is "failed" now; /readyz reports the error.
+        logger.exception("Vector store warm-up failed")
 
 
-app = FastAPI()
+async def _warm_up_reranker() -> None:
+    try:
+        await run_blocking(reranker.warm_up)
+    except Exception:
+        # Requests keep retrieval order until a restart fixes the model
+        logger.exception("Reranker warm-up failed")
 
 
-@app.on_event("startup")
-async def _startup():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    partitions.strategy()  # fail fast on an unknown PARTITION_STRATEGY
     await init_db()
+    await database.start()
+    await job_queue.start()
+    # Load the embedding model + open Chroma in the background so /healthz
+    # answers immediately while /readyz stays 503 until the worker is warm.
+    warmups = [asyncio.create_task(_warm_up_vectorstore())]
+    if rerank_routes():
+        warmups.append(asyncio.create_task(_warm_up_reranker()))
+    try:
+        yield
+    finally:
+        for warmup in warmups:
+            if not warmup.done():
+                warmup.cancel()
+        await job_queue.stop()
+        await database.close()
+        await close_llm_client()
+        shutdown_executor()
+        close_embedding_cache()
+        reranker.close()
+        store.close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware, timing_header=settings.TIMING_HEADER)
+
+
+@app.exception_handler(LLMUnavailable)
+async def llm_unavailable(request, exc: LLMUnavailable):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(settings.LLM_BREAKER_COOLDOWN_S))},
+    )
 
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Agentic Research Assistant API"}
 
+
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    health = store.health()
+    if not store.ready:
+        return JSONResponse(status_code=503, content=health)
+    return health
+
+@app.get("/stats/routing")
+async def get_routing_stats(
+    user_id: str = Depends(get_user_id),
+    db=Depends(get_db),
+):
+    return await routing_stats(db)
+
+@app.get("/stats/cache")
+def get_cache_stats(user_id: str = Depends(get_user_id)):
+    embedding_cache = get_embedding_cache()
+    return {
+        **answer_cache.snapshot(),
+        "embeddings": dict(embedding_cache.stats) if embedding_cache is not None else None,
+        "rerank": reranker.snapshot() if rerank_routes() else None,
+    }
+
+@app.get("/stats/llm")
+def get_llm_stats(user_id: str = Depends(get_user_id)):
+    return llm_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus text format (unauthenticated, like /healthz)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+def _collect_app_metrics():
+    # Counters that already live in the cache/LLM/DB/job stats dicts
+    cache = answer_cache.snapshot()
+    yield ("answer_cache_lookups_total", "counter", "Answer cache lookups by result.",
+           [({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"])])
+    yield ("answer_cache_entries", "gauge", "Answers currently cached.", [({}, cache["entries"])])
+    embedding_cache = get_embedding_cache()
+    if embedding_cache is not None:
+        yield ("embedding_cache_lookups_total", "counter", "Embedding cache lookups by result.",
+               [({"result": "hit"}, embedding_cache.stats["hits"]), ({"result": "miss"}, embedding_cache.stats["misses"])])
+    llm = llm_stats()
+    yield ("llm_retries_total", "counter", "LLM attempts retried.", [({}, llm["retries"])])
+    yield ("llm_in_flight", "gauge", "LLM calls in flight.", [({}, llm["in_flight"])])
+    yield ("llm_breaker_open", "gauge", "1 while a provider's circuit breaker is not closed.",
+           [({"provider": name}, float(p["breaker"] != "closed")) for name, p in llm["providers"].items()])
+    yield ("db_writes_total", "counter", "SQLite writes through the writer.", [({}, database.stats["writes"])])
+    yield ("db_commits_total", "counter", "SQLite write transactions committed.", [({}, database.stats["commits"])])
+    yield ("ingest_queue_depth", "gauge", "Ingestion jobs waiting.", [({}, job_queue.depth)])
+    if rerank_routes():
+        rr = reranker.stats
+        yield ("rerank_candidates_total", "counter", "Reranked candidates by source of the score.",
+               [({"source": "memo"}, rr["memo_hits"]), ({"source": "model"}, rr["scored"])])
+        yield ("rerank_fallbacks_total", "counter", "Reranks that kept retrieval order (budget or model).",
+               [({}, rr["fallbacks"])])
+
+
+metrics.register_collector(_collect_app_metrics)
+
 class RouteRequest(BaseModel):
     message: str
 
 @app.post("/route")
-def route(req: RouteRequest):
-    decision = router_decide(req.message)
+async def route(req: RouteRequest):
+    decision = await decide_route(req.message)
     return {"input": req.message, "decision": decision}
 
 class ChatRequest(BaseModel):
@@ -86,31 +224,16 @@ class SendMessageRequest(BaseModel):
 async def create_chat(
     req: CreateChatRequest,
     user_id: str = Depends(get_user_id),
-    db=Depends(get_db),
 ):
     chat_id = str(uuid.uuid4())
     title = req.title or "New chat"
 
     # Validate report ownership
-    if req.report_id:
-        cur = await db.execute(
-            "SELECT report_id FROM reports WHERE report_id = ? AND user_id = ?",
-            (req.report_id, user_id),
-        )
-        row = await cur.fetchone()
-        await cur.close()
-        if row is None:
-            raise HTTPException(status_code=404, detail="Report not found for this user")
+    if req.report_id and await queries.get_report(req.report_id, user_id) is None:
+        raise HTTPException(status_code=404, detail="Report not found for this user")
 
     # ✅ INSERT CHAT
-    await db.execute(
-        """
-        INSERT INTO chats(chat_id, user_id, title, report_id)
-        VALUES (?, ?, ?, ?)
-        """,
-        (chat_id, user_id, title, req.report_id),
-    )
-    await db.commit()
+    await queries.create_chat(chat_id, user_id, title, req.report_id)
 
     # ✅ RETURN CHAT
     return {
@@ -122,7 +245,7 @@ async def create_chat(
 
 
 
-@app.post("/upload")
+@app.post("/upload", status_code=202)
 async def upload(
     file: UploadFile = File(...),
     bank: str = "Unknown",
@@ -130,150 +253,379 @@ async def upload(
     title: str = "Untitled",
     date: str = "unknown",
     user_id: str = Depends(get_user_id),
-    db=Depends(get_db),
 ):
     suffix = os.path.splitext(file.filename or "")[1].lower()
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        tmp.write(await file.read())
+    # Kept under UPLOAD_DIR (not /tmp) so queued jobs survive a restart
+    received_at = time.perf_counter()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=settings.UPLOAD_DIR) as tmp:
+        # Copy in fixed-size pieces so large PDFs never sit in memory whole,
+        # hashing as we go for content-addressed dedup
+        digest = hashlib.sha256()
+        while piece := await file.read(UPLOAD_CHUNK_BYTES):
+            tmp.write(piece)
+            digest.update(piece)
         tmp_path = tmp.name
+    record_stage("receive", time.perf_counter() - received_at, pipeline="ingest")
 
     try:
-        text = read_pdf_text(tmp_path)
-
-        metadata = {
-            "user_id": user_id,
-            "bank": bank,
-            "asset_class": asset_class,
-            "title": title,
-            "date": date,
-            "filename": file.filename or "",
-        }
-
-        report_id, chunks, metadatas, ids = build_records(text, metadata)
+        return await job_queue.enqueue(
+            user_id,
+            tmp_path,
+            digest.hexdigest(),
+            file.filename or "",
+            {"title": title, "bank": bank, "asset_class": asset_class, "date": date},
+        )
+    except QueueFull as exc:
+        os.remove(tmp_path)
+        raise HTTPException(status_code=503, detail=str(exc))
 
-        # Index into Chroma
-        col = get_collection()
-        col.add(documents=chunks, metadatas=metadatas, ids=ids)
 
-        # Store report row in SQLite
-        await db.execute(
-            """
-            INSERT OR REPLACE INTO reports(report_id, user_id, filename, title, bank, asset_class, date)
-            VALUES(?, ?, ?, ?, ?, ?, ?)
-            """,
-            (report_id, user_id, file.filename or "", title, bank, asset_class, date),
+@app.get("/jobs/{job_id}")
+async def get_ingestion_job(
+    job_id: str,
+    user_id: str = Depends(get_user_id),
+    db=Depends(get_db),
+):
+    job = await get_job(db, job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.delete("/reports/{report_id}")
+async def delete_report(report_id: str, user_id: str = Depends(get_user_id)):
+    """Delete a report with its chunks, summaries, and the chats scoped to it."""
+    report = await queries.get_report(report_id, user_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found for this user")
+    return {"report_id": report_id, "deleted": await delete_reports([report])}
+
+
+@app.delete("/reports")
+async def purge_reports(
+    uploaded_before: str | None = None,
+    published_before: str | None = None,
+    dry_run: bool = False,
+    user_id: str = Depends(get_user_id),
+):
+    """Delete the caller's reports uploaded and/or published before ISO dates."""
+    if not (uploaded_before or published_before):
+        raise HTTPException(status_code=400, detail="Give uploaded_before and/or published_before")
+    try:
+        reports = await queries.find_reports(
+            user_id,
+            parse_day(uploaded_before, "uploaded_before"),
+            parse_day(published_before, "published_before"),
         )
-        await db.commit()
-
-        return {"report_id": report_id, "chunks_indexed": len(chunks)}
-    finally:
-        try:
-            os.remove(tmp_path)
-        except Exception:
-            pass
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    report_ids = [r["report_id"] for r in reports]
+    if dry_run:
+        return {"report_ids": report_ids, "deleted": None}
+    return {"report_ids": report_ids, "deleted": await delete_reports(reports)}
 
 
 @app.get("/chats")
 async def list_chats(
+    limit: int = Query(50, ge=1, le=200),
+    before: str | None = None,
+    after: str | None = None,
     user_id: str = Depends(get_user_id),
-    db=Depends(get_db),
 ):
-    cur = await db.execute(
-        "SELECT chat_id, title, report_id, created_at FROM chats WHERE user_id = ? ORDER BY created_at DESC",
-        (user_id,),
-    )
-    rows = await cur.fetchall()
-    await cur.close()
+    """Newest-first page of chats.
+
+    Pass `next_cursor` back as `before` for older chats; with `after`, the
+    page holds chats newer than the cursor and `next_cursor` continues newer.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    try:
+        rows, has_more = await queries.list_chats(user_id, limit, before=before, after=after)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
-    return [
-        {"chat_id": r["chat_id"], "title": r["title"], "report_id": r["report_id"], "created_at": r["created_at"]}
-        for r in rows
-    ]
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = queries.chat_cursor(rows[0] if after else rows[-1])
+    return {
+        "items": [
+            {"chat_id": r["chat_id"], "title": r["title"], "report_id": r["report_id"], "created_at": r["created_at"]}
+            for r in rows
+        ],
+        "next_cursor": next_cursor,
+    }
 
 
 @app.get("/chats/{chat_id}/messages")
 async def get_messages(
     chat_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    before: int | None = None,
+    after: int | None = None,
     user_id: str = Depends(get_user_id),
-    db=Depends(get_db),
 ):
+    """A page of messages in chat order, newest page first.
+
+    Pass `next_cursor` back as `before` for earlier messages; with `after`
+    (a message_id), the page holds the messages that follow it.
+    """
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
     # Ensure chat belongs to user
-    cur = await db.execute("SELECT chat_id FROM chats WHERE chat_id = ? AND user_id = ?", (chat_id, user_id))
-    chat = await cur.fetchone()
-    await cur.close()
+    if await queries.get_chat(chat_id, user_id) is None:
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    rows, has_more = await queries.list_messages(chat_id, limit, before=before, after=after)
+
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = rows[-1]["message_id"] if after is not None else rows[0]["message_id"]
+    return {
+        "items": [
+            {"message_id": r["message_id"], "role": r["role"], "content": r["content"], "created_at": r["created_at"]}
+            for r in rows
+        ],
+        "next_cursor": next_cursor,
+    }
+
+async def _start_turn(chat_id: str, user_id: str, message: str):
+    # Load chat (and its report_id) + enforce ownership
+    chat = await queries.get_chat(chat_id, user_id)
     if chat is None:
         raise HTTPException(status_code=404, detail="Chat not found")
 
-    cur = await db.execute(
-        "SELECT message_id, role, content, created_at FROM messages WHERE chat_id = ? ORDER BY message_id ASC",
-        (chat_id,),
+    # Earlier turns, read before this message is queued so it isn't included
+    with stage("load_memory"):
+        memory = await load_memory(chat_id)
+
+    # Store user message; its commit is awaited together with the
+    # assistant turn, so both usually land in one write batch
+    user_write = await queries.add_message_later(chat_id, "user", message)
+
+    return chat["report_id"], memory, user_write
+
+
+async def _run_tools(chat_id: str, req: SendMessageRequest, user_id: str, report_id: str | None):
+    # Three of the four routes retrieve, so start retrieval speculatively
+    # while routing is still in flight. Comparisons ("A vs B") fan out into
+    # sub-questions, all answered by one batched Chroma query. With reranking
+    # on, the route isn't known yet, so every route over-fetches candidates.
+    rerank = bool(rerank_routes())
+    retrieval = asyncio.ensure_future(timed("retrieval", run_blocking(
+        tool_search_reports_batch,
+        expand_queries(req.message),
+        user_id=user_id,
+        report_ids=[report_id] if report_id else None,   # ✅ context comes from chat session
+        bank=req.bank,
+        asset_class=req.asset_class,
+        k=settings.RERANK_CANDIDATES if rerank else DEFAULT_K,
+    )))
+
+    # Until the tool output is settled, any failure (routing, the decision
+    # write, loading summaries) must not leave the speculative retrieval behind
+    try:
+        # Agent routing (local tier first, LLM router only when unsure)
+        decision = await decide_route(req.message)
+        route = decision.get("route", "retrieve_summarize")
+        with stage("db_write"):
+            await record_decision(chat_id, decision)
+
+        # Summaries precomputed at ingestion stand in for retrieval on summary
+        # questions about the chat's report; "summarize this report" needs no LLM
+        summary = None
+        if route == "retrieve_summarize" and report_id:
+            with stage("load_summary"):
+                summary = await load_report_summary(report_id)
+
+        # Tools (notice: report_id comes from the chat, not the user)
+        if route == "internal_kb":
+            discard(retrieval)
+            tool_out = tool_internal_kb(req.message)
+        elif summary is not None:
+            discard(retrieval)
+            if is_whole_report_summary(req.message):
+                tool_out = summary_tool_output(summary, direct=True)
+            else:
+                sections = await timed("load_summary", run_blocking(
+                    relevant_sections, summary, req.message, settings.SUMMARY_CONTEXT_TOKENS
+                ))
+                tool_out = summary_tool_output(summary, direct=False, sections=sections)
+        else:
+            tool_out = await retrieval
+            if rerank:
+                tool_out = await timed("rerank", run_blocking(rerank_retrieval, req.message, tool_out, route))
+    except BaseException:
+        discard(retrieval)
+        raise
+
+    if tool_out is None:
+        raise HTTPException(status_code=500, detail="Tool returned no output")
+
+    return decision, route, tool_out
+
+
+async def _cache_lookup(req: SendMessageRequest, user_id: str, report_id: str | None, memory: ConversationMemory):
+    scope = (user_id, report_id, req.bank, req.asset_class)
+    if not answer_cache.enabled or not store.ready:
+        return scope, None, None
+    # Follow-ups ("and for 2025?") mean different things in different chats
+    if not memory.empty and is_follow_up(req.message):
+        return scope, None, None
+    with stage("cache_lookup"):
+        vector = (await run_blocking(embed_texts, [req.message]))[0]
+        return scope, vector, answer_cache.lookup(scope, vector)
+
+
+def _cache_store(scope, vector, req: SendMessageRequest, answer: str, decision: dict, tool_out, started: float) -> None:
+    if vector is None:
+        return
+    answer_cache.store(
+        scope,
+        vector,
+        req.message,
+        answer,
+        decision,
+        tool_out.get("meta", {}) if isinstance(tool_out, dict) else {},
+        cost_ms=(time.perf_counter() - started) * 1000,
     )
-    rows = await cur.fetchall()
-    await cur.close()
 
-    return [
-        {"message_id": r["message_id"], "role": r["role"], "content": r["content"], "created_at": r["created_at"]}
-        for r in rows
-    ]
+
+# Ends an answer whose stream failed part-way
+STREAM_FAILED_MARKER = "[Answer interrupted: the model stream failed.]"
+
+
+async def _store_assistant_message(chat_id: str, answer: str, user_write) -> int:
+    with stage("db_write"):
+        message_id = await queries.add_message(chat_id, "assistant", answer)
+        await user_write
+    return message_id
+
 
 @app.post("/chats/{chat_id}/messages")
 async def send_message(
     chat_id: str,
     req: SendMessageRequest,
     user_id: str = Depends(get_user_id),
-    db=Depends(get_db),
 ):
-    # Load chat (and its report_id) + enforce ownership
-    cur = await db.execute(
-        "SELECT chat_id, report_id FROM chats WHERE chat_id = ? AND user_id = ?",
-        (chat_id, user_id),
-    )
-    chat = await cur.fetchone()
-    await cur.close()
-    if chat is None:
-        raise HTTPException(status_code=404, detail="Chat not found")
-
-    report_id = chat["report_id"]
+    report_id, memory, user_write = await _start_turn(chat_id, user_id, req.message)
+
+    # Near-identical question in the same scope -> reuse the earlier answer
+    scope, query_vec, cached = await _cache_lookup(req, user_id, report_id, memory)
+    if cached is not None:
+        await _store_assistant_message(chat_id, cached.answer, user_write)
+        return {
+            "chat_id": chat_id,
+            "decision": cached.decision,
+            "tool_output_meta": cached.tool_output_meta,
+            "answer": cached.answer,
+            "cached": True,
+        }
 
-    # Store user message
-    await db.execute(
-        "INSERT INTO messages(chat_id, role, content) VALUES(?, 'user', ?)",
-        (chat_id, req.message),
+    started = time.perf_counter()
+    # Summarizing old turns (rare, only past the memory budget) overlaps the tools
+    (decision, route, tool_out), memory = await asyncio.gather(
+        _run_tools(chat_id, req, user_id, report_id), timed("memory", fit_memory(memory))
     )
-    await db.commit()
-
-    # Agent routing
-    decision = router_decide(req.message)
-    route = decision.get("route", "retrieve_summarize")
 
-    # Tools (notice: report_id comes from the chat, not the user)
-    if route == "internal_kb":
-        tool_out = tool_internal_kb(req.message)
+    if isinstance(tool_out, dict) and tool_out.get("answer") is not None:
+        answer = tool_out["answer"]
     else:
-        tool_out = tool_search_reports(
-            req.message,
-            user_id=user_id,
-            bank=req.bank,
-            asset_class=req.asset_class,
-            report_id=report_id,   # ✅ context comes from chat session
-        )
-
-    if tool_out is None:
-        raise HTTPException(status_code=500, detail="Tool returned no output")
-
-    answer = respond_with_context(req.message, route, tool_out)
-
+        with stage("responder"):
+            answer = await respond_with_context(req.message, route, tool_out, memory)
+    _cache_store(scope, query_vec, req, answer, decision, tool_out, started)
 
     # Store assistant message
-    await db.execute(
-        "INSERT INTO messages(chat_id, role, content) VALUES(?, 'assistant', ?)",
-        (chat_id, answer),
-    )
-    await db.commit()
+    await _store_assistant_message(chat_id, answer, user_write)
 
     return {
         "chat_id": chat_id,
         "decision": decision,
         "tool_output_meta": tool_out.get("meta", {}) if isinstance(tool_out, dict) else {},
         "answer": answer,
+        "cached": False,
     }
+
+
+@app.post("/chats/{chat_id}/messages/stream")
+async def send_message_stream(
+    chat_id: str,
+    req: SendMessageRequest,
+    user_id: str = Depends(get_user_id),
+):
+    """Same as send_message, but the answer is streamed as NDJSON lines:
+
+    {"type": "meta", "decision": ..., "tool_output_meta": ..., "cached": false}
+    {"type": "token", "content": "..."}   (one per Groq delta)
+    {"type": "done", "message_id": 123}
+
+    If the stream fails part-way, the last line is {"type": "error", ...,
+    "message_id": 123} and the stored answer ends with STREAM_FAILED_MARKER.
+    """
+    report_id, memory, user_write = await _start_turn(chat_id, user_id, req.message)
+
+    scope, query_vec, cached = await _cache_lookup(req, user_id, report_id, memory)
+    if cached is not None:
+        message_id = await _store_assistant_message(chat_id, cached.answer, user_write)
+
+        async def cached_events():
+            yield _ndjson({
+                "type": "meta",
+                "decision": cached.decision,
+                "tool_output_meta": cached.tool_output_meta,
+                "cached": True,
+            })
+            yield _ndjson({"type": "token", "content": cached.answer})
+            yield _ndjson({"type": "done", "message_id": message_id})
+
+        return StreamingResponse(cached_events(), media_type="application/x-ndjson")
+
+    started = time.perf_counter()
+    # Summarizing old turns (rare, only past the memory budget) overlaps the tools
+    (decision, route, tool_out), memory = await asyncio.gather(
+        _run_tools(chat_id, req, user_id, report_id), timed("memory", fit_memory(memory))
+    )
+
+    async def events():
+        yield _ndjson({
+            "type": "meta",
+            "decision": decision,
+            "tool_output_meta": tool_out.get("meta", {}) if isinstance(tool_out, dict) else {},
+            "cached": False,
+        })
+
+        parts = []
+        t0 = time.perf_counter()
+        try:
+            if isinstance(tool_out, dict) and tool_out.get("answer") is not None:
+                tokens = _single(tool_out["answer"])
+            else:
+                tokens = stream_respond_with_context(req.message, route, tool_out, memory)
+            async for token in tokens:
+                if not parts:
+                    record_stage("responder_first_token", time.perf_counter() - t0)
+                parts.append(token)
+                yield _ndjson({"type": "token", "content": token})
+        except Exception as exc:
+            logger.exception("Streaming completion failed for chat %s", chat_id)
+            # Close the turn with what was streamed, marked as cut off (never cached)
+            answer = "".join(parts) + ("\n\n" if parts else "") + STREAM_FAILED_MARKER
+            message_id = await _store_assistant_message(chat_id, answer, user_write)
+            yield _ndjson({"type": "error", "detail": str(exc), "message_id": message_id})
+            return
+        record_stage("responder", time.perf_counter() - t0)
+
+        answer = "".join(parts)
+        _cache_store(scope, query_vec, req, answer, decision, tool_out, started)
+
+        message_id = await _store_assistant_message(chat_id, answer, user_write)
+        yield _ndjson({"type": "done", "message_id": message_id})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+def _ndjson(event: dict) -> str:
+    return json.dumps(event) + "\n"
+
+
+async def _single(text: str):
+    yield text
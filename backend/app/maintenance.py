@@ -0,0 +1,273 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import sqlite3
+import statistics
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from app import db as app_db
+from app import lexical, partitions, queries
+from app.cache import answer_cache
+from app.config import settings
+from app.db import database, init_db
+from app.executor import run_blocking
+from app.queries import ReportRow
+from app.vectorstore import store
+
+# ---------- Report deletion ----------
+# Chunks are deleted before the rows, so a failure part-way leaves a report
+# row that a retry can still find (never rows pointing at missing chunks
+# that keep turning up in search).
+DELETE_BATCH = 200
+
+
+def _delete_chunks(reports: Sequence[ReportRow]) -> int:
+    by_collection: Dict[str, List[str]] = {}
+    for r in reports:
+        name = partitions.partition_name(r["user_id"], r["asset_class"])
+        by_collection.setdefault(name, []).append(r["report_id"])
+        if name != settings.COLLECTION_NAME:
+            # Left behind in the shared collection if it was never migrated
+            by_collection.setdefault(settings.COLLECTION_NAME, []).append(r["report_id"])
+    for name, report_ids in by_collection.items():
+        col = store.collection(name, create=False)
+        if col is not None:
+            col.delete(where={"report_id": {"$in": report_ids}})
+    # The BM25 index mirrors Chroma one row per chunk, so it gives the count
+    return sum(lexical.delete_report(r["report_id"]) for r in reports)
+
+
+async def delete_reports(reports: Sequence[ReportRow]) -> Dict[str, int]:
+    """Delete reports and everything derived from them: chunks (Chroma and
+    BM25), summaries, finished ingestion jobs, the chats scoped to them with
+    their messages, and cached answers. Returns counts per kind."""
+    totals: Dict[str, int] = {"reports": 0, "chunks": 0}
+    for start in range(0, len(reports), DELETE_BATCH):
+        batch = list(reports[start:start + DELETE_BATCH])
+        totals["chunks"] += await run_blocking(_delete_chunks, batch)
+        for table, count in (await queries.delete_reports([r["report_id"] for r in batch])).items():
+            totals[table] = totals.get(table, 0) + count
+        for r in batch:
+            answer_cache.invalidate_report(r["user_id"], r["report_id"])
+    return totals
+
+
+def parse_day(value: Optional[str], name: str) -> Optional[str]:
+    """ISO date ("2024-01-31") for comparing with stored dates; ValueError otherwise."""
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO date (YYYY-MM-DD), got {value!r}")
+
+
+# ---------- Compaction ----------
+# Chroma never shrinks after deletes: HNSW only marks points deleted, and its
+# SQLite file keeps the pages. Compacting copies each collection's live chunks
+# (vectors included) into a fresh one, swaps it in, then VACUUMs. Run it with
+# the app stopped.
+_COMPACT_OF = "compact_of"
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def _sqlite_bytes(path: str) -> int:
+    return sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+
+
+def disk_usage() -> Dict[str, int]:
+    return {
+        "chroma_bytes": _dir_bytes(settings.CHROMA_DIR),
+        "app_db_bytes": _sqlite_bytes(app_db.DB_PATH),
+        "lexical_db_bytes": _sqlite_bytes(app_db.lexical_db_path()),
+    }
+
+
+def _query_ms(col, vectors: List[List[float]]) -> Optional[float]:
+    # Unfiltered top-k with stored vectors as queries: index cost only
+    if not vectors:
+        return None
+    samples = []
+    for vector in vectors:
+        t0 = time.perf_counter()
+        col.query(query_embeddings=[vector], n_results=6, include=["distances"])
+        samples.append((time.perf_counter() - t0) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def _live_report_ids() -> Set[str]:
+    conn = sqlite3.connect(app_db.DB_PATH)
+    try:
+        return {r for (r,) in conn.execute(
+            "SELECT report_id FROM reports UNION "
+            "SELECT report_id FROM ingestion_jobs WHERE status IN ('queued', 'running')"
+        )}
+    finally:
+        conn.close()
+
+
+def _prune_orphans(col, live: Set[str], batch_size: int) -> int:
+    """Drop chunks whose report is gone (e.g. a job that failed part-way)."""
+    orphans: Set[str] = set()
+    offset = 0
+    while True:
+        res = col.get(include=["metadatas"], limit=batch_size, offset=offset)
+        if not res["ids"]:
+            break
+        orphans.update(
+            md["report_id"] for md in res["metadatas"] if md.get("report_id") and md["report_id"] not in live
+        )
+        offset += len(res["ids"])
+    before = col.count()
+    for report_ids in (sorted(orphans)[i:i + DELETE_BATCH] for i in range(0, len(orphans), DELETE_BATCH)):
+        col.delete(where={"report_id": {"$in": report_ids}})
+    return before - col.count()
+
+
+def _rebuild(name: str, batch_size: int) -> None:
+    source = store.collection(name)
+    tmp_name = "compact-" + hashlib.sha256(name.encode("utf-8")).hexdigest()[:16]
+    if tmp_name in store.collection_names():
+        store.drop(tmp_name)  # partial copy from an interrupted run
+    tmp = store.collection(tmp_name, metadata={_COMPACT_OF: name})
+    offset = 0
+    while True:
+        res = source.get(include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=offset)
+        if not res["ids"]:
+            break
+        tmp.add(
+            ids=res["ids"],
+            documents=res["documents"],
+            metadatas=res["metadatas"],
+            embeddings=[list(e) for e in res["embeddings"]],
+        )
+        offset += len(res["ids"])
+    if tmp.count() != source.count():
+        store.drop(tmp_name)
+        raise RuntimeError(f"Rebuilding {name}: copied {tmp.count()} of {source.count()} chunks, kept the original")
+    store.drop(name)
+    store.rename(tmp_name, name)
+
+
+def _recover() -> None:
+    # A copy is only swapped in once complete. So next to an original that
+    # still has chunks it's a partial leftover; otherwise the run died
+    # between the drop and the rename (and opening the store may since have
+    # recreated the default collection, empty).
+    names = set(store.collection_names())
+    for name in names:
+        original = (store.collection(name).metadata or {}).get(_COMPACT_OF)
+        if original is None or original == name:  # the swapped-in copy keeps its metadata
+            continue
+        if original in names and store.collection(original).count() > 0:
+            store.drop(name)
+            continue
+        if original in names:
+            store.drop(original)
+        store.rename(name, original)
+
+
+def _vacuum(path: str) -> None:
+    if os.path.exists(path):
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")  # VACUUM goes through the WAL
+        finally:
+            conn.close()
+
+
+def compact(
+    names: Optional[List[str]] = None, batch_size: int = 512, queries_per_collection: int = 20
+) -> Dict[str, Any]:
+    """Prune orphaned chunks, rebuild collections, drop empty partitions and
+    VACUUM, measuring disk usage and query latency before and after."""
+    _recover()
+    before = disk_usage()
+    live = _live_report_ids()
+    rows = []
+    for name in names or store.collection_names():
+        col = store.collection(name)
+        chunks = col.count()
+        vectors = [list(v) for v in col.get(limit=queries_per_collection, include=["embeddings"])["embeddings"]]
+        ms_before = _query_ms(col, vectors)
+        pruned = _prune_orphans(col, live, batch_size)
+        if col.count() == 0 and name != settings.COLLECTION_NAME:
+            store.drop(name)
+            rows.append({"collection": name, "chunks": chunks, "pruned": pruned, "dropped": True,
+                         "query_ms_before": ms_before, "query_ms_after": None})
+            continue
+        _rebuild(name, batch_size)
+        rows.append({"collection": name, "chunks": chunks, "pruned": pruned, "dropped": False,
+                     "query_ms_before": ms_before, "query_ms_after": _query_ms(store.collection(name), vectors)})
+
+    lexical_orphans = [r for r in lexical.report_ids() if r not in live]
+    lexical_pruned = sum(lexical.delete_report(r) for r in lexical_orphans)
+    lexical.optimize()
+    _vacuum(os.path.join(settings.CHROMA_DIR, "chroma.sqlite3"))
+    _vacuum(app_db.DB_PATH)
+    _vacuum(app_db.lexical_db_path())
+    return {"collections": rows, "lexical_pruned": lexical_pruned, "disk_before": before, "disk_after": disk_usage()}
+
+
+# ---------- CLI ----------
+async def _purge(args: argparse.Namespace) -> None:
+    await init_db()
+    await database.start()
+    try:
+        reports = await queries.find_reports(
+            args.user,
+            parse_day(args.uploaded_before, "--uploaded-before"),
+            parse_day(args.published_before, "--published-before"),
+        )
+        print(f"{len(reports)} reports match")
+        if reports and not args.dry_run:
+            print(await delete_reports(reports))
+    finally:
+        await database.close()
+
+
+def _print_compaction(result: Dict[str, Any]) -> None:
+    print(f"{'collection':63s} {'chunks':>8} {'pruned':>7} {'query ms':>17}")
+    for row in result["collections"]:
+        before = "-" if row["query_ms_before"] is None else row["query_ms_before"]
+        after = "dropped" if row["dropped"] else "-" if row["query_ms_after"] is None else row["query_ms_after"]
+        print(f"{row['collection']:63s} {row['chunks']:>8} {row['pruned']:>7} {before!s:>8} -> {after!s:<7}")
+    print(f"lexical chunks pruned: {result['lexical_pruned']}")
+    for key in ("chroma_bytes", "app_db_bytes", "lexical_db_bytes"):
+        old, new = result["disk_before"][key], result["disk_after"][key]
+        print(f"{key[:-6]} on disk: {old / 1e6:.1f} MB -> {new / 1e6:.1f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report purges and index compaction (run with the app stopped)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    purge = sub.add_parser("purge", help="delete reports and everything derived from them")
+    purge.add_argument("--user", default=None, help="only this user's reports (default: every user)")
+    purge.add_argument("--uploaded-before", default=None, help="ISO date")
+    purge.add_argument("--published-before", default=None, help="ISO date, compared with the report's date")
+    purge.add_argument("--dry-run", action="store_true")
+    run = sub.add_parser("compact", help="prune orphaned chunks, rebuild collections, vacuum")
+    run.add_argument("--collection", nargs="*", default=None, help="default: every collection")
+    run.add_argument("--batch-size", type=int, default=512)
+    run.add_argument("--queries", type=int, default=20, help="sample queries per collection for latency")
+    args = parser.parse_args()
+
+    if args.command == "purge":
+        if not (args.uploaded_before or args.published_before):
+            parser.error("purge needs --uploaded-before and/or --published-before")
+        asyncio.run(_purge(args))
+        return
+    t0 = time.perf_counter()
+    _print_compaction(compact(args.collection, args.batch_size, args.queries))
+    print(f"done in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
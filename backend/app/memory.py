@@ -0,0 +1,120 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from app.agents import summarize_conversation
+from app.config import settings
+from app.context import count_tokens
+from app.db import database
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- Conversation memory ----------
+@dataclass
+class ConversationMemory:
+    """What the responder sees of a chat's earlier turns.
+
+    `summary` covers every message up to `summarized_upto`; `turns` are the
+    later messages, oldest first, kept verbatim.
+    """
+    chat_id: str
+    summary: str = ""
+    summarized_upto: int = 0
+    turns: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not self.summary and not self.turns
+
+    def tokens(self) -> int:
+        return count_tokens(self.summary) + sum(count_tokens(t["content"]) + 4 for t in self.turns)
+
+
+async def load_memory(chat_id: str) -> ConversationMemory:
+    """Summary row plus the messages it doesn't cover yet (no LLM calls)."""
+    row = await database.fetchone(
+        "SELECT summary, summarized_upto FROM chat_memory WHERE chat_id = ?", (chat_id,)
+    )
+    memory = ConversationMemory(chat_id)
+    if row is not None:
+        memory.summary, memory.summarized_upto = row["summary"], row["summarized_upto"]
+    rows = await database.fetchall(
+        """
+        SELECT message_id, role, content FROM messages
+        WHERE chat_id = ? AND message_id > ?
+        ORDER BY message_id DESC LIMIT ?
+        """,
+        (chat_id, memory.summarized_upto, settings.MEMORY_MAX_MESSAGES),
+    )
+    memory.turns = [dict(r) for r in reversed(rows)]
+    return memory
+
+
+async def fit_memory(memory: ConversationMemory) -> ConversationMemory:
+    """Bring memory under MEMORY_TOKEN_BUDGET, summarizing only if needed.
+
+    Up to MEMORY_RECENT_MESSAGES (and half the budget) stay verbatim; older
+    unsummarized ones are folded into the stored summary with one LLM call,
+    which leaves headroom for the next few turns. If that call fails they
+    are just dropped for this turn and folded next time.
+    """
+    budget = settings.MEMORY_TOKEN_BUDGET
+    if memory.tokens() <= budget:
+        return memory
+
+    keep, kept_tokens = 0, 0
+    for turn in reversed(memory.turns[-settings.MEMORY_RECENT_MESSAGES:] if settings.MEMORY_RECENT_MESSAGES else []):
+        kept_tokens += count_tokens(turn["content"]) + 4
+        if keep and kept_tokens > budget // 2:
+            break
+        keep += 1
+    older, recent = memory.turns[:len(memory.turns) - keep], memory.turns[len(memory.turns) - keep:]
+    if older:
+        try:
+            summary = await summarize_conversation(memory.summary, older)
+        except Exception:
+            logger.exception("Summarizing chat %s failed; dropping %d older turns", memory.chat_id, len(older))
+        else:
+            memory.summary = summary
+            memory.summarized_upto = older[-1]["message_id"]
+            await _save_summary(memory)
+            logger.info(
+                "Chat %s: folded %d messages into a %d-token summary",
+                memory.chat_id, len(older), count_tokens(summary),
+            )
+        memory.turns = recent
+
+    # Very long recent messages: drop the oldest until it fits
+    while memory.turns and memory.tokens() > budget:
+        memory.turns.pop(0)
+    return memory
+
+
+async def _save_summary(memory: ConversationMemory) -> None:
+    # Only move forward, in case two turns of one chat raced
+    await database.execute(
+        """
+        INSERT INTO chat_memory(chat_id, summary, summarized_upto) VALUES(?, ?, ?)
+        ON CONFLICT(chat_id) DO UPDATE SET
+            summary = excluded.summary,
+            summarized_upto = excluded.summarized_upto,
+            updated_at = datetime('now')
+        WHERE excluded.summarized_upto > chat_memory.summarized_upto
+        """,
+        (memory.chat_id, memory.summary, memory.summarized_upto),
+    )
+
+
+# ---------- Follow-up detection ----------
+# Questions that lean on earlier turns ("what about credit?", "why is that?")
+_FOLLOW_UP = re.compile(
+    r"\b(it|its|that|this|those|these|they|them|their|he|she|above|previous|earlier|more|else|also)\b"
+    r"|^\s*(and|but|so|what about|how about|why|elaborate|explain)\b",
+    re.IGNORECASE,
+)
+
+
+def is_follow_up(message: str) -> bool:
+    return bool(_FOLLOW_UP.search(message)) or len(message.split()) <= 3
@@ -0,0 +1,213 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# ---------- Metric types (Prometheus text format, no client library) ----------
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.label_names, k)} {_num(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[LabelValues, List[float]] = {}  # bucket counts..., sum, count
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1  # non-cumulative here, summed in render()
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % _num(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {_num(cumulative)}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_num(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {_num(series[-1])}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+# Callbacks exporting counters kept elsewhere (cache/LLM/DB stats dicts):
+# each yields (name, kind, help, [(labels dict, value), ...])
+Sample = Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]
+_collectors: List[Callable[[], Iterable[Sample]]] = []
+
+
+def register_collector(fn: Callable[[], Iterable[Sample]]) -> None:
+    _collectors.append(fn)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    for collect in _collectors:
+        for name, kind, help, samples in collect():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_num(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------- App metrics ----------
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status.", ["method", "route", "status"])
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency, including streamed bodies.", ["method", "route"])
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled right now.")
+STAGE_SECONDS = Histogram("stage_duration_seconds", "Time spent per pipeline stage.", ["pipeline", "stage"])
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens by call purpose (route), provider and direction.", ["purpose", "provider", "direction"])
+LLM_CALLS = Counter("llm_calls_total", "LLM calls by purpose, provider and outcome.", ["purpose", "provider", "outcome"])
+INGEST_PAGES = Counter("ingest_pages_total", "PDF pages ingested.")
+INGEST_CHUNKS = Counter("ingest_chunks_total", "Chunks written by ingestion.")
+
+
+# ---------- Stage timing ----------
+# Per-request stage totals (seconds) for the Server-Timing header. Threads
+# started through run_blocking inherit it, so retrieval stages land here too.
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def record_stage(stage: str, seconds: float, pipeline: str = "chat") -> None:
+    STAGE_SECONDS.observe(seconds, pipeline=pipeline, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str, pipeline: str = "chat") -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - t0, pipeline)
+
+
+async def timed(name: str, awaitable: Awaitable[T], pipeline: str = "chat") -> T:
+    with stage(name, pipeline):
+        return await awaitable
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+class MetricsMiddleware:
+    """Counts, times and gauges every HTTP request (plain ASGI, so streaming
+    responses pass through untouched). With `timing_header` the response
+    carries a Server-Timing header with the stages finished before it started.
+    """
+
+    def __init__(self, app, timing_header: bool = False):
+        self.app = app
+        self.timing_header = timing_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        status = 500
+        t0 = time.perf_counter()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.timing_header and timings:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(timings).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_LATENCY.observe(time.perf_counter() - t0, method=scope["method"], route=route)
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=status)
+            _request_timings.reset(token)
@@ -0,0 +1,204 @@
+import argparse
+import hashlib
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from app import lexical
+from app.config import settings
+from app.vectorstore import store
+
+# ---------- Tenant partitions ----------
+# PARTITION_STRATEGY decides which Chroma collection a chunk lives in, from
+# its own metadata: "shared" (COLLECTION_NAME, queries filtered by user_id),
+# "user" (one per user_id) or "user_asset_class" (one per user_id and
+# asset_class). A partition only ever holds chunks whose metadata maps to it,
+# so queries routed here skip those filters and their latency depends on the
+# user's own data, not everyone's.
+#
+# Moving an existing shared collection over (with the app stopped, or run
+# again after switching PARTITION_STRATEGY to pick up late uploads):
+#
+#     python -m app.partitions migrate --strategy user [--delete-source]
+#     python -m app.partitions list
+STRATEGIES = ("shared", "user", "user_asset_class")
+
+# Metadata fields each strategy already guarantees per partition
+_IMPLIED = {"shared": set(), "user": {"user_id"}, "user_asset_class": {"user_id", "asset_class"}}
+
+
+def strategy(name: Optional[str] = None) -> str:
+    name = name or settings.PARTITION_STRATEGY
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown PARTITION_STRATEGY {name!r}, expected one of {', '.join(STRATEGIES)}")
+    return name
+
+
+def _part(value: str, width: int) -> str:
+    # Readable prefix for operators, hash so distinct values never collide
+    slug = re.sub(r"[^a-z0-9]+", "-", value.lower())[:width].strip("-")
+    digest = hashlib.sha256(value.encode("utf-8")).hexdigest()[:8]
+    return f"{slug}-{digest}" if slug else digest
+
+
+def partition_name(user_id: str, asset_class: Optional[str] = None, strategy_name: Optional[str] = None) -> str:
+    """Collection holding chunks with this user_id / asset_class metadata."""
+    name = strategy(strategy_name)
+    if name == "shared":
+        return settings.COLLECTION_NAME
+    suffix = "-" + _part(user_id, 16)
+    if name == "user_asset_class":
+        suffix += "-" + _part(asset_class or "", 12)
+    # Chroma allows 3-63 characters; the suffix always ends alphanumeric
+    return settings.COLLECTION_NAME[: 63 - len(suffix)] + suffix
+
+
+def implied_filters(asset_class: Optional[str] = None) -> Set[str]:
+    """Filter fields the router already applied by picking the partition."""
+    implied = set(_IMPLIED[strategy()])
+    if not asset_class:
+        implied.discard("asset_class")
+    return implied
+
+
+# ---------- Router ----------
+def write_collection(user_id: str, asset_class: Optional[str]):
+    """Collection new chunks with this metadata go to (created on first use)."""
+    return store.collection(partition_name(user_id, asset_class))
+
+
+def read_collections(
+    user_id: str, asset_class: Optional[str] = None, report_ids: Optional[Sequence[str]] = None
+) -> List[Any]:
+    """Existing collections that can hold the user's chunks in this scope."""
+    if strategy() == "shared":
+        return [store.collection()]
+    if strategy() == "user_asset_class" and not asset_class:
+        # The lexical index mirrors chunk metadata, so it knows which classes exist
+        names = [partition_name(user_id, a) for a in lexical.asset_classes(user_id, report_ids)]
+    else:
+        names = [partition_name(user_id, asset_class)]
+    return [c for c in (store.collection(n, create=False) for n in names) if c is not None]
+
+
+def query(
+    collections: List[Any],
+    query_embeddings: List[List[float]],
+    where: Optional[Dict[str, Any]],
+    n_results: int,
+) -> Dict[str, List[List[Any]]]:
+    """`col.query` across partitions, merged by distance per query."""
+    if len(collections) == 1:
+        return collections[0].query(
+            query_embeddings=query_embeddings,
+            where=where,
+            n_results=n_results,
+            include=["documents", "metadatas", "distances"],
+        )
+    results = [
+        c.query(
+            query_embeddings=query_embeddings,
+            where=where,
+            n_results=n_results,
+            include=["documents", "metadatas", "distances"],
+        )
+        for c in collections
+    ]
+    merged: Dict[str, List[List[Any]]] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+    for q_idx in range(len(query_embeddings)):
+        rows = sorted(
+            (
+                (r["distances"][q_idx][i], r["ids"][q_idx][i], r["documents"][q_idx][i], r["metadatas"][q_idx][i])
+                for r in results
+                for i in range(len(r["ids"][q_idx]))
+            ),
+            key=lambda row: row[0],
+        )[:n_results]
+        for i, field in enumerate(("distances", "ids", "documents", "metadatas")):
+            merged[field].append([row[i] for row in rows])
+    return merged
+
+
+def get(collections: List[Any], ids: List[str]) -> Dict[str, List[Any]]:
+    """`col.get(ids=...)` across partitions."""
+    out: Dict[str, List[Any]] = {"ids": [], "documents": [], "metadatas": []}
+    for col in collections:
+        got = col.get(ids=ids, include=["documents", "metadatas"])
+        for field in out:
+            out[field] += got[field]
+    return out
+
+
+# ---------- Migration from the shared collection ----------
+def migrate(strategy_name: str, batch_size: int = 512, delete_source: bool = False) -> Dict[str, Any]:
+    """Copy every chunk of COLLECTION_NAME (vectors included, nothing is
+    re-embedded) into its partition under `strategy_name`. Upserts, so a
+    re-run only refreshes what's there. The source is emptied only when
+    `delete_source` is set and every partition holds what it should."""
+    if strategy(strategy_name) == "shared":
+        raise ValueError("Pick a partitioned strategy to migrate to")
+    source = store.collection()
+    expected: Counter = Counter()
+    offset = 0
+    while True:
+        res = source.get(include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=offset)
+        if not res["ids"]:
+            break
+        groups: Dict[str, Dict[str, list]] = defaultdict(lambda: defaultdict(list))
+        for chunk_id, doc, md, emb in zip(res["ids"], res["documents"], res["metadatas"], res["embeddings"]):
+            group = groups[partition_name(md["user_id"], md.get("asset_class"), strategy_name)]
+            group["ids"].append(chunk_id)
+            group["documents"].append(doc)
+            group["metadatas"].append(md)
+            group["embeddings"].append(list(emb))
+        for name, group in groups.items():
+            store.collection(name).upsert(**group)
+            expected[name] += len(group["ids"])
+        offset += len(res["ids"])
+        print(f"  {offset} chunks copied into {len(expected)} partitions", flush=True)
+
+    mismatched = {
+        name: (count, store.collection(name).count())
+        for name, count in expected.items()
+        if store.collection(name).count() < count
+    }
+    deleted = 0
+    if delete_source and not mismatched:
+        while True:
+            ids = source.get(limit=batch_size, include=[])["ids"]
+            if not ids:
+                break
+            source.delete(ids=ids)
+            deleted += len(ids)
+    return {
+        "chunks": sum(expected.values()),
+        "partitions": len(expected),
+        "mismatched": mismatched,
+        "deleted_from_source": deleted,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tenant-partitioned Chroma collections")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("migrate", help="copy the shared collection into partitions")
+    run.add_argument("--strategy", choices=STRATEGIES[1:], default=None, help="default: PARTITION_STRATEGY")
+    run.add_argument("--batch-size", type=int, default=512)
+    run.add_argument("--delete-source", action="store_true", help="empty the shared collection once verified")
+    sub.add_parser("list", help="collections and their chunk counts")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name in store.collection_names():
+            print(f"{name:63s} {store.collection(name).count():>10}")
+        return
+
+    result = migrate(args.strategy or settings.PARTITION_STRATEGY, args.batch_size, args.delete_source)
+    print(f"{result['chunks']} chunks in {result['partitions']} partitions,"
+          f" {result['deleted_from_source']} deleted from {settings.COLLECTION_NAME}")
+    for name, (want, have) in result["mismatched"].items():
+        print(f"  {name}: expected {want} chunks, found {have} (source kept)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import asyncio
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.config import settings
+
+
+@dataclass
+class Completion:
+    text: str
+    model: str
+    provider: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+
+
+class ProviderNotConfigured(RuntimeError):
+    pass
+
+
+# ---------- Providers ----------
+class Provider:
+    """One LLM backend. app.llm adds retries, limits and deadlines on top."""
+
+    name = "base"
+
+    async def complete(self, model: str, messages: List[Dict[str, str]], timeout: float, **params: Any) -> Completion:
+        raise NotImplementedError
+
+    async def open_stream(
+        self, model: str, messages: List[Dict[str, str]], timeout: float, **params: Any
+    ) -> AsyncIterator[str]:
+        """Start a streamed completion; returns an iterator of content deltas.
+
+        Connection and HTTP errors surface here, before the first token.
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class OpenAICompatibleProvider(Provider):
+    """Groq, OpenAI, vLLM, Ollama... anything serving /chat/completions."""
+
+    def __init__(self, name: str, base_url: str, api_key: str):
+        if not api_key:
+            raise ProviderNotConfigured(f"No API key for LLM provider '{name}' (see backend/.env)")
+        self.name = name
+        # Keep-alive pool shared by every call; the SDK's own retries are off
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,
+            timeout=httpx.Timeout(settings.LLM_TIMEOUT_S, connect=settings.LLM_CONNECT_TIMEOUT_S),
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+                ),
+            ),
+        )
+
+    async def complete(self, model, messages, timeout, **params) -> Completion:
+        resp = await self.client.chat.completions.create(model=model, messages=messages, timeout=timeout, **params)
+        usage = resp.usage
+        return Completion(
+            text=(resp.choices[0].message.content or "").strip(),
+            model=model,
+            provider=self.name,
+            prompt_tokens=usage.prompt_tokens if usage else None,
+            completion_tokens=usage.completion_tokens if usage else None,
+        )
+
+    async def open_stream(self, model, messages, timeout, **params) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(
+            model=model, messages=messages, timeout=timeout, stream=True, **params
+        )
+
+        async def deltas() -> AsyncIterator[str]:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+
+        return deltas()
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class LocalProvider(Provider):
+    """Deterministic in-process stand-in: no network, no key.
+
+    Waits `latency_s` before the first token and then emits `token_rate`
+    tokens/sec (0 = all at once). Router prompts get `{"route": route}` back,
+    everything else `answer` repeated to `answer_tokens` words.
+    """
+
+    name = "local"
+
+    def __init__(self, latency_s: float, token_rate: float, route: str, answer: str, answer_tokens: int):
+        self.latency_s = latency_s
+        self.token_delay = 1.0 / token_rate if token_rate > 0 else 0.0
+        self.route = route
+        words = answer.split() or ["ok"]
+        self.answer_words = [words[i % len(words)] for i in range(max(answer_tokens, 1))]
+
+    def _tokens(self, messages: List[Dict[str, str]]) -> List[str]:
+        if messages and str(messages[0].get("content", "")).startswith("You are a router agent"):
+            return [json.dumps({"route": self.route, "reason": "local provider"})]
+        return [w + " " for w in self.answer_words]
+
+    async def complete(self, model, messages, timeout, **params) -> Completion:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.latency_s + self.token_delay * len(tokens))
+        return Completion(
+            text="".join(tokens).strip(),
+            model=model,
+            provider=self.name,
+            prompt_tokens=sum(len(m.get("content", "").split()) for m in messages),
+            completion_tokens=len(tokens),
+        )
+
+    async def open_stream(self, model, messages, timeout, **params) -> AsyncIterator[str]:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.latency_s)
+
+        async def deltas() -> AsyncIterator[str]:
+            for i, token in enumerate(tokens):
+                if i and self.token_delay:
+                    await asyncio.sleep(self.token_delay)
+                yield token
+
+        return deltas()
+
+
+PROVIDERS = ("groq", "openai", "local")
+
+
+def create_provider(name: str) -> Provider:
+    if name == "groq":
+        return OpenAICompatibleProvider("groq", settings.GROQ_BASE_URL, settings.GROQ_API_KEY)
+    if name == "openai":
+        return OpenAICompatibleProvider("openai", settings.OPENAI_BASE_URL, settings.OPENAI_API_KEY)
+    if name == "local":
+        return LocalProvider(
+            settings.LOCAL_LLM_LATENCY_S,
+            settings.LOCAL_LLM_TOKEN_RATE,
+            settings.LOCAL_LLM_ROUTE,
+            settings.LOCAL_LLM_ANSWER,
+            settings.LOCAL_LLM_ANSWER_TOKENS,
+        )
+    raise ProviderNotConfigured(f"Unknown LLM provider '{name}' (groq, openai or local)")
+
+
+# ---------- Per-route models ----------
+# Purposes: "router", "summary", "report_summary" and the responder routes (retrieve_summarize,
+# retrieve_extract, compare, internal_kb). LLM_ROUTES overrides them, e.g.
+#   LLM_ROUTES="router=groq:llama-3.1-8b-instant,internal_kb=llama-3.1-8b-instant"
+def _default_model(provider: str) -> str:
+    return {"groq": settings.GROQ_MODEL, "openai": settings.OPENAI_MODEL}.get(provider, "local")
+
+
+@lru_cache(maxsize=8)
+def parse_routes(spec: str) -> Dict[str, Tuple[str, str]]:
+    routes: Dict[str, Tuple[str, str]] = {}
+    for item in filter(None, (p.strip() for p in spec.split(","))):
+        purpose, _, target = item.partition("=")
+        provider, sep, model = target.strip().partition(":")
+        if not sep or provider not in PROVIDERS:
+            # Bare model name (which may itself contain ":", e.g. "llama3:8b")
+            provider, model = settings.LLM_PROVIDER, target.strip()
+        routes[purpose.strip()] = (provider, model or _default_model(provider))
+    return routes
+
+
+def resolve(purpose: str) -> Tuple[str, str]:
+    """(provider name, model) for a call purpose."""
+    override = parse_routes(settings.LLM_ROUTES).get(purpose)
+    if override is not None:
+        return override
+    return settings.LLM_PROVIDER, _default_model(settings.LLM_PROVIDER)
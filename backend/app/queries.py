@@ -0,0 +1,238 @@
+import asyncio
+import base64
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple, TypedDict
+
+from app.db import WriteResult, database
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- Row types ----------
+class ReportRow(TypedDict):
+    report_id: str
+    user_id: str
+    filename: Optional[str]
+    title: Optional[str]
+    bank: Optional[str]
+    asset_class: Optional[str]
+    date: Optional[str]
+    file_sha256: Optional[str]
+    created_at: str
+
+
+class ChatRow(TypedDict):
+    chat_id: str
+    user_id: str
+    report_id: Optional[str]
+    title: Optional[str]
+    created_at: str
+
+
+class MessageRow(TypedDict):
+    message_id: int
+    chat_id: str
+    role: str
+    content: str
+    created_at: str
+
+
+# ---------- Reports ----------
+async def get_report(report_id: str, user_id: Optional[str] = None) -> Optional[ReportRow]:
+    if user_id is None:
+        row = await database.fetchone("SELECT * FROM reports WHERE report_id = ?", (report_id,))
+    else:
+        row = await database.fetchone(
+            "SELECT * FROM reports WHERE report_id = ? AND user_id = ?", (report_id, user_id)
+        )
+    return ReportRow(**row) if row else None
+
+
+async def find_report_by_file(file_sha256: str, exclude_report_id: str) -> Optional[ReportRow]:
+    """Some other report (usually another user's) built from the same file."""
+    row = await database.fetchone(
+        "SELECT * FROM reports WHERE file_sha256 = ? AND report_id != ? LIMIT 1",
+        (file_sha256, exclude_report_id),
+    )
+    return ReportRow(**row) if row else None
+
+
+UPSERT_REPORT = """
+    INSERT OR REPLACE INTO reports(report_id, user_id, filename, title, bank, asset_class, date, file_sha256)
+    VALUES(?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+async def upsert_report(
+    report_id: str,
+    user_id: str,
+    filename: Optional[str],
+    title: Optional[str],
+    bank: Optional[str],
+    asset_class: Optional[str],
+    date: Optional[str],
+    file_sha256: Optional[str],
+) -> None:
+    await database.execute(
+        UPSERT_REPORT, (report_id, user_id, filename, title, bank, asset_class, date, file_sha256)
+    )
+
+
+async def upsert_reports(rows: List[Tuple[Any, ...]]) -> None:
+    """Many upsert_report rows (same field order) in one transaction."""
+    await database.executemany(UPSERT_REPORT, rows)
+
+
+async def find_reports(
+    user_id: Optional[str] = None,
+    uploaded_before: Optional[str] = None,
+    published_before: Optional[str] = None,
+) -> List[ReportRow]:
+    """Reports uploaded (created_at) and/or published (date) before ISO dates.
+
+    Reports whose date isn't ISO ("unknown") never match `published_before`.
+    """
+    sql = "SELECT * FROM reports WHERE 1 = 1"
+    params: List[Any] = []
+    if user_id is not None:
+        sql += " AND user_id = ?"
+        params.append(user_id)
+    if uploaded_before is not None:
+        sql += " AND created_at < ?"
+        params.append(uploaded_before)
+    if published_before is not None:
+        sql += " AND date GLOB '[0-9][0-9][0-9][0-9]-*' AND date < ?"
+        params.append(published_before)
+    return [ReportRow(**r) for r in await database.fetchall(sql + " ORDER BY created_at", params)]
+
+
+async def delete_reports(report_ids: Sequence[str]) -> Dict[str, int]:
+    """Delete reports with their summaries, finished jobs, and the chats
+    scoped to them (messages, memory, routing decisions) in one transaction.
+    Returns rows deleted per table."""
+    marks = ",".join("?" * len(report_ids))
+    chats = f"SELECT chat_id FROM chats WHERE report_id IN ({marks})"
+    # Children before parents: foreign keys are enforced
+    statements = [
+        ("messages", f"DELETE FROM messages WHERE chat_id IN ({chats})"),
+        ("chat_memory", f"DELETE FROM chat_memory WHERE chat_id IN ({chats})"),
+        ("routing_decisions", f"DELETE FROM routing_decisions WHERE chat_id IN ({chats})"),
+        ("chats", f"DELETE FROM chats WHERE report_id IN ({marks})"),
+        ("report_summaries", f"DELETE FROM report_summaries WHERE report_id IN ({marks})"),
+        ("ingestion_jobs",
+         f"DELETE FROM ingestion_jobs WHERE report_id IN ({marks}) AND status NOT IN ('queued', 'running')"),
+        ("reports", f"DELETE FROM reports WHERE report_id IN ({marks})"),
+    ]
+    results = await database.transaction([(sql, list(report_ids)) for _, sql in statements])
+    return {table: result.rowcount for (table, _), result in zip(statements, results)}
+
+# ---------- Chats ----------
+async def create_chat(chat_id: str, user_id: str, title: str, report_id: Optional[str]) -> None:
+    await database.execute(
+        "INSERT INTO chats(chat_id, user_id, title, report_id) VALUES (?, ?, ?, ?)",
+        (chat_id, user_id, title, report_id),
+    )
+
+
+async def get_chat(chat_id: str, user_id: str) -> Optional[ChatRow]:
+    row = await database.fetchone(
+        "SELECT chat_id, user_id, report_id, title, created_at FROM chats WHERE chat_id = ? AND user_id = ?",
+        (chat_id, user_id),
+    )
+    return ChatRow(**row) if row else None
+
+
+def chat_cursor(chat: ChatRow) -> str:
+    return base64.urlsafe_b64encode(f"{chat['created_at']}|{chat['chat_id']}".encode()).decode()
+
+
+def _parse_chat_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, chat_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    return created_at, chat_id
+
+
+async def list_chats(
+    user_id: str,
+    limit: int = 50,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+) -> Tuple[List[ChatRow], bool]:
+    """Newest-first page of a user's chats, plus whether more rows exist.
+
+    `before` pages towards older chats, `after` towards newer ones (the page
+    itself is still newest-first). Cursors come from chat_cursor().
+    """
+    sql = "SELECT chat_id, user_id, report_id, title, created_at FROM chats WHERE user_id = ?"
+    params: List[Any] = [user_id]
+    newest_first = after is None
+    if before is not None:
+        sql += " AND (created_at, chat_id) < (?, ?)"
+        params += _parse_chat_cursor(before)
+    elif after is not None:
+        sql += " AND (created_at, chat_id) > (?, ?)"
+        params += _parse_chat_cursor(after)
+    order = "DESC" if newest_first else "ASC"
+    sql += f" ORDER BY created_at {order}, chat_id {order} LIMIT ?"
+    params.append(limit + 1)
+
+    rows = [ChatRow(**r) for r in await database.fetchall(sql, params)]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return (rows if newest_first else rows[::-1]), has_more
+
+
+# ---------- Messages ----------
+INSERT_MESSAGE = "INSERT INTO messages(chat_id, role, content) VALUES(?, ?, ?)"
+
+
+async def add_message_later(chat_id: str, role: str, content: str) -> "asyncio.Future[List[WriteResult]]":
+    """Queue a message insert without waiting for its commit.
+
+    Lets the user turn ride along in the same commit as later writes (e.g.
+    the assistant turn); await the returned future before relying on it.
+    """
+    future = await database.submit([(INSERT_MESSAGE, (chat_id, role, content), False)])
+    future.add_done_callback(_log_failed_write)
+    return future
+
+
+def _log_failed_write(future: asyncio.Future) -> None:
+    # Also marks the exception as retrieved if nobody ends up awaiting it
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Deferred message insert failed: %s", future.exception())
+
+
+async def add_message(chat_id: str, role: str, content: str) -> int:
+    return (await database.execute(INSERT_MESSAGE, (chat_id, role, content))).lastrowid
+
+
+async def list_messages(
+    chat_id: str,
+    limit: int = 50,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+) -> Tuple[List[MessageRow], bool]:
+    """A page of messages in chat order, plus whether more rows exist.
+
+    By default (or with `before`) this is the newest `limit` messages older
+    than `before`; with `after`, the oldest `limit` messages newer than it.
+    """
+    sql = "SELECT message_id, chat_id, role, content, created_at FROM messages WHERE chat_id = ?"
+    params: List[Any] = [chat_id]
+    if after is not None:
+        sql += " AND message_id > ? ORDER BY message_id ASC LIMIT ?"
+        params += [after, limit + 1]
+    else:
+        if before is not None:
+            sql += " AND message_id < ?"
+            params.append(before)
+        sql += " ORDER BY message_id DESC LIMIT ?"
+        params.append(limit + 1)
+
+    rows = [MessageRow(**r) for r in await database.fetchall(sql, params)]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return (rows if after is not None else rows[::-1]), has_more
@@ -0,0 +1,205 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.tools import DEFAULT_K, interleave
+
+logger = logging.getLogger(__name__)
+
+# (query hash, chunk id, chunk hash): the chunk hash keeps a score from
+# outliving the text it was computed for
+MemoKey = Tuple[str, str, str]
+
+
+# ---------- Per-route config ----------
+@lru_cache(maxsize=8)
+def parse_rerank_routes(spec: str) -> Dict[str, int]:
+    """"retrieve_summarize,compare=8" -> {route: chunks kept, per report when scoped}."""
+    routes: Dict[str, int] = {}
+    for item in filter(None, (p.strip() for p in spec.split(","))):
+        route, _, k = item.partition("=")
+        routes[route.strip()] = int(k) if k.strip() else settings.RERANK_TOP_K
+    return routes
+
+
+def rerank_routes() -> Dict[str, int]:
+    return parse_rerank_routes(settings.RERANK_ROUTES)
+
+
+# ---------- Cross-encoder ----------
+class Reranker:
+    """Cross-encoder loaded once per worker, with memoized scores.
+
+    Scores are cached per (query, chunk) in an LRU, so a repeated or popular
+    question only pays for chunks it hasn't seen. Model calls are serialized
+    (one instance shared by every request thread) and run in batches; once
+    the latency budget is spent the remaining batches are skipped.
+    """
+
+    def __init__(self, model_name: str, batch_size: int, cache_size: int):
+        self.model_name = model_name
+        self.batch_size = max(batch_size, 1)
+        self.cache_size = cache_size
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._model_lock = threading.Lock()
+        self._memo_lock = threading.Lock()
+        self._memo: "OrderedDict[MemoKey, float]" = OrderedDict()
+        self.state = "cold"  # cold -> warming -> ready | failed
+        self.stats = {"calls": 0, "fallbacks": 0, "scored": 0, "memo_hits": 0}
+
+    def warm_up(self) -> None:
+        with self._load_lock:
+            if self._model is not None:
+                return
+            self.state = "warming"
+            try:
+                from sentence_transformers import CrossEncoder
+
+                model = CrossEncoder(self.model_name)
+                model.predict([("warm-up", "warm-up")], show_progress_bar=False)
+            except Exception:
+                self.state = "failed"
+                raise
+            self._model = model
+            self.state = "ready"
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def _memo_get(self, keys: List[MemoKey]) -> List[Optional[float]]:
+        with self._memo_lock:
+            out = []
+            for key in keys:
+                score = self._memo.get(key)
+                if score is not None:
+                    self._memo.move_to_end(key)
+                out.append(score)
+            return out
+
+    def _memo_put(self, items: List[Tuple[MemoKey, float]]) -> None:
+        if self.cache_size <= 0:
+            return
+        with self._memo_lock:
+            for key, score in items:
+                self._memo[key] = score
+                self._memo.move_to_end(key)
+            while len(self._memo) > self.cache_size:
+                self._memo.popitem(last=False)
+
+    def score(self, query: str, candidates: List[Tuple[str, str, str]], budget_s: float) -> Optional[List[float]]:
+        """Scores for (chunk id, chunk hash, text) candidates, or None if the
+        model isn't loaded or the budget ran out first."""
+        deadline = time.perf_counter() + budget_s
+        self.stats["calls"] += 1
+        query_hash = hashlib.sha256(query.strip().encode("utf-8")).hexdigest()[:16]
+        keys = [(query_hash, chunk_id, sha) for chunk_id, sha, _ in candidates]
+        scores = self._memo_get(keys)
+        self.stats["memo_hits"] += sum(s is not None for s in scores)
+        todo = [i for i, s in enumerate(scores) if s is None]
+
+        if todo and not self.ready:
+            self.stats["fallbacks"] += 1
+            return None
+        for start in range(0, len(todo), self.batch_size):
+            batch = todo[start:start + self.batch_size]
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not self._model_lock.acquire(timeout=remaining):
+                self.stats["fallbacks"] += 1
+                return None
+            try:
+                fresh = self._model.predict(
+                    [(query, candidates[i][2]) for i in batch],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False,
+                )
+            finally:
+                self._model_lock.release()
+            self.stats["scored"] += len(batch)
+            # Kept even if a later batch misses the budget: the retry is cheaper
+            self._memo_put([(keys[i], float(s)) for i, s in zip(batch, fresh)])
+            for i, s in zip(batch, fresh):
+                scores[i] = float(s)
+        return scores  # type: ignore[return-value]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._memo_lock:
+            entries = len(self._memo)
+        return {**self.stats, "state": self.state, "memo_entries": entries, "model": self.model_name}
+
+    def close(self) -> None:
+        with self._load_lock:
+            self._model = None
+            self.state = "cold"
+        with self._memo_lock:
+            self._memo.clear()
+
+
+reranker = Reranker(settings.RERANK_MODEL, settings.RERANK_BATCH_SIZE, settings.RERANK_CACHE_SIZE)
+
+
+# ---------- Retrieval post-processing ----------
+_FIELDS = ("chunks", "metadatas", "ids", "distances", "scores")
+
+
+def _select(tool_output: Dict[str, Any], k: int, scores: Optional[List[float]]) -> Dict[str, Any]:
+    # Best k per requested report (interleaved), or the best k overall
+    # without a report filter, as tool_search_reports_batch selects them; by
+    # score or else retrieval order
+    metadatas = tool_output.get("metadatas") or []
+    report_ids = tool_output.get("meta", {}).get("report_ids")
+    order = list(range(len(metadatas)))
+    if scores is not None:
+        order.sort(key=lambda i: -scores[i])
+    by_scope: Dict[str, List[int]] = {}
+    if report_ids:
+        for i in order:
+            scope_hits = by_scope.setdefault(metadatas[i].get("report_id", ""), [])
+            if len(scope_hits) < k:
+                scope_hits.append(i)
+        keep = interleave(by_scope)
+    else:
+        keep = order[:k]
+        for i in keep:
+            by_scope.setdefault(metadatas[i].get("report_id", ""), []).append(i)
+
+    out = {**tool_output, **{f: [tool_output[f][i] for i in keep] for f in _FIELDS if f in tool_output}}
+    if scores is not None:
+        out["rerank_scores"] = [round(scores[i], 4) for i in keep]
+    out["meta"] = {**tool_output.get("meta", {}), "k": k, "scopes": {s: len(h) for s, h in by_scope.items()}}
+    return out
+
+
+def rerank_retrieval(query: str, tool_output: Dict[str, Any], route: str) -> Dict[str, Any]:
+    """Cut over-fetched retrieval down to the route's k (per report when scoped).
+
+    Routes listed in RERANK_ROUTES are reordered by cross-encoder score
+    first; the others (and any call over RERANK_BUDGET_MS) keep retrieval
+    order.
+    """
+    k = rerank_routes().get(route)
+    if k is None:
+        return _select(tool_output, DEFAULT_K, None)
+
+    t0 = time.perf_counter()
+    candidates = [
+        (chunk_id, md.get("chunk_sha", ""), text)
+        for chunk_id, md, text in zip(tool_output["ids"], tool_output["metadatas"], tool_output["chunks"])
+    ]
+    scores = reranker.score(query, candidates, settings.RERANK_BUDGET_MS / 1000)
+    out = _select(tool_output, k, scores)
+    out["meta"]["rerank"] = {
+        "candidates": len(candidates),
+        "kept": len(out["ids"]),
+        "fallback": scores is None,
+        "ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+    if scores is None:
+        logger.info("Rerank skipped (%s), kept retrieval order", reranker.state if not reranker.ready else "over budget")
+    return out
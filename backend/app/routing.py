@@ -0,0 +1,197 @@
+import asyncio
+import math
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.agents import router_decide
+from app.llm import LLMUnavailable
+from app.metrics import stage
+from app.config import settings
+from app.db import database
+from app.embeddings import embed_texts
+from app.executor import run_blocking
+from app.vectorstore import store
+
+ROUTES = ["retrieve_summarize", "retrieve_extract", "compare", "internal_kb"]
+
+# ---------- Tier 1: keyword rules ----------
+# Same idea as tool_internal_kb's "analyst a"/"analyst b" matching.
+KEYWORD_RULES: Dict[str, List[str]] = {
+    "internal_kb": [r"\banalyst [ab]\b", r"\bhit[ -]?rate\b", r"\btrack record\b", r"\binternal (kb|knowledge)\b"],
+    "compare": [r"\bcompare\b", r"\bcomparison\b", r"\bvs\.?\b", r"\bversus\b", r"\bdifferences? between\b"],
+    "retrieve_extract": [r"\bextract\b", r"\blist (all|the)\b", r"\bhow (much|many)\b", r"\bwhat (is|was|are) the (target|forecast|figure|number|rate|price)\b", r"\btable\b"],
+    "retrieve_summarize": [r"\bsummar(y|ise|ize)\b", r"\boverview\b", r"\bkey (takeaways|points|risks|themes)\b", r"\btl;?dr\b", r"\bmain (risks|points|themes)\b"],
+}
+
+# ---------- Tier 2: nearest prototype over MiniLM embeddings ----------
+PROTOTYPES: Dict[str, List[str]] = {
+    "retrieve_summarize": [
+        "Summarize this report",
+        "What are the key risks in the report?",
+        "Give me the main takeaways",
+        "What is the overall outlook of this research?",
+    ],
+    "retrieve_extract": [
+        "What is the year-end target for the S&P 500?",
+        "Extract the GDP growth forecasts",
+        "What EUR/USD level do they expect?",
+        "List the recommended trades with their entry levels",
+    ],
+    "compare": [
+        "Compare the equity and credit views",
+        "How does this bank's view differ from the other report?",
+        "What changed versus the previous outlook?",
+    ],
+    "internal_kb": [
+        "What is Analyst A's hit rate?",
+        "How reliable are Analyst B's FX calls?",
+        "Show the internal track record of our analysts",
+    ],
+}
+
+_prototype_lock = threading.Lock()
+_prototypes: Optional[Tuple[List[str], np.ndarray]] = None
+
+
+def _prototype_matrix() -> Tuple[List[str], np.ndarray]:
+    global _prototypes
+    with _prototype_lock:
+        if _prototypes is None:
+            labels = [r for r, examples in PROTOTYPES.items() for _ in examples]
+            texts = [t for examples in PROTOTYPES.values() for t in examples]
+            _prototypes = (labels, _normalize(np.asarray(embed_texts(texts), dtype=np.float32)))
+        return _prototypes
+
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    return m / np.where(norms == 0, 1.0, norms)
+
+
+def _embedding_scores(message: str) -> Dict[str, float]:
+    labels, protos = _prototype_matrix()
+    q = _normalize(np.asarray(embed_texts([message])[0], dtype=np.float32))
+    sims = protos @ q
+
+    best: Dict[str, float] = {}
+    for label, sim in zip(labels, sims):
+        best[label] = max(best.get(label, -1.0), float(sim))
+
+    # Softmax over the per-route best similarity -> probability-like confidence
+    temp = settings.LOCAL_ROUTER_TEMPERATURE
+    top = max(best.values())
+    exp = {r: math.exp((s - top) / temp) for r, s in best.items()}
+    total = sum(exp.values())
+    return {r: v / total for r, v in exp.items()}
+
+
+def local_route(message: str) -> Dict[str, Any]:
+    """Classify without calling the LLM. Returns route + confidence in [0, 1]."""
+    q = message.lower()
+    hits = [
+        route for route, patterns in KEYWORD_RULES.items()
+        if any(re.search(p, q) for p in patterns)
+    ]
+
+    try:
+        probs = _embedding_scores(message) if store.ready else {}
+    except Exception:
+        probs = {}
+
+    if len(hits) == 1:
+        route = hits[0]
+        agrees = probs and max(probs, key=probs.get) == route
+        return {
+            "route": route,
+            "reason": "keyword rule" + (" + embedding" if agrees else ""),
+            "confidence": 0.95 if agrees else 0.85,
+        }
+
+    if probs:
+        candidates = hits or list(probs)
+        route = max(candidates, key=lambda r: probs[r])
+        # Ambiguous keyword hits keep some doubt even when the embedding is sure
+        confidence = probs[route] * (0.8 if len(hits) > 1 else 1.0)
+        return {"route": route, "reason": "embedding prototype", "confidence": round(confidence, 3)}
+
+    return {"route": hits[0] if hits else "retrieve_summarize", "reason": "no local signal", "confidence": 0.0}
+
+
+# ---------- Tiered decision ----------
+async def decide_route(message: str) -> Dict[str, Any]:
+    """Local tier first; the LLM router only runs when it is not confident."""
+    t0 = time.perf_counter()
+    with stage("route_local"):
+        local = await run_blocking(local_route, message)
+
+    if local["confidence"] >= settings.ROUTER_CONFIDENCE_THRESHOLD:
+        decision = {"route": local["route"], "reason": local["reason"], "tier": "local"}
+    else:
+        try:
+            with stage("route_llm"):
+                decision = await router_decide(message)
+        except LLMUnavailable as exc:
+            # LLM down or saturated: the local guess beats failing the request
+            decision = {"route": local["route"], "reason": f"LLM router unavailable: {exc}", "tier": "local_fallback"}
+        else:
+            if decision.get("route") not in ROUTES:
+                decision["route"] = "retrieve_summarize"
+            decision["tier"] = "llm"
+
+    decision["local_route"] = local["route"]
+    decision["local_confidence"] = local["confidence"]
+    decision["router_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    return decision
+
+
+async def record_decision(chat_id: str, decision: Dict[str, Any]) -> None:
+    await database.execute(
+        """
+        INSERT INTO routing_decisions(chat_id, route, tier, local_route, local_confidence, router_ms)
+        VALUES(?, ?, ?, ?, ?, ?)
+        """,
+        (
+            chat_id,
+            decision["route"],
+            decision["tier"],
+            decision["local_route"],
+            decision["local_confidence"],
+            decision["router_ms"],
+        ),
+    )
+
+
+async def routing_stats(db) -> Dict[str, Any]:
+    cur = await db.execute(
+        """
+        SELECT tier, COUNT(*) AS n, AVG(router_ms) AS avg_ms,
+               AVG(CASE WHEN local_route = route THEN 1.0 ELSE 0.0 END) AS agreement
+        FROM routing_decisions
+        GROUP BY tier
+        """
+    )
+    rows = {r["tier"]: dict(r) for r in await cur.fetchall()}
+    await cur.close()
+
+    local = rows.get("local", {"n": 0, "avg_ms": 0.0})
+    llm = rows.get("llm", {"n": 0, "avg_ms": 0.0, "agreement": None})
+    # Every local decision skipped one LLM round-trip
+    saved_ms = local["n"] * max(0.0, (llm["avg_ms"] or 0.0) - (local["avg_ms"] or 0.0)) if llm["n"] else None
+
+    return {
+        "threshold": settings.ROUTER_CONFIDENCE_THRESHOLD,
+        "by_tier": rows,
+        # How often the local guess matched the LLM when the LLM was consulted
+        "local_vs_llm_agreement": llm.get("agreement"),
+        "estimated_ms_saved": saved_ms,
+    }
+
+
+def discard(task: asyncio.Future) -> None:
+    """Drop a speculative task we no longer need, swallowing its outcome."""
+    task.cancel()
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
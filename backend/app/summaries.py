@@ -0,0 +1,263 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.agents import extract_key_figures, summarize_report, summarize_section
+from app.config import settings
+from app.context import count_tokens, overlap_length
+from app.db import database
+from app.embeddings import embed_texts
+from app.executor import run_blocking
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- Stored summaries ----------
+@dataclass
+class ReportSummary:
+    """Summaries precomputed for one report at ingestion."""
+    report_id: str
+    title: str = ""
+    summary: str = ""
+    sections: List[Dict[str, Any]] = field(default_factory=list)  # title, page_start, page_end, summary
+    figures: List[Dict[str, Any]] = field(default_factory=list)   # label, value, section
+
+    def answer(self) -> str:
+        """The stored summary as a finished answer."""
+        text = self.summary
+        if self.figures:
+            text += "\n\nKey figures:\n" + "\n".join(f"- {f['label']}: {f['value']}" for f in self.figures)
+        return text
+
+
+async def load_report_summary(report_id: str) -> Optional[ReportSummary]:
+    """Stored summaries for a report, if they were built from its current file."""
+    rows = await database.fetchall(
+        """
+        SELECT s.kind, s.position, s.title, s.page_start, s.page_end, s.content, r.title AS report_title
+        FROM report_summaries s JOIN reports r ON r.report_id = s.report_id
+        WHERE s.report_id = ? AND s.file_sha256 IS r.file_sha256
+        ORDER BY s.kind, s.position
+        """,
+        (report_id,),
+    )
+    if not any(r["kind"] == "report" for r in rows):
+        return None
+    out = ReportSummary(report_id, title=rows[0]["report_title"] or "")
+    for row in rows:
+        if row["kind"] == "report":
+            out.summary = row["content"]
+        elif row["kind"] == "figures":
+            out.figures = json.loads(row["content"])
+        else:
+            out.sections.append({
+                "title": row["title"] or "",
+                "page_start": row["page_start"],
+                "page_end": row["page_end"],
+                "summary": row["content"],
+            })
+    return out
+
+
+async def invalidate_report_summaries(report_id: str) -> None:
+    await database.execute("DELETE FROM report_summaries WHERE report_id = ?", (report_id,))
+
+
+async def _save(report_id: str, file_sha256: Optional[str], summary: ReportSummary) -> None:
+    rows = [("report", 0, summary.title, None, None, summary.summary)]
+    rows += [
+        ("section", n, s["title"], s["page_start"], s["page_end"], s["summary"])
+        for n, s in enumerate(summary.sections, 1)
+    ]
+    rows.append(("figures", 0, None, None, None, json.dumps(summary.figures)))
+    # Replace the whole set at once, so readers never see half of two versions
+    await database.transaction(
+        [("DELETE FROM report_summaries WHERE report_id = ?", (report_id,))]
+        + [(
+            """
+            INSERT INTO report_summaries(report_id, kind, position, title, page_start, page_end, content, file_sha256)
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (report_id, *row, file_sha256),
+        ) for row in rows]
+    )
+
+
+async def copy_report_summaries(src_report_id: str, report_id: str, file_sha256: Optional[str]) -> int:
+    """Reuse another report's summaries of the same file; returns rows copied."""
+    result = await database.execute(
+        """
+        INSERT OR REPLACE INTO report_summaries(report_id, kind, position, title, page_start, page_end, content, file_sha256)
+        SELECT ?, kind, position, title, page_start, page_end, content, file_sha256
+        FROM report_summaries WHERE report_id = ? AND file_sha256 IS ?
+        """,
+        (report_id, src_report_id, file_sha256),
+    )
+    return result.rowcount
+
+
+# ---------- Building ----------
+def _clip(text: str, tokens: int, limit: int) -> str:
+    # Cut to roughly `limit` tokens by word count (no tokenizer round-trips)
+    if tokens <= limit:
+        return text
+    words = text.split()
+    return " ".join(words[: max(1, len(words) * limit // tokens)])
+
+
+def report_sections(collection, report_id: str, max_sections: int, input_tokens: int) -> List[Dict[str, Any]]:
+    """The report's chunks regrouped into sections for summarizing.
+
+    Chunks are read back from Chroma in order and grouped by the heading
+    they were filed under. Sections longer than `input_tokens` are split,
+    and neighbours are merged (and clipped) down to `max_sections`.
+    """
+    chunks = []
+    offset = 0
+    while True:
+        res = collection.get(
+            where={"report_id": report_id}, include=["documents", "metadatas"], limit=256, offset=offset
+        )
+        if not res["ids"]:
+            break
+        chunks += zip(res["documents"], res["metadatas"])
+        offset += len(res["ids"])
+    chunks.sort(key=lambda c: int(c[1]["chunk_id"]))
+
+    sections: List[Dict[str, Any]] = []
+    for text, md in chunks:
+        title = md.get("section", "")
+        if title and text.startswith(title + "\n"):
+            text = text[len(title) + 1:]  # heading is repeated at the top of each chunk
+        last = sections[-1] if sections else None
+        if last is not None and last["title"] == title and last["tokens"] < input_tokens:
+            text = text[overlap_length(last["text"], text):]
+            last["text"] += "\n" + text
+            last["tokens"] += count_tokens(text)
+            last["page_end"] = md.get("page_end", last["page_end"])
+        else:
+            sections.append({
+                "title": title, "text": text, "tokens": count_tokens(text),
+                "page_start": md.get("page_start"), "page_end": md.get("page_end"),
+            })
+
+    while len(sections) > max(max_sections, 1):
+        # Merge the smallest neighbouring pair, clipping each half to fit
+        i = min(range(len(sections) - 1), key=lambda j: sections[j]["tokens"] + sections[j + 1]["tokens"])
+        a, b = sections[i], sections[i + 1]
+        half = input_tokens // 2
+        if a["tokens"] + b["tokens"] > input_tokens:
+            a_text, b_text = _clip(a["text"], a["tokens"], half), _clip(b["text"], b["tokens"], half)
+        else:
+            a_text, b_text = a["text"], b["text"]
+        titles = [t for t in (a["title"], b["title"]) if t]
+        sections[i:i + 2] = [{
+            "title": " / ".join(dict.fromkeys(titles))[:120],
+            "text": f"{a_text}\n{b_text}",
+            "tokens": min(a["tokens"] + b["tokens"], input_tokens),
+            "page_start": a["page_start"], "page_end": b["page_end"],
+        }]
+    for s in sections:
+        s["text"] = _clip(s["text"], s["tokens"], input_tokens)
+    return sections
+
+
+async def build_report_summaries(
+    collection, report_id: str, report_title: str, file_sha256: Optional[str]
+) -> Dict[str, Any]:
+    """Summarize every section, then the report and its key figures, and store them.
+
+    Section calls run SUMMARY_CONCURRENCY at a time (they share the LLM
+    limiter with chat traffic). Returns stats for the job.
+    """
+    t0 = time.perf_counter()
+    sections = await run_blocking(
+        report_sections, collection, report_id, settings.SUMMARY_MAX_SECTIONS, settings.SUMMARY_SECTION_INPUT_TOKENS
+    )
+    if not sections:
+        return {"sections": 0}
+
+    limit = asyncio.Semaphore(max(settings.SUMMARY_CONCURRENCY, 1))
+
+    async def one(section: Dict[str, Any]) -> str:
+        async with limit:
+            return await summarize_section(report_title, section["title"], section["text"])
+
+    section_summaries = await asyncio.gather(*(one(s) for s in sections))
+    summary = ReportSummary(report_id, title=report_title, sections=[
+        {"title": s["title"], "page_start": s["page_start"], "page_end": s["page_end"], "summary": text}
+        for s, text in zip(sections, section_summaries)
+    ])
+    summary.summary, summary.figures = await asyncio.gather(
+        summarize_report(report_title, summary.sections),
+        extract_key_figures(report_title, summary.sections),
+    )
+    await _save(report_id, file_sha256, summary)
+    return {
+        "sections": len(sections),
+        "input_tokens": sum(s["tokens"] for s in sections),
+        "summary_tokens": count_tokens(summary.summary),
+        "figures": len(summary.figures),
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+
+
+# ---------- Answering from summaries ----------
+# Asks about the report as a whole ("summarize this report", "tl;dr"), not a
+# topic inside it ("summarize their credit view")
+_WHOLE_REPORT = re.compile(
+    r"^\s*(please\s+|can you\s+|could you\s+)?"
+    r"(summar(y|ise|ize)( it)?|(an )?overview|tl;?dr|"
+    r"((give me|what are|what is) )?(a |an |the )?(short |brief |quick )?"
+    r"(summary|overview|gist|(main|key) (points|takeaways)))"
+    r"(\s+(of\s+)?(this|the)\s+(report|document|paper|note|research))?\s*[?.!]*\s*$",
+    re.IGNORECASE,
+)
+
+
+def is_whole_report_summary(message: str) -> bool:
+    return bool(_WHOLE_REPORT.match(message))
+
+
+def relevant_sections(summary: ReportSummary, question: str, budget: int) -> List[Dict[str, Any]]:
+    """Section summaries closest to the question that fit in `budget` tokens
+    next to the report summary and key figures, in report order."""
+    sections = summary.sections
+    room = budget - count_tokens(summary.answer())
+    if not sections or room <= 0:
+        return []
+    vectors = np.asarray(embed_texts([question] + [s["summary"] for s in sections]), dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+    sims = vectors[1:] @ vectors[0]
+    chosen = []
+    for i in np.argsort(-sims):
+        tokens = count_tokens(sections[i]["summary"]) + 12  # "[n] title | pp." header
+        if tokens <= room:
+            chosen.append(int(i))
+            room -= tokens
+    return [sections[i] for i in sorted(chosen)]
+
+
+def summary_tool_output(summary: ReportSummary, direct: bool, sections: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Tool output for the responder (app.context renders it), or a finished
+    answer when `direct`. `sections` narrows the section summaries included."""
+    return {
+        "type": "report_summary",
+        "title": summary.title,
+        "summary": summary.summary,
+        "sections": summary.sections if sections is None else sections,
+        "figures": summary.figures,
+        "answer": summary.answer() if direct else None,
+        "meta": {
+            "source": "report_summaries",
+            "report_id": summary.report_id,
+            "sections": len(summary.sections if sections is None else sections),
+            "direct": direct,
+        },
+    }
@@ -1,5 +1,4 @@
 from typing import Dict, Any, Optional, List
-from app.vectorstore import get_collection
 
 def tool_internal_kb(query: str) -> Dict[str, Any]:
     kb = {
@@ -15,9 +14,45 @@ def tool_internal_kb(query: str) -> Dict[str, Any]:
 
     return {"type": "internal_kb", "result": kb}
 
-from typing import Any, Dict, List, Optional
+import re
+from typing import Any, Dict, List, Optional, Sequence
 
-from app.vectorstore import get_collection
+from app import lexical, partitions
+from app.config import settings
+from app.embeddings import embed_texts
+from app.metrics import stage
+
+# Chunks per report handed to the responder
+DEFAULT_K = 6
+
+
+def _where(
+    user_id: str,
+    bank: Optional[str] = None,
+    asset_class: Optional[str] = None,
+    report_ids: Optional[Sequence[str]] = None,
+    implied: Sequence[str] = (),
+) -> Optional[Dict[str, Any]]:
+    # Build filters as a list, then convert to Chroma where-clause. `implied`
+    # fields are already enforced by the partition being queried.
+    filters: List[Dict[str, Any]] = []
+    if "user_id" not in implied:
+        filters.append({"user_id": user_id})  # ALWAYS isolate by user_id
+
+    if bank:
+        filters.append({"bank": bank})
+    if asset_class and "asset_class" not in implied:
+        filters.append({"asset_class": asset_class})
+    if report_ids:
+        if len(report_ids) == 1:
+            filters.append({"report_id": report_ids[0]})
+        else:
+            filters.append({"report_id": {"$in": list(report_ids)}})
+
+    # Chroma expects a single top-level operator when multiple filters exist
+    if not filters:
+        return None
+    return filters[0] if len(filters) == 1 else {"$and": filters}
 
 
 def tool_search_reports(
@@ -26,32 +61,154 @@ def tool_search_reports(
     bank: Optional[str] = None,
     asset_class: Optional[str] = None,
     report_id: Optional[str] = None,
-    k: int = 6,
+    k: int = DEFAULT_K,
+    hybrid: Optional[bool] = None,
 ) -> Dict[str, Any]:
-    col = get_collection()
+    return tool_search_reports_batch(
+        [query],
+        user_id,
+        report_ids=[report_id] if report_id else None,
+        bank=bank,
+        asset_class=asset_class,
+        k=k,
+        hybrid=hybrid,
+    )
 
-    # Build filters as a list, then convert to Chroma where-clause
-    filters: List[Dict[str, Any]] = [{"user_id": user_id}]  # ALWAYS isolate by user_id
 
-    if bank:
-        filters.append({"bank": bank})
-    if asset_class:
-        filters.append({"asset_class": asset_class})
-    if report_id:
-        filters.append({"report_id": report_id})
+# ---------- Batched multi-query retrieval ----------
+# Only explicit "X vs Y" / "compare X and Y" forms: a bare "versus" or
+# "against" ("a hedge against inflation") rarely has a noun phrase each side
+_COMPARE_SPLIT = re.compile(r"\s+vs\.?\s+", re.IGNORECASE)
+_COMPARE_PAIR = re.compile(r"\b(?:compare|between)\s+(.+?)\s+(?:and|with|to)\s+(.+)", re.IGNORECASE)
 
-    # Chroma expects a single top-level operator when multiple filters exist
-    where: Dict[str, Any] = filters[0] if len(filters) == 1 else {"$and": filters}
 
-    res = col.query(query_texts=[query], where=where, n_results=k)
+def expand_queries(message: str) -> List[str]:
+    """The message plus one sub-question per side of an explicit comparison.
+
+    "Compare the equity view and the credit view" -> message, "the equity view",
+    "the credit view"; "A vs B" likewise. Messages without a comparison come
+    back as-is.
+    """
+    text = message.strip().rstrip("?.!")
+    parts = _COMPARE_SPLIT.split(text)
+    if len(parts) < 2:
+        m = _COMPARE_PAIR.search(text)
+        parts = [m.group(1), m.group(2)] if m else []
+    subs = [p.strip(" ,;:") for p in parts if len(p.strip(" ,;:")) > 2]
+    return list(dict.fromkeys([message] + subs))
 
-    chunks: List[str] = res.get("documents", [[]])[0]
-    metas = res.get("metadatas", [[]])[0]
+
+def interleave(by_scope: Dict[str, List[Any]]) -> List[Any]:
+    """Round-robin over scopes so every report is represented near the top."""
+    merged: List[Any] = []
+    rank = 0
+    while any(rank < len(h) for h in by_scope.values()):
+        merged.extend(h[rank] for h in by_scope.values() if rank < len(h))
+        rank += 1
+    return merged
+
+
+def tool_search_reports_batch(
+    queries: List[str],
+    user_id: str,
+    report_ids: Optional[List[str]] = None,
+    bank: Optional[str] = None,
+    asset_class: Optional[str] = None,
+    k: int = DEFAULT_K,
+    hybrid: Optional[bool] = None,
+) -> Dict[str, Any]:
+    """Evidence for many queries and/or many reports in one Chroma round-trip.
+
+    All queries are embedded in one pass and sent in a single `col.query`
+    per partition the user's chunks can be in (one, unless partitioned by
+    asset class and the scope spans several).
+    With hybrid search on, each query also runs against the BM25 index under
+    the same filters, and the ranked lists are merged with reciprocal rank
+    fusion. Hits are deduped by chunk id. Each report in `report_ids` gets
+    up to `k` chunks, interleaved across reports; with no `report_ids`, the
+    best `k` chunks overall are returned in fused order.
+    """
+    hybrid = settings.HYBRID_SEARCH if hybrid is None else hybrid
+    cols = partitions.read_collections(user_id, asset_class, report_ids)
+    where = _where(user_id, bank, asset_class, report_ids, partitions.implied_filters(asset_class))
+    n_scopes = len(report_ids) if report_ids else 1
+    # Over-fetch so every scope can still fill k after the merge
+    n_results = k * n_scopes
+
+    with stage("embed"):
+        vectors = embed_texts(queries)
+    with stage("vector_query"):
+        res = partitions.query(cols, vectors, where, n_results)
+
+    hits: Dict[str, Dict[str, Any]] = {}
+
+    def add(chunk_id: str, rank: int, **fields: Any) -> None:
+        hit = hits.setdefault(chunk_id, {"id": chunk_id, "score": 0.0, "distance": None})
+        hit["score"] += 1.0 / (settings.RRF_K + rank + 1)
+        for name, value in fields.items():
+            if name == "distance" and hit["distance"] is not None:
+                value = min(value, hit["distance"])
+            hit[name] = value
+
+    for q_idx in range(len(queries)):
+        for rank, (chunk_id, doc, md, dist) in enumerate(zip(
+            res["ids"][q_idx], res["documents"][q_idx], res["metadatas"][q_idx], res["distances"][q_idx]
+        )):
+            add(chunk_id, rank, chunk=doc, metadata=md, distance=dist)
+
+    if hybrid:
+        with stage("lexical_query"):
+            lexical_hits = [
+                lexical.search(query, user_id, bank, asset_class, report_ids, k=n_results) for query in queries
+            ]
+        for ranked in lexical_hits:
+            for rank, (chunk_id, _) in enumerate(ranked):
+                add(chunk_id, rank)
+
+        # Lexical-only hits still need their text and metadata
+        missing = [h["id"] for h in hits.values() if "chunk" not in h]
+        if missing:
+            with stage("fetch_chunks"):
+                got = partitions.get(cols, missing)
+            for chunk_id, doc, md in zip(got["ids"], got["documents"], got["metadatas"]):
+                hits[chunk_id].update(chunk=doc, metadata=md)
+
+    # Without hybrid each id has one vector rank per query, so RRF order
+    # matches the vector order for single queries.
+    ranked = [
+        h for h in sorted(hits.values(), key=lambda h: -h["score"])
+        if "chunk" in h  # else in BM25 but gone from Chroma
+    ]
+    by_scope: Dict[str, List[Dict[str, Any]]] = {}
+    if report_ids:
+        for hit in ranked:
+            scope = hit["metadata"].get("report_id", "")
+            if scope not in report_ids:
+                continue
+            scope_hits = by_scope.setdefault(scope, [])
+            if len(scope_hits) < k:
+                scope_hits.append(hit)
+        merged = interleave(by_scope)
+    else:
+        merged = ranked[:k]
+        for hit in merged:
+            by_scope.setdefault(hit["metadata"].get("report_id", ""), []).append(hit)
 
     return {
         "type": "retrieval",
-        "chunks": chunks,
-        "metadatas": metas,
-        "meta": {"k": k, "filters": where, "source": "chroma"},
+        "chunks": [h["chunk"] for h in merged],
+        "metadatas": [h["metadata"] for h in merged],
+        "ids": [h["id"] for h in merged],
+        "distances": [h["distance"] for h in merged],
+        "scores": [round(h["score"], 5) for h in merged],
+        "meta": {
+            "k": k,
+            "filters": where,
+            "queries": queries,
+            "report_ids": report_ids,
+            "scopes": {scope: len(h) for scope, h in by_scope.items()},
+            "source": "chroma",
+            "partitions": len(cols),
+            "hybrid": hybrid,
+        },
     }
-
@@ -1,15 +1,187 @@
+import threading
+from typing import Any, Dict, List, Optional
+
 from chromadb import PersistentClient
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
 from chromadb.utils import embedding_functions
 from app.config import settings
+from app.context import count_tokens
 
-def get_collection():
-    client = PersistentClient(path=settings.CHROMA_DIR)
 
-    embed_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"
-    )
+# ---------- Thread-safe embedding function ----------
+class _LockedEmbeddingFunction(EmbeddingFunction[Documents]):
+    # One SentenceTransformer instance is shared by every request thread,
+    # so calls into it are serialized.
+    def __init__(self, inner: EmbeddingFunction):
+        self._inner = inner
+        self._lock = threading.Lock()
+
+    def __call__(self, input: Documents) -> Embeddings:
+        with self._lock:
+            return self._inner(input)
+
+    @property
+    def model(self):
+        return getattr(self._inner, "_model", None)
+
+
+# ---------- Process-wide vector store ----------
+class VectorStore:
+    """Chroma client + embedding model, opened once per worker process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._embed_fn: Optional[_LockedEmbeddingFunction] = None
+        self._collection = None
+        self._partitions: Dict[str, Any] = {}
+        self._tokenizer_lock = threading.Lock()
+        self.state = "cold"  # cold -> warming -> ready | failed
+        self.error: Optional[str] = None
+
+    def warm_up(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                return
+            self.state = "warming"
+            self.error = None
+            try:
+                client = PersistentClient(path=settings.CHROMA_DIR)
+                embed_fn = _LockedEmbeddingFunction(
+                    embedding_functions.SentenceTransformerEmbeddingFunction(
+                        model_name=settings.EMBEDDING_MODEL
+                    )
+                )
+                # The model is loaded lazily by Chroma; force it now so the
+                # first real request doesn't pay for it.
+                embed_fn(["warm-up"])
+                collection = client.get_or_create_collection(
+                    name=settings.COLLECTION_NAME,
+                    embedding_function=embed_fn,
+                )
+            except Exception as exc:
+                self.state = "failed"
+                self.error = str(exc)
+                raise
+
+            self._client = client
+            self._embed_fn = embed_fn
+            self._collection = collection
+            self.state = "ready"
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def collection(self, name: Optional[str] = None, create: bool = True, metadata: Optional[Dict[str, Any]] = None):
+        """The default collection, or a named partition (see app.partitions).
+
+        With `create=False` a partition that doesn't exist yet comes back as
+        None instead of being created, so reads never leave empty ones behind.
+        `metadata` is only set when the collection is created.
+        """
+        if self._client is None:
+            self.warm_up()
+        if not name or name == settings.COLLECTION_NAME:
+            if self._collection is None:  # dropped by compaction
+                with self._lock:
+                    if self._collection is None:
+                        self._collection = self._client.get_or_create_collection(
+                            name=settings.COLLECTION_NAME, embedding_function=self._embed_fn
+                        )
+            return self._collection
+        col = self._partitions.get(name)
+        if col is not None:
+            return col
+        with self._lock:
+            col = self._partitions.get(name)
+            if col is None:
+                if create:
+                    col = self._client.get_or_create_collection(
+                        name=name, embedding_function=self._embed_fn, metadata=metadata
+                    )
+                else:
+                    try:
+                        col = self._client.get_collection(name=name, embedding_function=self._embed_fn)
+                    except Exception:  # ValueError on 0.5, InvalidCollectionException later
+                        return None
+                self._partitions[name] = col
+        return col
+
+    def drop(self, name: str) -> None:
+        if self._client is None:
+            self.warm_up()
+        with self._lock:
+            self._client.delete_collection(name)
+            self._partitions.pop(name, None)
+            if name == settings.COLLECTION_NAME:
+                self._collection = None
 
-    return client.get_or_create_collection(
-        name=settings.COLLECTION_NAME,
-        embedding_function=embed_fn
-    )
+    def rename(self, old: str, new: str) -> None:
+        col = self.collection(old)
+        with self._lock:
+            col.modify(name=new)
+            self._partitions.pop(old, None)
+            if new == settings.COLLECTION_NAME:
+                self._collection = col
+            else:
+                self._partitions[new] = col
+
+    def collection_names(self) -> List[str]:
+        if self._client is None:
+            self.warm_up()
+        # Collection objects before chromadb 0.6, plain names after
+        return sorted(getattr(c, "name", c) for c in self._client.list_collections())
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if self._embed_fn is None:
+            self.warm_up()
+        return [list(e) for e in self._embed_fn(texts)]
+
+    def token_len(self, text: str) -> int:
+        """Length of `text` in embedding-model tokens (estimated if the model has no tokenizer)."""
+        if self._embed_fn is None:
+            self.warm_up()
+        tokenizer = getattr(self._embed_fn.model, "tokenizer", None)
+        if tokenizer is None:
+            return count_tokens(text)
+        with self._tokenizer_lock:
+            return len(tokenizer.encode(text, add_special_tokens=False))
+
+    def window_tokens(self) -> int:
+        """Text tokens the model embeds before truncating."""
+        if self._embed_fn is None:
+            self.warm_up()
+        window = getattr(self._embed_fn.model, "max_seq_length", None) or 256
+        return window - 2  # [CLS] and [SEP]
+
+    def chunk_tokens(self) -> int:
+        """Chunk size for ingestion: CHUNK_MAX_TOKENS (never past the model's
+        input window, so no chunk is truncated), or the window itself."""
+        window = self.window_tokens()
+        return min(settings.CHUNK_MAX_TOKENS, window) if settings.CHUNK_MAX_TOKENS else window
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "error": self.error,
+            "collection": settings.COLLECTION_NAME,
+            "partitioning": settings.PARTITION_STRATEGY,
+            "partitions_open": len(self._partitions),
+            "embedding_model": settings.EMBEDDING_MODEL,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._collection = None
+            self._partitions.clear()
+            self._embed_fn = None
+            self._client = None
+            self.state = "cold"
+
+
+store = VectorStore()
+
+
+def get_collection():
+    return store.collection()
@@ -0,0 +1,85 @@
+"""Compare-style retrieval: N sequential searches vs one batched query.
+
+Indexes synthetic reports into a throwaway Chroma collection, then answers
+`--subqueries` sub-questions over `--scopes` reports either with one
+tool_search_reports call per (sub-question, report) pair or with a single
+tool_search_reports_batch call.
+
+    cd backend
+    python -m benchmarks.bench_batch_retrieval --reports 8 --scopes 4 --subqueries 3
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from typing import Callable, List
+
+from app.config import settings
+
+SUBQUERIES = [
+    "What is the EUR/USD forecast?",
+    "What are the key risks to the outlook?",
+    "Which stocks are rated Overweight?",
+    "What do they expect from central banks?",
+    "How do they view credit spreads?",
+]
+
+
+def measure(fn: Callable[[], object], repeats: int) -> dict:
+    times: List[float] = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {"p50_ms": round(statistics.median(times) * 1000, 2), "min_ms": round(min(times) * 1000, 2)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reports", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--scopes", type=int, default=4, help="reports per compare request")
+    parser.add_argument("--subqueries", type=int, default=3)
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_batch_")
+    settings.CHROMA_DIR = os.path.join(workdir, "chroma")
+    settings.EMBEDDING_CACHE_DIR = ""  # measure real query embedding cost
+
+    from app.embeddings import embed_texts
+    from app.ingest import index_pages
+    from app.tools import tool_search_reports, tool_search_reports_batch
+    from app.vectorstore import get_collection, store
+    from benchmarks.synthetic import report_pages
+
+    store.warm_up()
+    col = get_collection()
+    report_ids = []
+    for seed in range(args.reports):
+        report_id = f"bench-report-{seed}"
+        md = {"user_id": "bench_user", "bank": "bench", "asset_class": "multi-asset",
+              "title": report_id, "date": "unknown", "filename": ""}
+        index_pages(report_pages(seed, args.pages), md, report_id, col, embed_texts)
+        report_ids.append(report_id)
+
+    scopes = report_ids[: args.scopes]
+    queries = (SUBQUERIES * args.subqueries)[: args.subqueries]
+    print(f"{len(queries)} sub-questions x {len(scopes)} reports, k={args.k}, corpus {col.count()} chunks")
+
+    def sequential() -> None:
+        for q in queries:
+            for report_id in scopes:
+                tool_search_reports(q, "bench_user", report_id=report_id, k=args.k)
+
+    def batched() -> None:
+        tool_search_reports_batch(queries, "bench_user", report_ids=scopes, k=args.k)
+
+    print(f"  sequential ({len(queries) * len(scopes)} round-trips): {measure(sequential, args.repeats)}")
+    print(f"  batched (1 round-trip):     {measure(batched, args.repeats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Chat pipeline throughput: blocking (old) vs async (current) agent calls.
+
+Drives the router -> tool -> responder path with N concurrent chats on one
+event loop against a stubbed Groq endpoint (benchmarks/fake_groq.py).
+
+    cd backend
+    python -m benchmarks.bench_chat_load --requests 64 --concurrency 16 --latency 0.5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+from openai import OpenAI
+
+from app import agents, llm
+from app.config import settings
+from app.executor import run_blocking
+from app.tools import tool_internal_kb, tool_search_reports
+from benchmarks.fake_groq import create_app, serve_in_thread
+
+
+# ---------- Old pipeline: sync client called inline on the event loop ----------
+async def legacy_chat(message: str) -> str:
+    client = OpenAI(api_key=settings.GROQ_API_KEY, base_url=settings.GROQ_BASE_URL)
+    resp = client.chat.completions.create(
+        model=settings.GROQ_MODEL,
+        messages=[
+            {"role": "system", "content": agents.ROUTER_SYSTEM},
+            {"role": "user", "content": message},
+        ],
+        temperature=0.0,
+    )
+    route = agents._parse_route(resp.choices[0].message.content or "").get("route")
+    if route == "internal_kb":
+        tool_out = tool_internal_kb(message)
+    else:
+        tool_out = tool_search_reports(message, user_id="bench_user")
+
+    client = OpenAI(api_key=settings.GROQ_API_KEY, base_url=settings.GROQ_BASE_URL)
+    resp = client.chat.completions.create(
+        model=settings.GROQ_MODEL,
+        messages=agents._responder_messages(message, route, tool_out),
+        temperature=0.2,
+    )
+    return resp.choices[0].message.content or ""
+
+
+# ---------- Current pipeline ----------
+async def async_chat(message: str) -> str:
+    decision = await agents.router_decide(message)
+    route = decision.get("route", "retrieve_summarize")
+    if route == "internal_kb":
+        tool_out = tool_internal_kb(message)
+    else:
+        tool_out = await run_blocking(tool_search_reports, message, user_id="bench_user")
+    return await agents.respond_with_context(message, route, tool_out)
+
+
+async def drive(
+    chat: Callable[[str], Awaitable[str]], requests: int, concurrency: int
+) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one(i: int) -> None:
+        async with sem:
+            t0 = time.perf_counter()
+            await chat(f"What does Analyst A think? #{i}")
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - t0
+    # Provider lanes (client pool, limiter) belong to this loop; the next run makes new ones
+    await llm.close_llm_client()
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "elapsed_s": round(elapsed, 3),
+        "req_per_s": round(requests / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake Groq delay (s)")
+    parser.add_argument(
+        "--route",
+        default="internal_kb",
+        help="route the fake router returns; use retrieve_summarize to include Chroma",
+    )
+    args = parser.parse_args()
+
+    settings.GROQ_API_KEY = "fake"
+    settings.GROQ_BASE_URL = serve_in_thread(create_app(args.latency, args.route))
+
+    for name, chat in (("blocking", legacy_chat), ("async", async_chat)):
+        result = asyncio.run(drive(chat, args.requests, args.concurrency))
+        print(f"{name:>8}: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Chunker comparison: 1200-char windows (the old chunk_text) vs iter_chunks.
+
+Chunks the same synthetic reports both ways and reports chunks per report,
+tokens per chunk, how many chunks overflow the embedding window (the model
+silently truncates those), how many table rows lose their header and how
+many chunks start or end mid-sentence. Both chunk sets are indexed, then
+retrieval is scored on fixture questions:
+
+- table: "EUR/USD spot 1.12, 3M 1.08: 12M forecast?" lookups; a hit needs
+  the returned chunk to hold the row together with the table's header row.
+- rating: ISIN lookups; a hit needs the whole rating sentence.
+
+    cd backend
+    python -m benchmarks.bench_chunker --reports 10 --pages 20
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import tempfile
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from app.config import settings
+
+HEADER = "Instrument | Spot | 3M | 12M"
+
+
+def char_windows(pages: Iterable[str], chunk_size: int = 1200, overlap: int = 200) -> List[str]:
+    """The previous chunker: whitespace-collapsed text cut into overlapping windows."""
+    text = re.sub(r"\s+", " ", "\n".join(pages)).strip()
+    chunks, start = [], 0
+    while start < len(text):
+        chunks.append(text[start:start + chunk_size])
+        if start + chunk_size >= len(text):
+            break
+        start += chunk_size - overlap
+    return chunks
+
+
+def fixtures(reports: Dict[str, List[str]], n: int, seed: int = 0) -> List[Tuple[str, str, List[str]]]:
+    """(kind, question, strings a hit chunk must all contain)."""
+    rng = random.Random(seed)
+    rows, ratings = [], []
+    for pages in reports.values():
+        text = "\n".join(pages)
+        rows += re.findall(r"^([A-Z]{3}/[A-Z]{3}) \| (\d\.\d\d) \| (\d\.\d\d) \| (\d\.\d\d)$", text, re.M)
+        ratings += re.findall(r"^We rate \w+ \(ISIN (\w+)\) .*$", text, re.M)
+    out = []
+    for _ in range(n):
+        if rng.random() < 0.5:
+            pair, spot, m3, m12 = rng.choice(rows)
+            out.append(("table", f"{pair} spot {spot}, 3M {m3}: 12M forecast?", [HEADER, f"{pair} | {spot} | {m3} | {m12}"]))
+        else:
+            code = rng.choice(ratings)
+            sentence = next(
+                m for pages in reports.values()
+                for m in re.findall(rf"^We rate \w+ \(ISIN {code}\) .*$", "\n".join(pages), re.M)
+            )
+            out.append(("rating", f"rating and target for ISIN {code}", [sentence]))
+    return out
+
+
+def describe(chunks: List[str], token_len: Callable[[str], int], window: int) -> Dict[str, float]:
+    tokens = [token_len(c) for c in chunks]
+    tables_cut = sum(
+        1 for c in chunks
+        for line in re.findall(r"[A-Z]{3}/[A-Z]{3} \| [\d.]+ \| [\d.]+ \| [\d.]+", c)
+        if HEADER not in c
+    )
+    return {
+        "chunks": len(chunks),
+        "mean_tokens": round(statistics.mean(tokens), 1),
+        "over_window": sum(t > window for t in tokens),
+        "table_rows_without_header": tables_cut,
+        # Chunks that start or end in the middle of a sentence
+        "ragged_edges": sum(bool(re.match(r"[a-z]", c) or not re.search(r"[.!?\d]$", c)) for c in chunks),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reports", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_chunker_")
+    settings.CHROMA_DIR = os.path.join(workdir, "chroma")
+    settings.EMBEDDING_CACHE_DIR = os.path.join(workdir, "embedding_cache")
+
+    from app import db as app_db
+    app_db.DB_PATH = os.path.join(workdir, "app.db")
+
+    from app import lexical
+    from app.embeddings import embed_texts
+    from app.ingest import chunk_record, chunk_min_tokens, iter_chunks
+    from app.tools import tool_search_reports
+    from app.vectorstore import get_collection, store
+    from benchmarks.synthetic import report_pages
+
+    store.warm_up()
+    col = get_collection()
+    window = store.window_tokens()
+    size = store.chunk_tokens()
+    min_tokens = chunk_min_tokens(size)
+    reports = {f"bench-report-{seed}": report_pages(seed, args.pages) for seed in range(args.reports)}
+    chunkers = {
+        "char_1200": lambda pages: char_windows(pages),
+        "structured": lambda pages: [
+            c["text"] for c in iter_chunks(pages, size, min_tokens, token_len=store.token_len)
+        ],
+    }
+
+    totals: Dict[str, List[str]] = {}
+    for name, chunker in chunkers.items():
+        totals[name] = []
+        for report_id, pages in reports.items():
+            chunks = chunker(pages)
+            totals[name] += chunks
+            md = {"user_id": name, "bank": "bench", "asset_class": "multi-asset",
+                  "title": report_id, "date": "unknown", "filename": ""}
+            records = [chunk_record(md, report_id, i, c) for i, c in enumerate(chunks)]
+            ids = [chunk_id for _, chunk_id in records]
+            metadatas = [m for m, _ in records]
+            col.upsert(ids=[f"{name}:{i}" for i in ids], documents=chunks, metadatas=metadatas,
+                       embeddings=embed_texts(chunks))
+            lexical.index_chunks([f"{name}:{i}" for i in ids], chunks, metadatas)
+
+    queries = fixtures(reports, args.queries)
+    print(f"{args.reports} reports x {args.pages} pages, window={window} tokens,"
+          f" chunks of {size} (min {min_tokens}), "
+          f"{len(queries)} fixture questions, k={args.k}")
+    for name in chunkers:
+        stats = describe(totals[name], store.token_len, window)
+        stats["chunks_per_report"] = round(stats["chunks"] / args.reports, 1)
+        for hybrid in (False, True):
+            hits: Dict[str, List[int]] = {"table": [], "rating": []}
+            for kind, question, needles in queries:
+                res = tool_search_reports(question, name, k=args.k, hybrid=hybrid)
+                hits[kind].append(any(all(n in c for n in needles) for c in res["chunks"]))
+            label = "hybrid" if hybrid else "vector"
+            for kind, h in hits.items():
+                stats[f"{label}_{kind}_recall@{args.k}"] = round(sum(h) / max(len(h), 1), 3)
+        print(f"  {name:11s} {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Responder prompt size: raw JSON tool output vs the packed context.
+
+Indexes synthetic reports, runs retrieval for a set of questions and counts
+prompt tokens (same heuristic as the app logs) for the old
+`json.dumps(tool_output, indent=2)` prompt and for build_context.
+
+    cd backend
+    python -m benchmarks.bench_context --reports 6 --pages 10 --k 8
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+
+from app.config import settings
+
+QUESTIONS = [
+    "What is the EUR/USD forecast?",
+    "What are the key risks to the outlook?",
+    "Which stocks are rated Overweight?",
+    "What do they expect from central banks?",
+    "How do they view credit spreads?",
+    "Compare the equities and credit outlook",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reports", type=int, default=6)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--budget", type=int, default=settings.CONTEXT_TOKEN_BUDGET)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_context_")
+    settings.CHROMA_DIR = os.path.join(workdir, "chroma")
+    settings.EMBEDDING_CACHE_DIR = os.path.join(workdir, "embedding_cache")
+
+    from app import db as app_db
+    app_db.DB_PATH = os.path.join(workdir, "app.db")
+
+    from app.context import build_context, count_tokens
+    from app.embeddings import embed_texts
+    from app.ingest import index_pages
+    from app.tools import expand_queries, tool_search_reports_batch
+    from app.vectorstore import get_collection, store
+    from benchmarks.synthetic import report_pages
+
+    store.warm_up()
+    col = get_collection()
+    for seed in range(args.reports):
+        report_id = f"bench-report-{seed}"
+        md = {"user_id": "bench_user", "bank": "bench", "asset_class": "multi-asset",
+              "title": report_id, "date": "unknown", "filename": ""}
+        index_pages(report_pages(seed, args.pages), md, report_id, col, embed_texts)
+
+    raw, packed = [], []
+    for q in QUESTIONS:
+        out = tool_search_reports_batch(expand_queries(q), "bench_user", k=args.k)
+        raw.append(count_tokens(json.dumps(out, indent=2)))
+        text, stats = build_context(out, budget=args.budget)
+        packed.append(count_tokens(text))
+        print(f"  {q[:40]:40s} raw={raw[-1]:6d} packed={packed[-1]:6d} {stats}")
+
+    print(f"{len(QUESTIONS)} questions, k={args.k}, budget={args.budget}")
+    print(f"  raw JSON tokens:  mean={statistics.mean(raw):.0f}")
+    print(f"  packed tokens:    mean={statistics.mean(packed):.0f}"
+          f" ({1 - sum(packed) / sum(raw):.0%} fewer)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Chat-turn writes under concurrency: connection per request vs pooled writer.
+
+Each simulated request checks chat ownership and writes a user and an
+assistant message, like POST /chats/{id}/messages.
+
+- per_request: the old get_db pattern, i.e. a fresh aiosqlite connection
+  (plus PRAGMA) per request and one commit per message.
+- pooled: app.db.database, i.e. pooled readers and one writer thread whose
+  commits cover whatever writes queued up meanwhile.
+
+    cd backend
+    python -m benchmarks.bench_db_writes --turns 2000 --concurrency 1 8 32 64
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List
+
+import aiosqlite
+
+from app import db as app_db
+
+
+async def per_request_turn(chat_id: str, user_id: str, n: int) -> None:
+    db = await aiosqlite.connect(app_db.DB_PATH)
+    await db.execute("PRAGMA foreign_keys=ON;")
+    db.row_factory = aiosqlite.Row
+    try:
+        cur = await db.execute("SELECT chat_id FROM chats WHERE chat_id = ? AND user_id = ?", (chat_id, user_id))
+        await cur.fetchone()
+        await cur.close()
+        await db.execute("INSERT INTO messages(chat_id, role, content) VALUES(?, 'user', ?)", (chat_id, f"q{n}"))
+        await db.commit()
+        await db.execute("INSERT INTO messages(chat_id, role, content) VALUES(?, 'assistant', ?)", (chat_id, f"a{n}"))
+        await db.commit()
+    finally:
+        await db.close()
+
+
+async def pooled_turn(chat_id: str, user_id: str, n: int) -> None:
+    from app import queries
+
+    await queries.get_chat(chat_id, user_id)
+    user_write = await queries.add_message_later(chat_id, "user", f"q{n}")
+    await queries.add_message(chat_id, "assistant", f"a{n}")
+    await user_write
+
+
+async def run(turn: Callable[[str, str, int], Awaitable[None]], turns: int, concurrency: int, chats: int) -> Dict:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(n: int) -> None:
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                await turn(f"chat-{n % chats}", "bench_user", n)
+            except sqlite3.OperationalError:
+                errors += 1  # "database is locked"
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(turns)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "messages_per_s": round(2 * (turns - errors) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 2),
+        "locked_errors": errors,
+    }
+
+
+async def main_async(args) -> None:
+    workdir = tempfile.mkdtemp(prefix="bench_db_")
+    app_db.DB_PATH = os.path.join(workdir, "app.db")
+    await app_db.init_db()
+    database = app_db.database
+    for i in range(args.chats):
+        await database.execute(
+            "INSERT INTO chats(chat_id, user_id, title) VALUES(?, 'bench_user', 'bench')", (f"chat-{i}",)
+        )
+
+    for concurrency in args.concurrency:
+        print(f"concurrency={concurrency}, {args.turns} turns ({2 * args.turns} messages)")
+        for name, turn in (("per_request", per_request_turn), ("pooled", pooled_turn)):
+            commits = database.stats["commits"]
+            result = await run(turn, args.turns, concurrency, args.chats)
+            if name == "pooled":
+                result["commits"] = database.stats["commits"] - commits
+            print(f"  {name:12s} {result}")
+    await database.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
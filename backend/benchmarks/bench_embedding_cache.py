@@ -0,0 +1,53 @@
+"""Embedding CPU time with and without the on-disk embedding cache.
+
+Builds a corpus of synthetic report chunks, then embeds it three times:
+straight through the model, through a cold cache, and through a warm cache
+(the state every re-upload, duplicate chunk and repeated query hits).
+
+    cd backend
+    python -m benchmarks.bench_embedding_cache --reports 10 --pages 20
+"""
+import argparse
+import tempfile
+import time
+from typing import Callable, List
+
+from app.config import settings
+from app.embeddings import EmbeddingCache
+from app.ingest import iter_chunks
+from app.vectorstore import store
+from benchmarks.synthetic import report_pages
+
+
+def timed(label: str, fn: Callable[[], List[List[float]]], n: int) -> None:
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    fn()
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - wall0
+    print(f"{label:>12}: cpu {cpu:7.3f}s  wall {wall:7.3f}s  ({n / wall:8.1f} chunks/s)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reports", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--dtype", default=settings.EMBEDDING_CACHE_DTYPE)
+    args = parser.parse_args()
+
+    chunks = [c for seed in range(args.reports) for c in iter_chunks(report_pages(seed, args.pages))]
+    print(f"corpus: {args.reports} reports, {len(chunks)} chunks, model {settings.EMBEDDING_MODEL}")
+
+    store.warm_up()
+    cache = EmbeddingCache(tempfile.mkdtemp(prefix="bench_emb_"), settings.EMBEDDING_MODEL, args.dtype)
+
+    def batched(embed: Callable[[List[str]], List[List[float]]]) -> Callable[[], List[List[float]]]:
+        return lambda: [v for i in range(0, len(chunks), args.batch) for v in embed(chunks[i:i + args.batch])]
+
+    timed("no cache", batched(store.embed), len(chunks))
+    timed("cold cache", batched(lambda texts: cache.embed(texts, store.embed)), len(chunks))
+    timed("warm cache", batched(lambda texts: cache.embed(texts, store.embed)), len(chunks))
+    print(f"cache stats: {cache.stats}")
+
+
+if __name__ == "__main__":
+    main()
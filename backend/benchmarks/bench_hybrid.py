@@ -0,0 +1,92 @@
+"""Exact-identifier retrieval: vector-only vs hybrid (BM25 + vector, RRF).
+
+Indexes synthetic reports, then asks for chunks by an ISIN, a ticker rating
+or an FX forecast row taken from the corpus itself. A query counts as a hit
+when a returned chunk contains that exact string.
+
+    cd backend
+    python -m benchmarks.bench_hybrid --reports 10 --pages 10 --queries 100
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from app.config import settings
+
+
+def identifier_queries(docs: List[str], n: int, seed: int = 0) -> List[Tuple[str, str]]:
+    """(question, needle) pairs whose needle occurs in the indexed chunks."""
+    isins = sorted({m for d in docs for m in re.findall(r"\b[A-Z]{2}\d{10}\b", d)})
+    rows = sorted({m for d in docs for m in re.findall(r"[A-Z]{3}/[A-Z]{3} \| \d\.\d\d", d)})
+    rng = random.Random(seed)
+    out: List[Tuple[str, str]] = []
+    while len(out) < n:
+        if rng.random() < 0.6 and isins:
+            needle = rng.choice(isins)
+            out.append((f"What is the rating on ISIN {needle}?", needle))
+        elif rows:
+            needle = rng.choice(rows)
+            pair, spot = needle.split(" | ")
+            out.append((f"{pair} spot {spot} forecast", needle))
+    return out
+
+
+def run(queries: List[Tuple[str, str]], k: int, hybrid: bool) -> Dict[str, float]:
+    from app.tools import tool_search_reports
+
+    hits, times = 0, []
+    for question, needle in queries:
+        t0 = time.perf_counter()
+        res = tool_search_reports(question, "bench_user", k=k, hybrid=hybrid)
+        times.append(time.perf_counter() - t0)
+        hits += any(needle in chunk for chunk in res["chunks"])
+    return {
+        f"recall@{k}": round(hits / len(queries), 3),
+        "p50_ms": round(statistics.median(times) * 1000, 2),
+        "p95_ms": round(sorted(times)[int(0.95 * (len(times) - 1))] * 1000, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reports", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=6)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_hybrid_")
+    settings.CHROMA_DIR = os.path.join(workdir, "chroma")
+    settings.EMBEDDING_CACHE_DIR = os.path.join(workdir, "embedding_cache")
+
+    from app import db as app_db
+    app_db.DB_PATH = os.path.join(workdir, "app.db")
+
+    from app.embeddings import embed_texts
+    from app.ingest import index_pages
+    from app.vectorstore import get_collection, store
+    from benchmarks.synthetic import report_pages
+
+    store.warm_up()
+    col = get_collection()
+    for seed in range(args.reports):
+        report_id = f"bench-report-{seed}"
+        md = {"user_id": "bench_user", "bank": "bench", "asset_class": "multi-asset",
+              "title": report_id, "date": "unknown", "filename": ""}
+        index_pages(report_pages(seed, args.pages), md, report_id, col, embed_texts)
+
+    queries = identifier_queries(col.get(include=["documents"])["documents"], args.queries)
+    # Warm both paths (query embeddings, SQLite page cache) before timing
+    run(queries[:5], args.k, hybrid=True)
+    print(f"{len(queries)} identifier queries, k={args.k}, corpus {col.count()} chunks")
+    print(f"  vector only: {run(queries, args.k, hybrid=False)}")
+    print(f"  hybrid (RRF): {run(queries, args.k, hybrid=True)}")
+
+
+if __name__ == "__main__":
+    main()
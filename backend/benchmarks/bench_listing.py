@@ -0,0 +1,151 @@
+"""Chat and message listing on a large generated database.
+
+Builds a SQLite database with `--messages` messages (default 1M) spread over
+many chats. One heavy user owns `--heavy-chats` chats and the longest chat.
+Then it times:
+
+- unpaged: the old queries (every chat / every message), before the
+  migration indexes exist;
+- paged: the keyset-paginated queries in app.queries after the migrations,
+  for the first page and for a page deep in the history.
+
+    cd backend
+    python -m benchmarks.bench_listing --messages 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+from typing import Awaitable, Callable, Dict
+
+from app import db as app_db
+
+
+def generate(path: str, messages: int, chats: int, heavy_chats: int, long_chat: int) -> str:
+    """Fill the schema with synthetic chats and messages; returns the longest chat id."""
+    rng = random.Random(0)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=OFF;")
+    chat_rows = []
+    for i in range(chats):
+        user = "heavy_user" if i < heavy_chats else f"user_{rng.randrange(chats // 10 or 1)}"
+        created = f"2025-{1 + i * 12 // chats:02d}-{1 + i % 28:02d} {i % 24:02d}:{i % 60:02d}:{i * 7 % 60:02d}"
+        chat_rows.append((str(uuid.UUID(int=rng.getrandbits(128))), user, f"chat {i}", created))
+    conn.executemany("INSERT INTO chats(chat_id, user_id, title, created_at) VALUES(?, ?, ?, ?)", chat_rows)
+
+    long_chat_id = chat_rows[0][0]
+    ids = [row[0] for row in chat_rows]
+
+    def rows():
+        for n in range(messages):
+            chat_id = long_chat_id if n < long_chat else ids[rng.randrange(len(ids))]
+            yield chat_id, "user" if n % 2 == 0 else "assistant", f"message {n} " + "lorem ipsum " * 8
+
+    conn.executemany("INSERT INTO messages(chat_id, role, content) VALUES(?, ?, ?)", rows())
+    conn.commit()
+    conn.close()
+    return long_chat_id
+
+
+def drop_migration_indexes(path: str) -> None:
+    conn = sqlite3.connect(path)
+    for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND name IN "
+        "('idx_chats_user_created', 'idx_messages_chat')"
+    ).fetchall():
+        conn.execute(f"DROP INDEX {name}")
+    conn.execute("PRAGMA user_version = 0")
+    conn.commit()
+    conn.close()
+
+
+async def measure(fn: Callable[[], Awaitable[object]], repeats: int) -> Dict[str, float]:
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        await fn()
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    return {
+        "p50_ms": round(statistics.median(times) * 1000, 2),
+        "p95_ms": round(times[int(0.95 * (len(times) - 1))] * 1000, 2),
+    }
+
+
+async def main_async(args) -> None:
+    workdir = tempfile.mkdtemp(prefix="bench_listing_")
+    app_db.DB_PATH = os.path.join(workdir, "app.db")
+    await app_db.init_db()
+    database = app_db.database
+
+    t0 = time.perf_counter()
+    long_chat = generate(app_db.DB_PATH, args.messages, args.chats, args.heavy_chats, args.long_chat)
+    print(f"generated {args.messages} messages / {args.chats} chats in {time.perf_counter() - t0:.1f}s")
+
+    from app import queries
+
+    drop_migration_indexes(app_db.DB_PATH)
+    await database.start()
+    unpaged_chats = await measure(lambda: database.fetchall(
+        "SELECT chat_id, title, report_id, created_at FROM chats WHERE user_id = ? ORDER BY created_at DESC",
+        ("heavy_user",),
+    ), args.repeats)
+    unpaged_messages = await measure(lambda: database.fetchall(
+        "SELECT message_id, role, content, created_at FROM messages WHERE chat_id = ? ORDER BY message_id ASC",
+        (long_chat,),
+    ), args.repeats)
+    await database.close()
+
+    t0 = time.perf_counter()
+    await app_db.init_db()  # runs the migrations
+    print(f"migrations applied in {time.perf_counter() - t0:.1f}s")
+    await database.start()
+
+    chats, _ = await queries.list_chats("heavy_user", args.limit)
+    deep_chats = None
+    for _ in range(args.heavy_chats // args.limit // 2):
+        deep_chats, _ = await queries.list_chats(
+            "heavy_user", args.limit, before=queries.chat_cursor((deep_chats or chats)[-1])
+        )
+    deep_chat_cursor = queries.chat_cursor((deep_chats or chats)[-1])
+    page, _ = await queries.list_messages(long_chat, args.limit)
+    deep_message = page[0]["message_id"] - args.long_chat // 2
+
+    results = {
+        "chats unpaged (no index)": unpaged_chats,
+        "chats page 1": await measure(lambda: queries.list_chats("heavy_user", args.limit), args.repeats),
+        "chats deep page": await measure(
+            lambda: queries.list_chats("heavy_user", args.limit, before=deep_chat_cursor), args.repeats
+        ),
+        "messages unpaged (no index)": unpaged_messages,
+        "messages latest page": await measure(lambda: queries.list_messages(long_chat, args.limit), args.repeats),
+        "messages deep page": await measure(
+            lambda: queries.list_messages(long_chat, args.limit, before=deep_message), args.repeats
+        ),
+    }
+    await database.close()
+
+    print(f"heavy user: {args.heavy_chats} chats, longest chat: {args.long_chat} messages, page size {args.limit}")
+    for name, stats in results.items():
+        print(f"  {name:28s} {stats}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=50_000)
+    parser.add_argument("--heavy-chats", type=int, default=5_000)
+    parser.add_argument("--long-chat", type=int, default=20_000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=20)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
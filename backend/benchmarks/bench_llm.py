@@ -0,0 +1,112 @@
+"""LLM client resilience: a fresh client per call (old) vs app.llm.
+
+Each scenario starts its own fake Groq server with injected faults:
+
+- rate_limited: `--error-rate` of requests get a 429.
+- outage: every request gets a 503 (the circuit breaker should trip).
+- stalls: `--stall-rate` of requests hang for 30s (deadlines should cut them).
+
+Per scenario it prints success rate, p50/p95 latency, and how many requests
+reached the server and how many ran there at once.
+
+    cd backend
+    python -m benchmarks.bench_llm --requests 256 --concurrency 64 --error-rate 0.2
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Any, Dict, List
+
+from openai import AsyncOpenAI
+
+from app import llm
+from app.config import settings
+from benchmarks.fake_groq import create_app, serve_in_thread
+
+MESSAGES = [{"role": "user", "content": "What is the EUR/USD forecast?"}]
+
+
+async def naive_call() -> Any:
+    # What agents.py used to do: new client (and connection pool) per call,
+    # SDK defaults for retries and the 10-minute timeout
+    client = AsyncOpenAI(api_key=settings.GROQ_API_KEY, base_url=settings.GROQ_BASE_URL)
+    try:
+        return await client.chat.completions.create(model=settings.GROQ_MODEL, messages=MESSAGES)
+    finally:
+        await client.close()
+
+
+async def resilient_call() -> Any:
+    return await llm.chat_completion("retrieve_summarize", MESSAGES)
+
+
+async def drive(call, requests: int, concurrency: int, cap_s: float) -> Dict[str, Any]:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    ok = 0
+
+    async def one() -> None:
+        nonlocal ok
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                await asyncio.wait_for(call(), cap_s)
+                ok += 1
+            except Exception:
+                pass
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    wall = time.perf_counter() - t0
+    await llm.close_llm_client()
+    latencies.sort()
+    return {
+        "ok": ok / requests,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(0.95 * (len(latencies) - 1))],
+        "wall": wall,
+    }
+
+
+def run_scenario(name: str, args: argparse.Namespace, **faults: Any) -> None:
+    print(f"\n{name}: {faults}")
+    print(f"  {'client':<10} {'ok':>6} {'p50 s':>7} {'p95 s':>7} {'wall s':>7} {'upstream':>9} {'peak':>5}")
+    for label, call in (("naive", naive_call), ("app.llm", resilient_call)):
+        fake = create_app(args.latency, "retrieve_summarize", 0, **faults)
+        settings.GROQ_BASE_URL = serve_in_thread(fake)
+        r = asyncio.run(drive(call, args.requests, args.concurrency, args.cap))
+        s = fake.state.stats
+        print(
+            f"  {label:<10} {r['ok']:>6.0%} {r['p50']:>7.2f} {r['p95']:>7.2f} {r['wall']:>7.1f} "
+            f"{s['requests']:>9} {s['max_in_flight']:>5}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.2)
+    parser.add_argument("--stall-rate", type=float, default=0.05)
+    parser.add_argument("--deadline", type=float, default=3.0, help="LLM_DEADLINE_S for app.llm")
+    parser.add_argument("--attempt-timeout", type=float, default=1.0, help="LLM_TIMEOUT_S for app.llm")
+    parser.add_argument("--cap", type=float, default=15.0, help="give up on any call after this many seconds")
+    args = parser.parse_args()
+
+    settings.GROQ_API_KEY = "fake"
+    settings.LLM_DEADLINE_S = args.deadline
+    settings.LLM_TIMEOUT_S = args.attempt_timeout
+    settings.LLM_BACKOFF_BASE_S = 0.1
+    settings.LLM_BREAKER_COOLDOWN_S = 60
+
+    run_scenario("rate_limited", args, error_rate=args.error_rate, error_status=429)
+    run_scenario("outage", args, error_rate=1.0, error_status=503)
+    run_scenario("stalls", args, stall_rate=args.stall_rate)
+    print(f"\nllm stats (last run): {llm.llm_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Responder prompt size over a long chat: full history vs bounded memory.
+
+Plays a chat of `--turns` question/answer pairs against the fake Groq server
+(which also writes the summaries) and, at each turn, counts prompt tokens for
+the whole transcript and for load_memory + fit_memory. Also reports how many
+turns needed a summarization call.
+
+    cd backend
+    python -m benchmarks.bench_memory --turns 200 --budget 1500
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from app.config import settings
+from benchmarks.fake_groq import create_app, serve_in_thread
+
+QUESTIONS = [
+    "What is the EUR/USD forecast for year end?",
+    "What are the key risks to the outlook?",
+    "Which stocks are rated Overweight?",
+    "How do they view credit spreads?",
+]
+ANSWER = (
+    "The report expects EUR/USD at 1.12 by year end as the rate gap narrows. "
+    "Main risks are sticky services inflation, weaker China demand and wider spreads. "
+) * 3
+
+
+async def run(args: argparse.Namespace) -> None:
+    from app import db as app_db
+    from app import queries
+    from app.agents import _responder_messages
+    from app.context import count_tokens
+    from app.db import database, init_db
+    from app.memory import fit_memory, load_memory
+
+    app_db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="bench_memory_"), "app.db")
+    await init_db()
+    await database.start()
+    await queries.create_chat("bench-chat", "bench_user", "bench", None)
+
+    tool_out = {"type": "retrieval", "chunks": [], "meta": {"source": "chroma"}}
+    full_history = 0
+    rows = []
+    summaries = 0
+    fit_ms = []
+    for turn in range(1, args.turns + 1):
+        question = QUESTIONS[turn % len(QUESTIONS)]
+        memory = await load_memory("bench-chat")
+        upto = memory.summarized_upto
+        t0 = time.perf_counter()
+        memory = await fit_memory(memory)
+        fit_ms.append((time.perf_counter() - t0) * 1000)
+        summaries += memory.summarized_upto != upto
+
+        prompt = sum(count_tokens(m["content"]) + 4 for m in _responder_messages(question, "retrieve_summarize", tool_out, memory))
+        base = sum(count_tokens(m["content"]) + 4 for m in _responder_messages(question, "retrieve_summarize", tool_out))
+        if turn in args.report_at or turn == args.turns:
+            rows.append((turn, base + full_history, prompt))
+
+        await queries.add_message("bench-chat", "user", question)
+        await queries.add_message("bench-chat", "assistant", ANSWER)
+        full_history += count_tokens(question) + count_tokens(ANSWER) + 8
+
+    await database.close()
+
+    print(f"budget={settings.MEMORY_TOKEN_BUDGET} recent={settings.MEMORY_RECENT_MESSAGES} turns={args.turns}")
+    print(f"{'turn':>6} {'full history':>13} {'with memory':>12}")
+    for turn, full, bounded in rows:
+        print(f"{turn:>6} {full:>13} {bounded:>12}")
+    fit_ms.sort()
+    print(
+        f"summarization calls: {summaries} ({summaries / args.turns:.0%} of turns), "
+        f"fit_memory p50={fit_ms[len(fit_ms) // 2]:.1f} ms max={fit_ms[-1]:.1f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=settings.MEMORY_TOKEN_BUDGET)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake Groq latency per call (s)")
+    parser.add_argument("--report-at", type=int, nargs="*", default=[1, 5, 10, 25, 50, 100])
+    args = parser.parse_args()
+
+    settings.MEMORY_TOKEN_BUDGET = args.budget
+    settings.GROQ_API_KEY = "fake"
+    settings.GROQ_BASE_URL = serve_in_thread(create_app(args.latency, "retrieve_summarize", 0))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
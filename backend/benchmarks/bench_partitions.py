@@ -0,0 +1,140 @@
+"""Query latency for one user as the total corpus grows: shared vs partitioned.
+
+Indexes a few synthetic reports for the user being measured, then keeps
+adding other users (the same chunks under new user ids, vectors jittered so
+HNSW sees distinct points) and after each step times vector retrieval for
+the measured user with every PARTITION_STRATEGY:
+
+- shared: one collection, filtered by user_id.
+- user: the user's own collection, no filter.
+- user_asset_class: the user's per-asset-class collections; without an
+  asset_class every class is queried and the hits merged.
+
+shared and user_asset_class also run scoped to one asset class. Recall is
+against an exact top-k over the user's vectors; failed queries count as
+errors (and zero recall), not in the timings.
+
+    cd backend
+    python -m benchmarks.bench_partitions --reports 4 --pages 10 --others 0 20 100 400
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.config import settings
+
+QUESTIONS = [
+    "What is the EUR/USD forecast?",
+    "What are the key risks to the outlook?",
+    "Which stocks are rated Overweight?",
+    "How do they view credit spreads?",
+    "What do they expect from central banks?",
+]
+STRATEGIES = ("shared", "user", "user_asset_class")
+USER = "bench_user"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=4, help="reports for the measured user")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--others", type=int, nargs="+", default=[0, 20, 100, 400],
+                        help="other users in the corpus at each step (each has the same reports)")
+    parser.add_argument("--repeats", type=int, default=20, help="passes over the questions per step")
+    parser.add_argument("--k", type=int, default=6)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_partitions_")
+    settings.CHROMA_DIR = os.path.join(workdir, "chroma")
+    settings.EMBEDDING_CACHE_DIR = os.path.join(workdir, "embedding_cache")
+
+    from app import db as app_db
+    app_db.DB_PATH = os.path.join(workdir, "app.db")
+
+    from app import lexical
+    from app.embeddings import embed_texts
+    from app.ingest import index_pages
+    from app.partitions import partition_name
+    from app.tools import tool_search_reports_batch
+    from app.vectorstore import store
+    from benchmarks.synthetic import ASSET_CLASSES, report_pages
+
+    store.warm_up()
+    # The measured user's reports, indexed once through the real pipeline
+    template = store.collection("bench-template")
+    for seed in range(args.reports):
+        md = {"user_id": USER, "bank": "bench", "asset_class": ASSET_CLASSES[seed % len(ASSET_CLASSES)],
+              "title": f"report {seed}", "date": "unknown", "filename": ""}
+        index_pages(report_pages(seed, args.pages), md, f"bench-report-{seed}", template, embed_texts)
+    chunks = template.get(include=["documents", "metadatas", "embeddings"])
+    vectors = np.asarray(chunks["embeddings"], dtype=np.float32)
+    rng = np.random.default_rng(0)
+
+    def add_user(user_id: str, jitter: float) -> None:
+        embs = vectors + (rng.normal(0, jitter, vectors.shape).astype(np.float32) if jitter else 0)
+        embs /= np.linalg.norm(embs, axis=1, keepdims=True)
+        ids = [f"{user_id}:{i}" for i in chunks["ids"]]
+        mds = [{**md, "user_id": user_id, "report_id": f"{user_id}:{md['report_id']}"} for md in chunks["metadatas"]]
+        for strategy in STRATEGIES:
+            by_partition = {}
+            for n, md in enumerate(mds):
+                by_partition.setdefault(partition_name(user_id, md["asset_class"], strategy), []).append(n)
+            for name, rows in by_partition.items():
+                store.collection(name).upsert(
+                    ids=[ids[n] for n in rows],
+                    documents=[chunks["documents"][n] for n in rows],
+                    metadatas=[mds[n] for n in rows],
+                    embeddings=[embs[n].tolist() for n in rows],
+                )
+        if user_id == USER:
+            lexical.index_chunks(ids, chunks["documents"], mds)
+
+    add_user(USER, 0.0)
+    per_user = len(chunks["ids"])
+    asset_class = ASSET_CLASSES[0]
+    # Exact top-k over the user's own vectors, the reference for recall
+    query_vectors = np.asarray(embed_texts(QUESTIONS), dtype=np.float32)
+    in_class = np.array([md["asset_class"] == asset_class for md in chunks["metadatas"]])
+    exact = {}
+    for scope, mask in ((None, np.ones(per_user, bool)), (asset_class, in_class)):
+        ids = np.array([f"{USER}:{i}" for i in chunks["ids"]])[mask]
+        dist = ((vectors[mask][None, :, :] - query_vectors[:, None, :]) ** 2).sum(-1)
+        exact[scope] = [set(ids[np.argsort(row)[:args.k]]) for row in dist]
+
+    modes = [(s, None) for s in STRATEGIES] + [("shared", asset_class), ("user_asset_class", asset_class)]
+    print(f"{per_user} chunks per user, {args.repeats * len(QUESTIONS)} queries per mode and step, k={args.k}")
+    print(f"  {'corpus':>8}  {'strategy':<18} {'asset_class':<12} {'p50 ms':>8} {'p95 ms':>8} {'recall':>7} {'errors':>6}")
+
+    added = 0
+    for others in args.others:
+        for n in range(added, others):
+            add_user(f"other_{n}", 0.02)
+        added = max(added, others)
+
+        for strategy, scope in modes:
+            settings.PARTITION_STRATEGY = strategy
+            samples, recalls, errors = [], [], 0
+            for _ in range(args.repeats):
+                for q_idx, q in enumerate(QUESTIONS):
+                    t0 = time.perf_counter()
+                    try:
+                        out = tool_search_reports_batch([q], USER, asset_class=scope, k=args.k, hybrid=False)
+                    except RuntimeError:
+                        # hnswlib gives up when a filter leaves too few reachable neighbours
+                        errors += 1
+                        recalls.append(0.0)
+                        continue
+                    samples.append((time.perf_counter() - t0) * 1000)
+                    recalls.append(len(exact[scope][q_idx] & set(out["ids"])) / len(exact[scope][q_idx]))
+            ordered = sorted(samples) or [float("nan")]
+            print(f"  {per_user * (added + 1):>8}  {strategy:<18} {scope or '-':<12}"
+                  f" {statistics.median(ordered):>8.2f} {ordered[int(0.95 * (len(ordered) - 1))]:>8.2f}"
+                  f" {statistics.mean(recalls):>7.0%} {errors:>6}")
+        settings.PARTITION_STRATEGY = "shared"
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Cross-encoder reranking: added latency vs prompt tokens saved.
+
+Indexes synthetic reports, then for each question compares:
+
+- over-fetch: the top `--candidates` retrieval hits go straight to the
+  packer (what you need without a reranker to be sure the answer is in).
+- rerank: the same candidates scored by the cross-encoder, best `--k` kept.
+  Timed with an empty score memo (cold) and again with it filled (warm).
+
+Prompt tokens are the packed context (same heuristic as the app logs).
+
+    cd backend
+    python -m benchmarks.bench_rerank --reports 6 --pages 10 --candidates 24 --k 6
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from app.config import settings
+
+QUESTIONS = [
+    "What is the EUR/USD forecast?",
+    "What are the key risks to the outlook?",
+    "Which stocks are rated Overweight?",
+    "What do they expect from central banks?",
+    "How do they view credit spreads?",
+    "Compare the equities and credit outlook",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reports", type=int, default=6)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=24)
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument("--budget-ms", type=float, default=settings.RERANK_BUDGET_MS)
+    parser.add_argument("--model", default=settings.RERANK_MODEL)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_rerank_")
+    settings.CHROMA_DIR = os.path.join(workdir, "chroma")
+    settings.EMBEDDING_CACHE_DIR = os.path.join(workdir, "embedding_cache")
+    settings.RERANK_ROUTES = f"retrieve_summarize={args.k}"
+    settings.RERANK_BUDGET_MS = args.budget_ms
+
+    from app import db as app_db
+    app_db.DB_PATH = os.path.join(workdir, "app.db")
+
+    from app.context import build_context
+    from app.embeddings import embed_texts
+    from app.ingest import index_pages
+    from app import rerank
+    from app.tools import expand_queries, tool_search_reports_batch
+    from app.vectorstore import get_collection, store
+    from benchmarks.synthetic import report_pages
+
+    store.warm_up()
+    rerank.reranker = rerank.Reranker(args.model, settings.RERANK_BATCH_SIZE, settings.RERANK_CACHE_SIZE)
+    t0 = time.perf_counter()
+    rerank.reranker.warm_up()
+    print(f"model load: {time.perf_counter() - t0:.2f}s ({args.model})")
+
+    col = get_collection()
+    for seed in range(args.reports):
+        report_id = f"bench-report-{seed}"
+        md = {"user_id": "bench_user", "bank": "bench", "asset_class": "multi-asset",
+              "title": report_id, "date": "unknown", "filename": ""}
+        index_pages(report_pages(seed, args.pages), md, report_id, col, embed_texts)
+
+    rows = []
+    for q in QUESTIONS:
+        out = tool_search_reports_batch(expand_queries(q), "bench_user", k=args.candidates)
+        _, full = build_context(out)
+        timings = []
+        for _ in range(2):  # cold memo, then warm
+            t0 = time.perf_counter()
+            ranked = rerank.rerank_retrieval(q, out, "retrieve_summarize")
+            timings.append((time.perf_counter() - t0) * 1000)
+        _, kept = build_context(ranked)
+        rows.append((full["context_tokens"], kept["context_tokens"], *timings, ranked["meta"]["rerank"]["fallback"]))
+        print(f"  {q[:40]:40s} tokens {full['context_tokens']:5d} -> {kept['context_tokens']:5d}"
+              f"  rerank cold={timings[0]:6.1f}ms warm={timings[1]:5.1f}ms"
+              f"{'  (fallback)' if rows[-1][-1] else ''}")
+
+    full_tokens, kept_tokens, cold, warm, fallbacks = zip(*rows)
+    print(f"{len(QUESTIONS)} questions, {args.candidates} candidates -> k={args.k}, budget={args.budget_ms:.0f}ms")
+    print(f"  prompt tokens: {statistics.mean(full_tokens):.0f} -> {statistics.mean(kept_tokens):.0f}"
+          f" ({1 - sum(kept_tokens) / sum(full_tokens):.0%} fewer)")
+    print(f"  added latency: cold p50={statistics.median(cold):.1f}ms max={max(cold):.1f}ms,"
+          f" warm p50={statistics.median(warm):.1f}ms; fallbacks={sum(fallbacks)}")
+    print(f"  reranker: {rerank.reranker.snapshot()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Summary questions: retrieval + responder vs precomputed report summaries.
+
+Indexes synthetic reports, builds their summaries once (local LLM provider,
+so the calls are counted but free), then for summary-type questions on each
+report compares the responder prompt built from retrieval with:
+
+- direct: whole-report questions ("Summarize this report") answered from
+  the stored summary, with no LLM call.
+- compact: other summary questions with the summaries as context.
+
+Prints responder prompt tokens per question (0 when no LLM call is needed)
+and how many questions pay back the one-time summarization cost.
+
+    cd backend
+    python -m benchmarks.bench_summaries --reports 4 --pages 30
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from app.config import settings
+
+QUESTIONS = [
+    "Summarize this report",
+    "Give me the main takeaways",
+    "What are the key risks to the outlook?",
+    "What is the overall outlook of this research?",
+]
+
+
+def _prompt_tokens(messages) -> int:
+    from app.context import count_tokens
+
+    return sum(count_tokens(m["content"]) + 4 for m in messages)
+
+
+async def run(args: argparse.Namespace) -> None:
+    from app import db as app_db
+    from app import llm, queries
+    from app.agents import _responder_messages
+    from app.db import database, init_db
+    from app.embeddings import embed_texts
+    from app.ingest import index_pages
+    from app.metrics import LLM_TOKENS
+    from app.summaries import (
+        build_report_summaries, is_whole_report_summary, load_report_summary, relevant_sections, summary_tool_output,
+    )
+    from app.tools import tool_search_reports_batch
+    from app.vectorstore import get_collection, store
+    from benchmarks.synthetic import report_pages
+
+    workdir = tempfile.mkdtemp(prefix="bench_summaries_")
+    settings.CHROMA_DIR = os.path.join(workdir, "chroma")
+    settings.EMBEDDING_CACHE_DIR = os.path.join(workdir, "embedding_cache")
+    app_db.DB_PATH = os.path.join(workdir, "app.db")
+    await init_db()
+    await database.start()
+
+    store.warm_up()
+    col = get_collection()
+    build = []
+    for seed in range(args.reports):
+        report_id = f"bench-report-{seed}"
+        md = {"user_id": "bench_user", "bank": "bench", "asset_class": "multi-asset",
+              "title": report_id, "date": "unknown", "filename": ""}
+        index_pages(report_pages(seed, args.pages), md, report_id, col, embed_texts)
+        await queries.upsert_report(report_id, "bench_user", "", report_id, "bench", "multi-asset", "unknown", f"sha-{seed}")
+        calls = llm.stats["calls"]
+        t0 = time.perf_counter()
+        stats = await build_report_summaries(col, report_id, report_id, f"sha-{seed}")
+        build.append((llm.stats["calls"] - calls, stats["input_tokens"], time.perf_counter() - t0))
+    summary_prompt = sum(v for k, v in LLM_TOKENS._values.items() if k[0] == "report_summary" and k[2] == "prompt")
+
+    rows = []
+    for seed in range(args.reports):
+        report_id = f"bench-report-{seed}"
+        summary = await load_report_summary(report_id)
+        for q in QUESTIONS:
+            retrieval = tool_search_reports_batch([q], "bench_user", report_ids=[report_id])
+            before = _prompt_tokens(_responder_messages(q, "retrieve_summarize", retrieval))
+            direct = is_whole_report_summary(q)
+            sections = relevant_sections(summary, q, settings.SUMMARY_CONTEXT_TOKENS)
+            after = 0 if direct else _prompt_tokens(
+                _responder_messages(q, "retrieve_summarize", summary_tool_output(summary, False, sections))
+            )
+            rows.append((q, before, after, direct))
+    await database.close()
+    await llm.close_llm_client()
+
+    print(f"{args.reports} reports x {args.pages} pages")
+    calls, inputs, seconds = zip(*build)
+    print(f"  summarizing at ingestion: {statistics.mean(calls):.0f} LLM calls/report,"
+          f" ~{summary_prompt / args.reports:.0f} prompt tokens/report ({statistics.mean(inputs):.0f} of report text),"
+          f" {statistics.mean(seconds):.2f}s/report with the local provider")
+    print(f"  {'question':40s} {'retrieval':>10} {'summaries':>10}")
+    for q in QUESTIONS:
+        mine = [r for r in rows if r[0] == q]
+        b = statistics.mean(r[1] for r in mine)
+        a = statistics.mean(r[2] for r in mine)
+        print(f"  {q[:40]:40s} {b:>10.0f} {a:>10.0f}{'  (direct, no LLM call)' if mine[0][3] else ''}")
+    saved = statistics.mean(r[1] - r[2] for r in rows)
+    direct_share = sum(r[3] for r in rows) / len(rows)
+    print(f"  per question: {saved:.0f} prompt tokens saved on average, {direct_share:.0%} answered without an LLM call")
+    print(f"  break-even after ~{summary_prompt / args.reports / saved:.0f} summary questions per report" if saved > 0 else "")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reports", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=30)
+    args = parser.parse_args()
+
+    settings.LLM_PROVIDER = "local"
+    settings.LLM_ROUTES = ""
+    settings.LOCAL_LLM_LATENCY_S = 0.0
+    settings.LOCAL_LLM_ANSWER_TOKENS = settings.SUMMARY_SECTION_TOKENS
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Time-to-first-token: POST /chats/{id}/messages vs .../messages/stream.
+
+Runs the real FastAPI app under uvicorn against a local fake OpenAI-compatible
+server that emits tokens at a fixed rate.
+
+    cd backend
+    python -m benchmarks.bench_ttft --requests 20 --latency 0.3 --token-rate 50
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import List
+
+import httpx
+
+from benchmarks.fake_groq import create_app, serve_in_thread
+
+
+def _summary(values: List[float]) -> dict:
+    values = sorted(values)
+    return {
+        "p50_ms": round(statistics.median(values) * 1000, 1),
+        "p95_ms": round(values[int(0.95 * (len(values) - 1))] * 1000, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake Groq time to first token (s)")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="fake Groq tokens/sec")
+    args = parser.parse_args()
+
+    # Point the app at the fake server and a throwaway database before importing it.
+    fake_url = serve_in_thread(create_app(args.latency, "internal_kb", args.token_rate))
+    workdir = tempfile.mkdtemp(prefix="bench_ttft_")
+    os.environ["SQLITE_PATH"] = os.path.join(workdir, "app.db")
+
+    from app import db
+    from app.config import settings
+    from app.main import app
+
+    db.DB_PATH = os.environ["SQLITE_PATH"]
+    settings.GROQ_API_KEY = "fake"
+    settings.GROQ_BASE_URL = fake_url
+    settings.APP_API_KEY = "bench-key"
+    settings.CHROMA_DIR = os.path.join(workdir, "chroma")
+
+    base_url = serve_in_thread(app)
+    headers = {"X-API-Key": settings.APP_API_KEY}
+
+    with httpx.Client(base_url=base_url, headers=headers, timeout=60) as client:
+        chat_id = client.post("/chats", json={"title": "bench"}).json()["chat_id"]
+        body = {"message": "What does Analyst A think?"}
+
+        blocking: List[float] = []
+        for _ in range(args.requests):
+            t0 = time.perf_counter()
+            client.post(f"/chats/{chat_id}/messages", json=body).raise_for_status()
+            blocking.append(time.perf_counter() - t0)
+
+        ttft: List[float] = []
+        total: List[float] = []
+        for _ in range(args.requests):
+            t0 = time.perf_counter()
+            first = None
+            with client.stream("POST", f"/chats/{chat_id}/messages/stream", json=body) as resp:
+                resp.raise_for_status()
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    if first is None and json.loads(line)["type"] == "token":
+                        first = time.perf_counter() - t0
+            ttft.append(first if first is not None else time.perf_counter() - t0)
+            total.append(time.perf_counter() - t0)
+
+    print(f"non-streaming first token (= full answer): {_summary(blocking)}")
+    print(f"streaming time to first token:             {_summary(ttft)}")
+    print(f"streaming time to last token:              {_summary(total)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Minimal OpenAI-compatible chat completions server for local benchmarks.
+
+Router calls (system prompt starts with "You are a router agent") get a JSON
+route back; every other call gets a canned answer. `latency` is the delay
+before the first token and `token_rate` the tokens/sec after that, for both
+plain and `stream=True` (SSE) requests.
+
+Faults for resilience tests: `error_rate` of requests fail with
+`error_status` (429s carry a short Retry-After), and `stall_rate` of them
+hang for `stall_s` before answering. `app.state.stats` counts requests,
+injected faults and the peak number of concurrent requests.
+"""
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Dict
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER_TOKENS = ["Fake ", "answer. "] * 50
+
+
+def create_app(
+    latency: float = 0.5,
+    route: str = "internal_kb",
+    token_rate: float = 0.0,
+    error_rate: float = 0.0,
+    error_status: int = 429,
+    stall_rate: float = 0.0,
+    stall_s: float = 30.0,
+    seed: int = 0,
+) -> FastAPI:
+    app = FastAPI()
+    token_delay = 1.0 / token_rate if token_rate > 0 else 0.0
+    rng = random.Random(seed)
+    app.state.stats = stats = {"requests": 0, "errors": 0, "stalls": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def _is_router(body: Dict[str, Any]) -> bool:
+        messages = body.get("messages") or []
+        return bool(messages) and str(messages[0].get("content", "")).startswith(
+            "You are a router agent"
+        )
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            return await _complete(request)
+        finally:
+            stats["in_flight"] -= 1
+
+    async def _complete(request: Request):
+        body = await request.json()
+        if rng.random() < stall_rate:
+            stats["stalls"] += 1
+            await asyncio.sleep(stall_s)
+        await asyncio.sleep(latency)
+        if rng.random() < error_rate:
+            stats["errors"] += 1
+            return JSONResponse(
+                status_code=error_status,
+                content={"error": {"message": f"injected {error_status}", "type": "fake_error"}},
+                headers={"retry-after": "0.1"} if error_status == 429 else None,
+            )
+
+        if _is_router(body):
+            tokens = [json.dumps({"route": route, "reason": "fake router"})]
+        else:
+            tokens = ANSWER_TOKENS
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        if body.get("stream"):
+            return StreamingResponse(
+                _sse(completion_id, body.get("model", "fake"), tokens),
+                media_type="text/event-stream",
+            )
+
+        await asyncio.sleep(token_delay * len(tokens))
+        content = "".join(tokens)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+        }
+
+    async def _sse(completion_id: str, model: str, tokens):
+        for i, token in enumerate(tokens):
+            if i and token_delay:
+                await asyncio.sleep(token_delay)
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_in_thread(app: FastAPI, port: int = 0) -> str:
+    """Start `app` on a background thread and return its base URL."""
+    port = port or _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--route", default="internal_kb")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="tokens/sec, 0 = instant")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(args.latency, args.route, args.token_rate),
+        host="127.0.0.1",
+        port=args.port,
+    )
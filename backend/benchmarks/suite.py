@@ -0,0 +1,277 @@
+"""End-to-end benchmark suite: ingestion, retrieval and chat through the app.
+
+Runs the real FastAPI app in-process (httpx ASGI transport, lifespan
+included) against throwaway storage, with the local LLM provider so no
+network or API key is needed:
+
+- ingest: synthetic PDF reports of each `--sizes` page count go through
+  `/upload`, and the jobs are polled to completion (pages/sec, chunks/sec).
+- retrieval: `tool_search_reports` over the indexed reports at each
+  `--concurrency` level (p50/p95/p99, queries/sec).
+- chat: `POST /chats/{id}/messages` at each concurrency level
+  (p50/p95/p99, requests/sec).
+
+Results are written as JSON (with machine and settings info). Pass an
+earlier file as `--baseline` to print the change per metric; only compare
+runs from the same machine.
+
+    cd backend
+    python -m benchmarks.suite --out benchmarks/results/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/results/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+QUESTIONS = [
+    "What is the EUR/USD forecast?",
+    "What are the key risks to the outlook?",
+    "Which stocks are rated Overweight?",
+    "How do they view credit spreads?",
+    "What do they expect from central banks?",
+    "Summarize the equities outlook",
+    "Compare the credit and rates views",
+    "What is the target for AAPL?",
+]
+API_KEY = "bench"
+HEADERS = {"X-API-Key": API_KEY}
+
+
+def _configure(workdir: str, args: argparse.Namespace) -> None:
+    # Must run before any app module is imported (settings read env at import)
+    os.environ.update({
+        "SQLITE_PATH": os.path.join(workdir, "app.db"),
+        "CHROMA_DIR": os.path.join(workdir, "chroma"),
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "EMBEDDING_CACHE_DIR": os.path.join(workdir, "embedding_cache"),
+        "APP_API_KEY": API_KEY,
+        "LLM_PROVIDER": "local",
+        "LLM_ROUTES": "",
+        "LOCAL_LLM_LATENCY_S": str(args.llm_latency),
+        "LOCAL_LLM_TOKEN_RATE": str(args.llm_token_rate),
+        "ANSWER_CACHE_MAX_ENTRIES": os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "0"),
+    })
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 2)
+
+    return {"p50_ms": round(statistics.median(ordered) * 1000, 2), "p95_ms": pct(0.95), "p99_ms": pct(0.99)}
+
+
+async def _load(concurrency: int, total: int, call) -> Dict[str, Any]:
+    """Run `call(worker, i)` `total` times across `concurrency` workers."""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker(w: int) -> None:
+        nonlocal errors
+        for i in counter:
+            t0 = time.perf_counter()
+            try:
+                await call(w, i)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    return {
+        "requests": total,
+        "errors": errors,
+        "per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        **_percentiles(latencies),
+    }
+
+
+# ---------- Phases ----------
+async def bench_ingest(client, workdir: str, args: argparse.Namespace) -> Dict[str, Any]:
+    from benchmarks.synthetic import write_report_pdf
+
+    results: Dict[str, Any] = {}
+    seed = 0
+    for n_pages in args.sizes:
+        jobs = []
+        for _ in range(args.reports_per_size):
+            path = os.path.join(workdir, f"report-{seed}.pdf")
+            write_report_pdf(path, seed, n_pages)
+            t0 = time.perf_counter()
+            with open(path, "rb") as f:
+                r = await client.post(
+                    "/upload",
+                    files={"file": (os.path.basename(path), f, "application/pdf")},
+                    params={"title": f"Report {seed}", "bank": "bench"},
+                    headers=HEADERS,
+                )
+            r.raise_for_status()
+            job_id = r.json()["job_id"]
+            while True:
+                job = (await client.get(f"/jobs/{job_id}", headers=HEADERS)).json()
+                if job["status"] in ("done", "failed"):
+                    break
+                await asyncio.sleep(0.02)
+            if job["status"] != "done":
+                raise RuntimeError(f"ingestion failed: {job.get('error')}")
+            jobs.append({**job["stats"], "end_to_end_s": time.perf_counter() - t0})
+            seed += 1
+
+        seconds = sum(j["seconds"] for j in jobs)
+        results[f"{n_pages}_pages"] = {
+            "reports": len(jobs),
+            "pages_per_s": round(sum(j["pages"] for j in jobs) / seconds, 2),
+            "chunks_per_s": round(sum(j["chunks"] for j in jobs) / seconds, 2),
+            "end_to_end_s_per_report": round(statistics.mean(j["end_to_end_s"] for j in jobs), 3),
+        }
+    return results
+
+
+async def bench_retrieval(args: argparse.Namespace) -> Dict[str, Any]:
+    from app.executor import run_blocking
+    from app.tools import tool_search_reports
+
+    async def call(w: int, i: int) -> None:
+        await run_blocking(tool_search_reports, QUESTIONS[i % len(QUESTIONS)], user_id="user_001")
+
+    return {f"c{c}": await _load(c, args.queries, call) for c in args.concurrency}
+
+
+async def bench_chat(client, args: argparse.Namespace) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for c in args.concurrency:
+        # One chat per worker, like c users talking at once
+        chats = []
+        for w in range(c):
+            r = await client.post("/chats", json={"title": f"bench {w}"}, headers=HEADERS)
+            chats.append(r.json()["chat_id"])
+
+        async def call(w: int, i: int) -> None:
+            r = await client.post(
+                f"/chats/{chats[w]}/messages",
+                json={"message": QUESTIONS[i % len(QUESTIONS)]},
+                headers=HEADERS,
+            )
+            r.raise_for_status()
+
+        results[f"c{c}"] = await _load(c, args.chat_requests, call)
+    return results
+
+
+# ---------- Results ----------
+def _meta(args: argparse.Namespace) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10
+        ).stdout.strip()
+    except Exception:
+        commit = ""
+    from app.config import settings
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+        "settings": {
+            k: getattr(settings, k)
+            for k in (
+                "EMBEDDING_MODEL", "BLOCKING_WORKERS", "INGEST_PROCESSES", "INGEST_BATCH_SIZE",
+                "HYBRID_SEARCH", "PARTITION_STRATEGY", "CONTEXT_TOKEN_BUDGET", "DB_READERS", "ANSWER_CACHE_MAX_ENTRIES",
+            )
+        },
+    }
+
+
+def _flatten(data: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat: Dict[str, float] = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> None:
+    old = _flatten({k: baseline.get(k, {}) for k in ("ingest", "retrieval", "chat")})
+    new = _flatten({k: current.get(k, {}) for k in ("ingest", "retrieval", "chat")})
+    print(f"\nvs baseline {baseline['meta']['timestamp']} ({baseline['meta'].get('git_commit') or '?'})")
+    print(f"{'metric':<44} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name in sorted(new):
+        if name not in old or name.endswith((".requests", ".reports")):
+            continue
+        change = f"{(new[name] - old[name]) / old[name]:+.1%}" if old[name] else "n/a"
+        print(f"{name:<44} {old[name]:>10} {new[name]:>10} {change:>8}")
+
+
+async def run(args: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+    import httpx
+    from app.main import app
+    from app.vectorstore import store
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            while not store.ready:
+                await asyncio.sleep(0.1)
+            results = {"meta": _meta(args)}
+            print("ingest ...", flush=True)
+            results["ingest"] = await bench_ingest(client, workdir, args)
+            print("retrieval ...", flush=True)
+            results["retrieval"] = await bench_retrieval(args)
+            print("chat ...", flush=True)
+            results["chat"] = await bench_chat(client, args)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 20, 80], help="pages per synthetic report")
+    parser.add_argument("--reports-per-size", type=int, default=2)
+    parser.add_argument("--queries", type=int, default=200, help="retrieval calls per concurrency level")
+    parser.add_argument("--chat-requests", type=int, default=64, help="chat requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="local LLM seconds to first token")
+    parser.add_argument("--llm-token-rate", type=float, default=0.0, help="local LLM tokens/sec (0 = instant)")
+    parser.add_argument("--out", default=None, help="results JSON (default: benchmarks/results/suite-<time>.json)")
+    parser.add_argument("--baseline", default=None, help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_suite_")
+    _configure(workdir, args)
+    results = asyncio.run(run(args, workdir))
+
+    out = args.out or os.path.join(
+        os.path.dirname(__file__), "results", f"suite-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(json.dumps({k: results[k] for k in ("ingest", "retrieval", "chat")}, indent=2))
+    print(f"\nsaved {out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Synthetic research reports for benchmarks: page text and minimal PDFs.
+
+Reports are deterministic per seed and look enough like broker research
+(headings, prose, small tables, tickers, ISINs, FX levels) to exercise the
+chunker, retrieval and the PDF extractor. No third-party PDF writer needed.
+"""
+import random
+from typing import List
+
+BANKS = ["Alpine Bank", "Harbor Capital", "Northbridge", "Meridian Securities"]
+ASSET_CLASSES = ["equities", "credit", "rates", "fx", "multi-asset"]
+TICKERS = ["AAPL", "MSFT", "NESN", "SAP", "ASML", "TSLA", "HSBA", "BNP", "NOVN", "SHEL"]
+PAIRS = ["EUR/USD", "USD/JPY", "GBP/USD", "USD/CHF", "AUD/USD"]
+THEMES = [
+    "inflation is cooling faster than the consensus expects",
+    "central banks are likely to cut rates twice before year-end",
+    "credit spreads look tight relative to default expectations",
+    "earnings revisions have turned positive for cyclical sectors",
+    "the dollar should weaken as growth differentials narrow",
+    "energy prices remain the main upside risk to headline inflation",
+    "we prefer quality balance sheets over high-beta exposure",
+    "valuations in large-cap technology already price in strong growth",
+    "emerging market currencies benefit from a softer dollar",
+    "the yield curve is expected to steepen as short rates fall",
+]
+RISKS = [
+    "a renewed spike in oil prices",
+    "sticky services inflation",
+    "a sharper slowdown in China",
+    "fiscal slippage in the euro area",
+    "an escalation of trade tensions",
+]
+
+
+def isin(rng: random.Random) -> str:
+    return rng.choice(["US", "DE", "CH", "GB", "FR"]) + "".join(rng.choice("0123456789") for _ in range(10))
+
+
+def report_pages(seed: int, n_pages: int, lines_per_page: int = 45) -> List[str]:
+    """Page texts for one synthetic report."""
+    rng = random.Random(seed)
+    bank = rng.choice(BANKS)
+    pages: List[str] = []
+    for p in range(n_pages):
+        lines: List[str] = []
+        if p % 3 == 0:
+            lines += [f"{p // 3 + 1}. {rng.choice(ASSET_CLASSES).title()} outlook", ""]
+        while len(lines) < lines_per_page:
+            kind = rng.random()
+            if kind < 0.15:
+                pair = rng.choice(PAIRS)
+                lines += [
+                    "Forecast table",
+                    "Instrument | Spot | 3M | 12M",
+                    f"{pair} | {rng.uniform(0.9, 1.5):.2f} | {rng.uniform(0.9, 1.5):.2f} | {rng.uniform(0.9, 1.5):.2f}",
+                    f"{rng.choice(PAIRS)} | {rng.uniform(0.9, 1.5):.2f} | {rng.uniform(0.9, 1.5):.2f} | {rng.uniform(0.9, 1.5):.2f}",
+                    "",
+                ]
+            elif kind < 0.3:
+                t = rng.choice(TICKERS)
+                lines.append(
+                    f"We rate {t} (ISIN {isin(rng)}) {rng.choice(['Overweight', 'Neutral', 'Underweight'])} "
+                    f"with a 12-month target of {rng.randint(50, 900)}."
+                )
+            elif kind < 0.4:
+                lines.append(f"Key risk: {rng.choice(RISKS)}.")
+                lines.append("")
+            else:
+                lines.append(f"{bank} strategists think {rng.choice(THEMES)}.")
+        pages.append("\n".join(lines[:lines_per_page]))
+    return pages
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: List[str]) -> None:
+    """Write `pages` as a minimal text PDF (Helvetica, one text block per page)."""
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_obj = add(b"")  # filled in once the page ids are known
+    kids = []
+    for text in pages:
+        ops = " ".join(f"({_pdf_escape(line)}) '" for line in text.split("\n"))
+        stream = f"BT /F1 9 Tf 40 800 Td 11 TL {ops} ET".encode("latin-1", "replace")
+        content = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_obj, font, content)
+        ))
+    objects[pages_obj - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids)
+    )
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_obj)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def write_report_pdf(path: str, seed: int, n_pages: int) -> None:
+    write_pdf(path, report_pages(seed, n_pages))
@@ -0,0 +1,134 @@
+import asyncio
+import time
+
+import pytest
+
+from app import llm
+from app.config import settings
+from app.providers import Completion, Provider, resolve
+
+PURPOSE = "compare"
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+class FakeProvider(Provider):
+    name = "fake"
+
+    def __init__(self):
+        self.hang = False
+        self.error = None
+        self.stream_error = None
+
+    async def _respond(self) -> None:
+        if self.hang:
+            await asyncio.Event().wait()
+        if self.error is not None:
+            raise self.error
+
+    async def complete(self, model, messages, timeout, **params) -> Completion:
+        await self._respond()
+        return Completion(text="ok", provider=self.name, model=model, prompt_tokens=1, completion_tokens=1)
+
+    async def open_stream(self, model, messages, timeout, **params):
+        await self._respond()
+
+        async def deltas():
+            yield "ok"
+            if self.stream_error is not None:
+                raise self.stream_error
+
+        return deltas()
+
+
+@pytest.fixture
+def lane(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(settings, "LLM_BREAKER_THRESHOLD", 1)
+    monkeypatch.setattr(settings, "LLM_BREAKER_COOLDOWN_S", 60)
+    monkeypatch.setattr(llm, "_lanes", {})
+    lane = llm._lanes[resolve(PURPOSE)[0]] = llm._Lane(FakeProvider())
+    return lane
+
+
+async def _cancel_stream_open() -> None:
+    stream = llm.stream_chat_completion(PURPOSE, MESSAGES, deadline_s=5)
+    task = asyncio.create_task(stream.__anext__())
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+def test_cancelled_stream_open_frees_the_slot(lane):
+    async def run():
+        in_flight = llm.stats["in_flight"]
+        lane.provider.hang = True
+        for _ in range(settings.LLM_MAX_CONCURRENCY):
+            await _cancel_stream_open()
+        assert lane.slots._value == settings.LLM_MAX_CONCURRENCY
+        assert llm.stats["in_flight"] == in_flight
+
+        lane.provider.hang = False
+        assert [d async for d in llm.stream_chat_completion(PURPOSE, MESSAGES, deadline_s=1)] == ["ok"]
+        assert lane.slots._value == settings.LLM_MAX_CONCURRENCY
+
+    asyncio.run(run())
+
+
+def _half_open(lane) -> None:
+    lane.breaker.opened_at = time.monotonic() - settings.LLM_BREAKER_COOLDOWN_S - 1
+
+
+def test_probe_rejected_without_verdict_keeps_breaker_usable(lane):
+    async def run():
+        _half_open(lane)
+        lane.provider.error = ValueError("bad request")
+        for _ in range(2):  # the second call is a probe again, not "breaker open"
+            with pytest.raises(ValueError):
+                await llm.chat_completion(PURPOSE, MESSAGES, deadline_s=1)
+        assert lane.breaker.state == "half_open"
+
+        lane.provider.error = None
+        assert (await llm.chat_completion(PURPOSE, MESSAGES, deadline_s=1)).text == "ok"
+        assert lane.breaker.state == "closed"
+
+    asyncio.run(run())
+
+
+def test_cancelled_probe_keeps_breaker_usable(lane):
+    async def run():
+        _half_open(lane)
+        lane.provider.hang = True
+        await _cancel_stream_open()
+
+        lane.provider.hang = False
+        assert (await llm.chat_completion(PURPOSE, MESSAGES, deadline_s=1)).text == "ok"
+        assert lane.breaker.state == "closed"
+
+    asyncio.run(run())
+
+
+def test_mid_stream_failure_reaches_the_breaker(lane):
+    async def run():
+        lane.provider.stream_error = ConnectionError("connection reset")
+        with pytest.raises(ConnectionError):
+            async for _ in llm.stream_chat_completion(PURPOSE, MESSAGES, deadline_s=1):
+                pass
+        assert lane.breaker.state == "open"
+        assert lane.slots._value == settings.LLM_MAX_CONCURRENCY
+
+    asyncio.run(run())
+
+
+def test_stream_probe_verdict_waits_for_the_last_token(lane):
+    async def run():
+        _half_open(lane)
+        stream = llm.stream_chat_completion(PURPOSE, MESSAGES, deadline_s=1)
+        assert await stream.__anext__() == "ok"
+        assert lane.breaker.state == "half_open"
+        await stream.aclose()  # abandoned: no verdict, the next call probes
+
+        assert [d async for d in llm.stream_chat_completion(PURPOSE, MESSAGES, deadline_s=1)] == ["ok"]
+        assert lane.breaker.state == "closed"
+
+    asyncio.run(run())
@@ -1,3 +1,6 @@
+import json
+import time
+
 import streamlit as st
 import requests
 
@@ -11,28 +14,52 @@ HEADERS = {
     "X-API-Key": API_KEY,
 }
 
+POLL_INTERVAL_S = 1.0   # upload job status polling
+CHATS_PAGE_SIZE = 20    # sidebar loads chats page by page
+MESSAGES_PAGE_SIZE = 50
+
 st.set_page_config(page_title="Agentic Research Assistant", layout="wide")
 
 # ----------------------------
 # Session state init
 # ----------------------------
 if "chats" not in st.session_state:
-    st.session_state.chats = []
+    st.session_state.chats = None   # None = first page not loaded yet
+    st.session_state.chats_cursor = None
 
 if "active_chat_id" not in st.session_state:
     st.session_state.active_chat_id = None
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
+    st.session_state.messages_cursor = None
 
 # ----------------------------
 # Helper API functions
 # ----------------------------
-def api_get(path):
-    r = requests.get(f"{BACKEND_URL}{path}", headers=HEADERS)
+def api_get(path, params=None):
+    r = requests.get(f"{BACKEND_URL}{path}", headers=HEADERS, params=params)
     r.raise_for_status()
     return r.json()
 
+def load_chats(more=False):
+    # First page, or the next older page after the chats already shown
+    params = {"limit": CHATS_PAGE_SIZE}
+    if more:
+        params["before"] = st.session_state.chats_cursor
+    page = api_get("/chats", params)
+    st.session_state.chats = (st.session_state.chats or []) + page["items"] if more else page["items"]
+    st.session_state.chats_cursor = page["next_cursor"]
+
+def load_messages(chat_id, more=False):
+    # Latest messages first; "more" prepends the page before them
+    params = {"limit": MESSAGES_PAGE_SIZE}
+    if more:
+        params["before"] = st.session_state.messages_cursor
+    page = api_get(f"/chats/{chat_id}/messages", params)
+    st.session_state.messages = page["items"] + st.session_state.messages if more else page["items"]
+    st.session_state.messages_cursor = page["next_cursor"]
+
 def api_post(path, json=None, files=None):
     r = requests.post(
         f"{BACKEND_URL}{path}",
@@ -43,6 +70,24 @@ def api_post(path, json=None, files=None):
     r.raise_for_status()
     return r.json()
 
+def api_stream_tokens(path, json_body):
+    # Yields answer tokens from the backend's NDJSON stream as they arrive
+    with requests.post(
+        f"{BACKEND_URL}{path}",
+        headers=HEADERS,
+        json=json_body,
+        stream=True,
+    ) as r:
+        r.raise_for_status()
+        for line in r.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["type"] == "token":
+                yield event["content"]
+            elif event["type"] == "error":
+                raise RuntimeError(event["detail"])
+
 # ----------------------------
 # Sidebar: Chats + Upload
 # ----------------------------
@@ -51,12 +96,12 @@ with st.sidebar:
 
     # Refresh chats
     if st.button("🔄 Refresh chats"):
-        st.session_state.chats = api_get("/chats")
+        load_chats()
 
-    # Load chats initially
-    if not st.session_state.chats:
+    # Load the first page of chats initially
+    if st.session_state.chats is None:
         try:
-            st.session_state.chats = api_get("/chats")
+            load_chats()
         except Exception:
             st.session_state.chats = []
 
@@ -65,7 +110,11 @@ with st.sidebar:
         label = chat["title"] or "Untitled chat"
         if st.button(label, key=chat["chat_id"]):
             st.session_state.active_chat_id = chat["chat_id"]
-            st.session_state.messages = api_get(f"/chats/{chat['chat_id']}/messages")
+            load_messages(chat["chat_id"])
+
+    if st.session_state.chats_cursor and st.button("More chats", key="more_chats"):
+        load_chats(more=True)
+        st.rerun()
 
     st.divider()
     st.subheader("📄 Upload PDF")
@@ -74,21 +123,33 @@ with st.sidebar:
 
     if uploaded_file is not None:
         if st.button("Create chat from PDF"):
-            with st.spinner("Uploading and indexing..."):
-                files = {
-                    "file": (uploaded_file.name, uploaded_file.getvalue(), "application/pdf")
-                }
-                upload_resp = requests.post(
-                    f"{BACKEND_URL}/upload",
-                    headers=HEADERS,
-                    files=files,
-                )
-                upload_resp.raise_for_status()
-                report_id = upload_resp.json()["report_id"]
-                
+            files = {
+                "file": (uploaded_file.name, uploaded_file.getvalue(), "application/pdf")
+            }
+            upload_resp = requests.post(
+                f"{BACKEND_URL}/upload",
+                headers=HEADERS,
+                files=files,
+            )
+            upload_resp.raise_for_status()
+            job_id = upload_resp.json()["job_id"]
+
+            # Indexing runs as a background job on the backend; poll it
+            progress = st.progress(0, text="Queued...")
+            while True:
+                job = api_get(f"/jobs/{job_id}")
+                progress.progress(int(job["percent"] or 0), text=f"{job['stage'].capitalize()}...")
+                if job["status"] in ("done", "failed"):
+                    break
+                time.sleep(POLL_INTERVAL_S)
+            progress.empty()
+
+            if job["status"] == "failed":
+                st.error(f"Indexing failed: {job['error']}")
+            else:
                 chat_resp = api_post(
                     "/chats",
-                    json={"report_id": report_id, "title": uploaded_file.name},
+                    json={"report_id": job["report_id"], "title": uploaded_file.name},
                 )
 
                 if chat_resp is None:
@@ -97,6 +158,7 @@ with st.sidebar:
                     st.session_state.chats.insert(0, chat_resp)
                     st.session_state.active_chat_id = chat_resp["chat_id"]
                     st.session_state.messages = []
+                    st.session_state.messages_cursor = None
                     st.success("Chat created!")
 
 
@@ -110,7 +172,11 @@ if not st.session_state.active_chat_id:
     st.info("Upload a PDF or select a chat from the sidebar to start.")
     st.stop()
 
-# Display messages
+# Display messages (older ones on demand)
+if st.session_state.messages_cursor and st.button("Load earlier messages"):
+    load_messages(st.session_state.active_chat_id, more=True)
+    st.rerun()
+
 for msg in st.session_state.messages:
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
@@ -124,15 +190,13 @@ if prompt:
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    with st.spinner("Thinking..."):
-        resp = api_post(
-            f"/chats/{st.session_state.active_chat_id}/messages",
-            json={"message": prompt},
+    # Render the assistant message token by token
+    with st.chat_message("assistant"):
+        answer = st.write_stream(
+            api_stream_tokens(
+                f"/chats/{st.session_state.active_chat_id}/messages/stream",
+                {"message": prompt},
+            )
         )
 
-        answer = resp["answer"]
-
-    # Show assistant message
     st.session_state.messages.append({"role": "assistant", "content": answer})
-    with st.chat_message("assistant"):
-        st.markdown(answer)